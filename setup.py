@@ -36,6 +36,6 @@ setup(
     packages=find_packages('src'),
     package_dir={'': 'src'},
 
-    scripts=['horus'],
+    scripts=['horus', 'horus-scan'],
     data_files=package_data_dirs('res'),
 )
@@ -0,0 +1,156 @@
+# -*- coding: utf-8 -*-
+# This file is part of the Horus Project
+
+__author__ = 'Jesús Arroyo Torrens <jesus.arroyo@bq.com>'
+__copyright__ = 'Copyright (C) 2014-2016 Mundo Reader S.L.'
+__license__ = 'GNU General Public License v2 http://www.gnu.org/licenses/gpl2.html'
+
+"""
+Headless command line scanner.
+
+Loads the profile and calibration settings, configures the engine,
+runs a complete scan and streams the point cloud to a PLY file.
+It does not import wx nor OpenGL.
+"""
+
+import sys
+import datetime
+import argparse
+import threading
+
+from horus.util import profile, scan_setup
+from horus.engine.driver.driver import Driver
+from horus.engine.scan.ciclop_scan import CiclopScan
+from horus.engine.scan.ply_writer import PLYWriter
+from horus.engine.calibration.calibration_data import CalibrationData
+from horus.engine.algorithms.point_cloud_roi import PointCloudROI
+
+import logging
+logger = logging.getLogger(__name__)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='horus-scan', description='Horus headless scanner')
+    parser.add_argument('-s', '--settings', action='append', default=[],
+                        help='Settings file, profile or calibration (JSON). '
+                             'By default, the settings of the Horus application')
+    parser.add_argument('-o', '--output', default=None,
+                        help='Output point cloud (PLY). By default, scan_<date>.ply')
+    parser.add_argument('--replay', default=None,
+                        help='Replay a recorded scan session instead of scanning')
+    parser.add_argument('--record', default=None,
+                        help='Directory to record the scan session')
+    parser.add_argument('--telemetry', default=None,
+                        help='Directory to save the scan telemetry')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='Number of scan workers')
+    parser.add_argument('-v', '--verbose', action='store_true')
+    return parser.parse_args(argv)
+
+
+def load_settings(filenames):
+    if len(filenames) == 0:
+        profile.load_settings()
+    for filename in filenames:
+        profile.settings.load_settings(filename)
+
+
+def connect(driver):
+    connected = threading.Event()
+    response = []
+
+    def after_callback(ret):
+        response.append(ret)
+        connected.set()
+
+    driver.set_callbacks(None, after_callback)
+    driver.connect()
+    while not connected.wait(1):
+        pass
+    ret, result = response[0]
+    if not ret:
+        logger.error("Error connecting the scanner: {0}".format(result))
+    return ret
+
+
+def scan(output):
+    ciclop_scan = CiclopScan()
+    point_cloud_roi = PointCloudROI()
+    writer = PLYWriter(output)
+    progress = [-1]
+
+    def point_cloud_callback(range, progress_value, point_cloud):
+        point_cloud = point_cloud_roi.mask_point_cloud(*point_cloud)
+        if point_cloud is not None:
+            writer.write(*point_cloud)
+        if range > 0:
+            percent = int(100 * progress_value / range)
+            if percent != progress[0]:
+                progress[0] = percent
+                sys.stderr.write("\rScanning {0} %".format(percent))
+
+    finished = threading.Event()
+    response = []
+
+    def after_callback(ret):
+        response.append(ret)
+        finished.set()
+
+    ciclop_scan.point_cloud_callback = point_cloud_callback
+    ciclop_scan.set_callbacks(None, None, after_callback)
+    writer.open()
+    try:
+        ciclop_scan.start()
+        try:
+            while not finished.wait(1):
+                pass
+        except KeyboardInterrupt:
+            ciclop_scan.stop()
+            finished.wait()
+    finally:
+        sys.stderr.write("\n")
+        writer.close()
+    ret, error = response[0]
+    if not ret:
+        logger.error("Scan error: {0}".format(error))
+    return ret
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    logging.basicConfig(
+        level=logging.DEBUG if args.verbose else logging.INFO,
+        format='%(asctime)s %(levelname)s %(name)s: %(message)s')
+
+    load_settings(args.settings)
+    scan_setup.setup_driver()
+
+    driver = Driver()
+    ciclop_scan = CiclopScan()
+    if args.replay is None and not connect(driver):
+        return 1
+
+    try:
+        scan_setup.setup_scan()
+        # The point cloud is saved in the output file
+        ciclop_scan.set_autosave_path(None)
+        ciclop_scan.set_replay_path(args.replay)
+        ciclop_scan.set_record_path(args.record)
+        ciclop_scan.set_telemetry_path(args.telemetry)
+        if args.workers is not None:
+            ciclop_scan.set_workers(args.workers)
+
+        if args.replay is None and not CalibrationData().check_calibration():
+            logger.error("Calibration parameters are not correct")
+            return 1
+
+        output = args.output
+        if output is None:
+            output = datetime.datetime.now().strftime('scan_%Y%m%d_%H%M%S.ply')
+        if scan(output):
+            return 0
+        return 1
+    finally:
+        if driver.is_connected:
+            driver.disconnect()
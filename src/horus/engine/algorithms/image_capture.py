@@ -6,10 +6,15 @@ __copyright__ = 'Copyright (C) 2014-2016 Mundo Reader S.L.'
 __license__ = 'GNU General Public License v2 http://www.gnu.org/licenses/gpl2.html'
 
 import cv2
+import time
+import collections
+import numpy as np
 
 from horus import Singleton
 from horus.engine.driver.driver import Driver
+from horus.engine.driver.camera import native_window
 from horus.engine.calibration.calibration_data import CalibrationData
+from horus.engine.algorithms.settle_detector import SettleDetector
 
 
 class CameraSettings(object):
@@ -67,6 +72,19 @@ class ImageCapture(object):
         self._remove_background = True
         self._updating = False
         self.use_distortion = False
+        # Time when the last image and the last laser images were captured
+        self.timestamp = None
+        self.laser_timestamps = [None, None]
+        # Accumulated duration of each capture stage
+        self.timings = collections.defaultdict(float)
+        # Wait for the stream to settle instead of flushing
+        self.settle_detector = SettleDetector()
+        self._adaptive_flush = False
+        self._pending_change = None
+        self._reference = None
+        # Window (umin, vmin, umax, vmax) of the oriented image
+        # to crop the captures, None for full images
+        self.window = None
 
     def initialize(self):
         self.texture_mode.initialize()
@@ -89,6 +107,24 @@ class ImageCapture(object):
     def set_remove_background(self, value):
         self._remove_background = value
 
+    def set_adaptive_flush(self, value):
+        self._adaptive_flush = value
+        self._reference = None
+
+    def set_window(self, value):
+        self.window = value
+
+    def capture_window(self, native=False):
+        """Window of the oriented image cropped in a capture. Native
+           images are not undistorted: their window covers the raw
+           pixels of the window"""
+        if self.window is not None and native and self.use_distortion:
+            return self.calibration_data.distort_window(self.window)
+        return self.window
+
+    def reset_timings(self):
+        self.timings = collections.defaultdict(float)
+
     def set_mode(self, mode):
         if self._mode is not mode:
             self._updating = True
@@ -97,6 +133,7 @@ class ImageCapture(object):
             self._mode.selected = True
             self._mode.send_all_settings()
             self._updating = False
+            self._pending_change = 'mode'
 
     def set_mode_texture(self):
         self.set_mode(self.texture_mode)
@@ -109,15 +146,15 @@ class ImageCapture(object):
 
     def flush_texture(self):
         self.set_mode_texture()
-        self.capture_image(flush=0)
+        self.capture_image(flush=0, stage='flush')
 
     def flush_laser(self):
         self.set_mode_laser()
-        self.capture_image(flush=0)
+        self.capture_image(flush=0, stage='flush')
 
     def flush_pattern(self):
         self.set_mode_pattern()
-        self.capture_image(flush=0)
+        self.capture_image(flush=0, stage='flush')
 
     def capture_texture(self):
         self.set_mode(self.texture_mode)
@@ -125,60 +162,76 @@ class ImageCapture(object):
             flush = self._flush_stream_texture
         else:
             flush = self._flush_texture
-        image = self.capture_image(flush=flush)
+        image = self.capture_image(flush=flush, stage='capture_texture')
         return image
 
-    def _capture_laser(self, index):
+    def _capture_laser(self, index, native=False):
         self.set_mode(self.laser_mode)
-        self.driver.board.lasers_off()
-        self.driver.board.laser_on(index)
+        self._switch_lasers(self.driver.board.lasers_off)
+        self._switch_lasers(self.driver.board.laser_on, index)
+        if self.stream:
+            flush = self._flush_stream_laser
+        else:
+            flush = self._flush_laser
+        image = self.capture_image(flush=flush, stage='capture_laser_{0}'.format(index),
+                                   native=native)
+        self.laser_timestamps[index] = self.timestamp
+        self._switch_lasers(self.driver.board.laser_off, index)
+        return image
+
+    def _switch_lasers(self, method, *args):
+        begin = time.time()
+        enabled = list(self.driver.board._laser_enabled)
+        method(*args)
+        if enabled != self.driver.board._laser_enabled and self._pending_change is None:
+            self._pending_change = 'laser'
+        self.timings['laser_switch'] += time.time() - begin
+
+    def _capture_background(self, native=False):
+        self._switch_lasers(self.driver.board.lasers_off)
         if self.stream:
             flush = self._flush_stream_laser
         else:
             flush = self._flush_laser
-        image = self.capture_image(flush=flush)
-        self.driver.board.laser_off(index)
+        return self.capture_image(flush=flush, stage='capture_background',
+                                  native=native)
+
+    def _subtract_background(self, image, image_background):
+        begin = time.time()
+        image = cv2.subtract(image, image_background)
+        self.timings['subtract_background'] += time.time() - begin
         return image
 
-    def capture_laser(self, index):
+    def capture_laser(self, index, native=False):
         # Capture background
         image_background = None
         if self._remove_background:
-            self.driver.board.lasers_off()
-            if self.stream:
-                flush = self._flush_stream_laser
-            else:
-                flush = self._flush_laser
-            image_background = self.capture_image(flush=flush)
+            image_background = self._capture_background(native)
         # Capture laser
-        image = self._capture_laser(index)
+        image = self._capture_laser(index, native)
         if image_background is not None:
             if image is not None:
-                image = cv2.subtract(image, image_background)
+                image = self._subtract_background(image, image_background)
         return image
 
-    def capture_lasers(self):
+    def capture_lasers(self, native=False):
         # Capture background
         image_background = None
         if self._remove_background:
-            self.driver.board.lasers_off()
-            if self.stream:
-                flush = self._flush_stream_laser
-            else:
-                flush = self._flush_laser
-            image_background = self.capture_image(flush=flush)
+            image_background = self._capture_background(native)
         # Capture lasers
         images = [None, None]
-        images[0] = self._capture_laser(0)
-        images[1] = self._capture_laser(1)
+        images[0] = self._capture_laser(0, native)
+        images[1] = self._capture_laser(1, native)
         if image_background is not None:
             if images[0] is not None:
-                images[0] = cv2.subtract(images[0], image_background)
+                images[0] = self._subtract_background(images[0], image_background)
             if images[1] is not None:
-                images[1] = cv2.subtract(images[1], image_background)
+                images[1] = self._subtract_background(images[1], image_background)
         return images
 
-    def capture_all_lasers(self):
+    def capture_all_lasers(self, native=False):
+        """Capture both lasers in the same image"""
         image_background = None
         self.set_mode(self.laser_mode)
         if self.stream:
@@ -186,14 +239,14 @@ class ImageCapture(object):
         else:
             flush = self._flush_laser
         if self._remove_background:
-            self.driver.board.lasers_off()
-            image_background = self.capture_image(flush=flush)
-        self.driver.board.lasers_on()
-        image = self.capture_image(flush=flush)
-        self.driver.board.lasers_off()
+            image_background = self._capture_background(native)
+        self._switch_lasers(self.driver.board.lasers_on)
+        image = self.capture_image(flush=flush, stage='capture_all_lasers', native=native)
+        self.laser_timestamps = [self.timestamp, self.timestamp]
+        self._switch_lasers(self.driver.board.lasers_off)
         if image_background is not None:
-            if image is not None and image_background is not None:
-                image = cv2.subtract(image, image_background)
+            if image is not None:
+                image = self._subtract_background(image, image_background)
         return image
 
     def capture_pattern(self):
@@ -202,19 +255,61 @@ class ImageCapture(object):
             flush = self._flush_stream_pattern
         else:
             flush = self._flush_pattern
-        image = self.capture_image(flush=flush)
+        image = self.capture_image(flush=flush, stage='capture_pattern')
         return image
 
-    def capture_image(self, flush=0):
-        image = self.driver.camera.capture_image(flush=flush)
-        if self.use_distortion:
-            if image is not None and \
-               self.calibration_data.camera_matrix is not None and \
-               self.calibration_data.distortion_vector is not None and \
-               self.calibration_data.dist_camera_matrix is not None:
-                image = cv2.undistort(image,
-                                      self.calibration_data.camera_matrix,
-                                      self.calibration_data.distortion_vector,
-                                      None,
-                                      self.calibration_data.dist_camera_matrix)
+    def capture_image(self, flush=0, stage='capture_image', native=False):
+        """Capture an image. A native image keeps the camera sensor
+           layout and BGR channels, and it is not undistorted"""
+        begin = time.time()
+        if self._adaptive_flush:
+            image = self._capture_settled_image(flush, native)
+        elif self.driver.camera.use_grabber:
+            # The grabber keeps no stale frames: take the first frame
+            # whose exposure started after this request, without flush
+            image = self.driver.camera.capture_image(since=begin, native=native)
+        else:
+            if flush > 0:
+                self.driver.camera.flush(flush)
+                self.timings['flush'] += time.time() - begin
+                begin = time.time()
+            image = self.driver.camera.capture_image(native=native)
+        if image is not None:
+            self.timestamp = self.driver.camera.timestamp
+        else:
+            self.timestamp = time.time()
+        self._pending_change = None
+        if image is not None:
+            if self.use_distortion and not native:
+                image = self.calibration_data.undistort_image(image, self.window)
+            elif self.window is not None:
+                image = self._crop_image(image, native)
+        self.timings[stage] += time.time() - begin
+        return image
+
+    def _crop_image(self, image, native=False):
+        umin, vmin, umax, vmax = self.capture_window(native)
+        if native:
+            umin, vmin, umax, vmax = native_window(
+                (umin, vmin, umax, vmax), image.shape, self.driver.camera.orientation)
+        # The copy releases the full frame
+        return np.ascontiguousarray(image[vmin:vmax, umin:umax])
+
+    def _next_image(self, native=False):
+        if self.driver.camera.use_grabber:
+            return self.driver.camera.capture_image(since=time.time(), native=native)
+        return self.driver.camera.capture_image(native=native)
+
+    def _capture_settled_image(self, flush=0, native=False):
+        orientation = self.driver.camera.orientation if native else None
+        # Wait for the last laser or camera settings change, at least
+        # the flush frames if it is not visible
+        if self._pending_change is not None:
+            image, frames = self.settle_detector.wait(
+                self._pending_change, self._reference,
+                lambda: self._next_image(native), orientation, flush)
+            self.timings['settle_frames'] += frames
+        else:
+            image = self._next_image(native)
+        self._reference = self.settle_detector.thumbnail(image, orientation)
         return image
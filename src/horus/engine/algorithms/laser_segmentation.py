@@ -8,18 +8,17 @@ __license__ = 'GNU General Public License v2 http://www.gnu.org/licenses/gpl2.ht
 import cv2
 import math
 import numpy as np
-import scipy.ndimage
 
 from horus import Singleton
-from horus.engine.calibration.calibration_data import CalibrationData
 from horus.engine.algorithms.point_cloud_roi import PointCloudROI
+from horus.engine.algorithms.ransac import ransac, LineModel
+from horus.engine.algorithms import segmentation_kernel
 
 
 @Singleton
 class LaserSegmentation(object):
 
     def __init__(self):
-        self.calibration_data = CalibrationData()
         self.point_cloud_roi = PointCloudROI()
 
         self.red_channel = 'R (RGB)'
@@ -29,7 +28,11 @@ class LaserSegmentation(object):
         self.blur_value = 0
         self.window_enable = False
         self.window_value = 0
+        self.tracking_enable = False
+        self.tracking_value = 0
+        self.peak_method = 'Center of mass'
         self.refinement_method = 'SGF'
+        self.fused_enable = False
 
     def set_red_channel(self, value):
         self.red_channel = value
@@ -52,24 +55,188 @@ class LaserSegmentation(object):
     def set_window_value(self, value):
         self.window_value = value
 
+    def set_tracking_enable(self, value):
+        self.tracking_enable = value
+
+    def set_tracking_value(self, value):
+        self.tracking_value = value
+
+    def set_peak_method(self, value):
+        self.peak_method = value
+
     def set_refinement_method(self, value):
         self.refinement_method = value
 
-    def compute_2d_points(self, image):
+    def set_fused_enable(self, value):
+        self.fused_enable = value
+
+    def compute_2d_points(self, image, orientation=None, band=None):
+        """Detect the laser line points (u, v) in the image.
+           With the camera orientation, image is a native camera frame:
+           the lines are segmented along the native axis and the points
+           are mapped to the oriented image. The segmented image is
+           returned in the layout of the input image.
+           With tracking, band are the points of the previous image:
+           the line is searched around them"""
         if image is not None:
-            image = self.compute_line_segmentation(image)
-            # Peak detection: center of mass
-            s = image.sum(axis=1)
-            v = np.where(s > 0)[0]
-            u = (self.calibration_data.weight_matrix * image).sum(axis=1)[v] / s[v]
+            if self.tracking_enable and band is not None and len(band[1]) > 0:
+                image, s, center = self._track_line(image, orientation, band)
+                v = np.where(s > 0)[0]
+                u = center[v]
+            elif self._use_fused_kernel():
+                image, s, center = self._fused_line(image, orientation)
+                v = np.where(s > 0)[0]
+                u = center[v]
+            else:
+                image = self.compute_line_segmentation(image, orientation=orientation)
+                s, center = self._peak(image)
+                v = np.where(s > 0)[0]
+                u = center[v]
             if self.refinement_method == 'SGF':
                 # Segmented gaussian filter
-                u, v = self._sgf(u, v, s)
+                u, v = self._sgf(u, v)
             elif self.refinement_method == 'RANSAC':
                 # Random sample consensus
                 u, v = self._ransac(u, v)
+            if orientation is not None:
+                u, v = self._flip_points(u, v, image.shape, orientation)
+                if orientation[0]:
+                    image = image.T
             return (u, v), image
 
+    def _flip_points(self, u, v, shape, orientation):
+        _, hflip, vflip = orientation
+        height, width = shape
+        if hflip:
+            u = width - 1 - u
+        if vflip:
+            # Keep the points sorted by row
+            u = u[::-1]
+            v = height - 1 - v[::-1]
+        return u, v
+
+    def _track_line(self, image, orientation, band):
+        """Segment the line in a band of 2 * tracking value pixels around
+           the points of the previous image in each row. The rows without
+           previous point or without line in the band are segmented in full.
+           Return the segmented image, and the intensity and the center of
+           mass of each row"""
+        rotate, hflip, vflip = orientation or (False, False, False)
+        height, width = image.shape[:2]
+        if rotate:
+            height, width = width, height
+        # Previous points in the segmentation layout
+        u, v = band
+        if hflip:
+            u = width - 1 - u
+        if vflip:
+            v = height - 1 - v
+        rows = np.around(v).astype(int)
+        columns = np.around(u).astype(int)
+        inside = (rows >= 0) & (rows < height) & (columns >= 0) & (columns < width)
+        rows, columns = rows[inside], columns[inside]
+        size = min(2 * self.tracking_value + 1, width)
+        lower = np.clip(columns - self.tracking_value, 0, width - size)
+        index = lower[:, np.newaxis] + np.arange(size)
+        pad = 0
+        if self.threshold_enable and self.blur_enable:
+            pad = self.blur_value / 2
+
+        segmented = np.zeros((height, width), np.uint8)
+        s = np.zeros(height)
+        center = np.zeros(height)
+        missing = np.ones(height, bool)
+        if len(rows) > 0:
+            pixels = self._band_pixels(image, orientation, rows, lower, size, pad)
+            pixels = self._window_mask(pixels, self._last_threshold())
+            segmented[rows[:, np.newaxis], index] = pixels
+            pixels_s, pixels_center = self._peak(pixels)
+            found = pixels_s > 0
+            s[rows] = pixels_s
+            center[rows[found]] = pixels_center[found] + lower[found]
+            missing[rows[found]] = False
+
+        # Full rows search in runs of rows, with their neighbor rows to blur
+        rows = np.where(missing)[0]
+        if len(rows) > 0:
+            runs = np.split(rows, np.where(np.diff(rows) > 2 * pad + 16)[0] + 1)
+            for run in runs:
+                start, stop = max(run[0] - pad, 0), min(run[-1] + 1 + pad, height)
+                if rotate:
+                    pixels = image[:, start:stop]
+                else:
+                    pixels = image[start:stop]
+                pixels = self.compute_line_segmentation(pixels, orientation=orientation)
+                pixels = pixels[run - start]
+                segmented[run] = pixels
+                s[run], center[run] = self._peak(pixels)
+        return segmented, s, center
+
+    def _use_fused_kernel(self):
+        # The kernel computes the red channel and the center of mass
+        return self.fused_enable and segmentation_kernel.numba is not None and \
+            self.red_channel == 'R (RGB)' and self.peak_method == 'Center of mass'
+
+    def _fused_line(self, image, orientation):
+        """Segment the line with the fused kernel. Return the segmented
+           image, in the layout of compute_line_segmentation, and the
+           intensity and the center of mass of each row"""
+        channel = image[:, :, 2 if orientation is not None else 0]
+        if orientation is not None and orientation[0]:
+            channel = channel.T
+        threshold, blur, window = -1, 1, -1
+        if self.threshold_enable:
+            threshold = self.threshold_value
+            if self.blur_enable:
+                blur = self.blur_value
+        if self.window_enable:
+            window = self.window_value
+        segmented = np.zeros(channel.shape, np.uint8)
+        s = np.zeros(channel.shape[0])
+        center = np.zeros(channel.shape[0])
+        segmentation_kernel.segment_rows(
+            channel, threshold, blur, window, segmented, s, center)
+        return segmented, s, center
+
+    def _band_pixels(self, image, orientation, rows, lower, size, pad):
+        """Red channel, threshold and blur of the band pixels. The blur
+           reads the neighbor pixels in the image, pad around each pixel,
+           so that the band pixels are those of the full image"""
+        rotate = orientation is not None and orientation[0]
+        height, width = image.shape[:2]
+        if rotate:
+            height, width = width, height
+        # Pixels of the blur kernels, with the border of cv2.blur
+        kernel = 2 * pad + 1
+        _rows = _reflect(rows[:, np.newaxis] + np.arange(-pad, pad + 1), height)
+        _columns = _reflect(lower[:, np.newaxis] + np.arange(-pad, size + pad), width)
+        _rows, _columns = _rows[:, :, np.newaxis], _columns[:, np.newaxis, :]
+        # Flat indices of the pixels in the image
+        if rotate:
+            index = _columns * height + _rows
+        else:
+            index = _rows * width + _columns
+        if self.red_channel == 'R (RGB)':
+            channel = 2 if orientation is not None else 0
+            pixels = image.ravel().take(3 * index + channel)
+        else:
+            pixels = self._obtain_red_channel(
+                image.reshape(-1, 3).take(index.reshape(-1, size + 2 * pad), axis=0),
+                orientation is not None)
+            pixels = pixels.reshape(len(rows), kernel, size + 2 * pad)
+        if self.threshold_enable:
+            pixels = np.where(pixels > self.threshold_value, pixels, 0)
+            if pad > 0:
+                # Box filter: column sums, then running sums along the row
+                cumulative = np.zeros((len(rows), size + 2 * pad + 1), np.int64)
+                np.cumsum(pixels.sum(axis=1), axis=1, out=cumulative[:, 1:])
+                box = cumulative[:, kernel:] - cumulative[:, :size]
+                pixels = np.floor(box * (1.0 / kernel ** 2) + 0.5).astype(np.uint8)
+                if not self.window_enable:
+                    pixels[pixels <= self.threshold_value] = 0
+                return pixels
+        return pixels[:, pad].astype(np.uint8)
+
     def compute_hough_lines(self, image):
         if image is not None:
             image = self.compute_line_segmentation(image)
@@ -81,146 +248,174 @@ class LaserSegmentation(object):
             #   u2 = u1 - height * np.tan(theta)
             return lines
 
-    def compute_line_segmentation(self, image, roi_mask=False):
+    def compute_line_segmentation(self, image, roi_mask=False, orientation=None):
+        """With the camera orientation, image is a native camera frame.
+           It is returned transposed if rotated, so that its rows are
+           the rows of the oriented image"""
         if image is not None:
             # Apply ROI mask
             if roi_mask:
                 image = self.point_cloud_roi.mask_image(image)
             # Obtain red channel
-            image = self._obtain_red_channel(image)
+            image = self._obtain_red_channel(image, orientation is not None)
             if image is not None:
-                # Threshold image
-                image = self._threshold_image(image)
+                # Threshold image. With window, the last threshold
+                # is applied by the window mask
+                image = self._threshold_image(image, not self.window_enable)
+                if orientation is not None and orientation[0]:
+                    image = image.T
                 # Window mask
-                image = self._window_mask(image)
+                image = self._window_mask(image, self._last_threshold())
             return image
 
-    def _obtain_red_channel(self, image):
+    def _obtain_red_channel(self, image, bgr=False):
         ret = None
         if self.red_channel == 'R (RGB)':
-            ret = cv2.split(image)[0]
+            ret = cv2.split(image)[2 if bgr else 0]
         elif self.red_channel == 'Cr (YCrCb)':
-            ret = cv2.split(cv2.cvtColor(image, cv2.COLOR_RGB2YCR_CB))[1]
+            code = cv2.COLOR_BGR2YCR_CB if bgr else cv2.COLOR_RGB2YCR_CB
+            ret = cv2.split(cv2.cvtColor(image, code))[1]
         elif self.red_channel == 'U (YUV)':
-            ret = cv2.split(cv2.cvtColor(image, cv2.COLOR_RGB2YUV))[1]
+            code = cv2.COLOR_BGR2YUV if bgr else cv2.COLOR_RGB2YUV
+            ret = cv2.split(cv2.cvtColor(image, code))[1]
         return ret
 
-    def _threshold_image(self, image):
+    def _threshold_image(self, image, last=True):
         if self.threshold_enable:
             image = cv2.threshold(
                 image, self.threshold_value, 255, cv2.THRESH_TOZERO)[1]
             if self.blur_enable:
                 image = cv2.blur(image, (self.blur_value, self.blur_value))
-            image = cv2.threshold(
-                image, self.threshold_value, 255, cv2.THRESH_TOZERO)[1]
+                if last:
+                    image = cv2.threshold(
+                        image, self.threshold_value, 255, cv2.THRESH_TOZERO)[1]
         return image
 
-    def _window_mask(self, image):
+    def _last_threshold(self):
+        # Threshold after the blur, applied by the window mask
+        if self.window_enable and self.threshold_enable and self.blur_enable:
+            return self.threshold_value
+
+    def _window_mask(self, image, threshold=None):
+        """Keep the pixels up to window value around the peak of each row.
+           The threshold is applied only to the kept pixels"""
         if self.window_enable:
-            peak = image.argmax(axis=1)
-            _min = peak - self.window_value
-            _max = peak + self.window_value + 1
-            mask = np.zeros_like(image)
-            for i in xrange(self.calibration_data.height):
-                mask[i, _min[i]:_max[i]] = 255
-            # Apply mask
-            image = cv2.bitwise_and(image, mask)
+            height, width = image.shape
+            size = min(2 * self.window_value + 1, width)
+            peak = image.argmax(axis=1)[:, np.newaxis]
+            # Window of each row, shifted inside the image at the borders
+            index = np.clip(peak - self.window_value, 0, width - size) + np.arange(size)
+            rows = np.arange(height)[:, np.newaxis]
+            window = image[rows, index]
+            window[np.abs(index - peak) > self.window_value] = 0
+            if threshold is not None:
+                window[window <= threshold] = 0
+            image = np.zeros_like(image)
+            image[rows, index] = window
         return image
 
+    # Peak detection
+
+    def _peak(self, image):
+        """Sub-pixel peak of each row of the segmented image.
+           Return the intensity of each row, zero without line,
+           and the peak column"""
+        if self.peak_method == 'Center of mass':
+            # Integer row sums, without full frame temporaries
+            s = image.sum(axis=1, dtype=np.int64)
+            moment = np.einsum('ij,j->i', image, np.arange(image.shape[1], dtype=np.int64))
+            return s, moment / np.maximum(s, 1).astype(float)
+        # Estimators around the maximum of each row
+        peak = image.argmax(axis=1)
+        s = image[np.arange(len(peak)), peak]
+        if self.peak_method == 'Windowed center of mass':
+            radius = max(self.window_value, 1)
+            pixels = self._gather(image, peak, radius)
+            x = np.arange(-radius, radius + 1)
+            delta = np.dot(pixels, x) / np.maximum(pixels.sum(axis=1), 1)
+        elif self.peak_method == 'Blais-Rioux':
+            delta = self._blais_rioux(self._gather(image, peak, 3))
+        else:
+            a, b, c = self._gather(image, peak, 1).T
+            if self.peak_method == 'Gaussian':
+                delta = self._gaussian(a, b, c)
+            else:
+                delta = self._parabolic(a, b, c)
+        return s, peak + delta
+
+    def _gather(self, image, peak, radius):
+        # Pixels up to radius around the peak of each row, zero out of the image
+        index = peak[:, np.newaxis] + np.arange(-radius, radius + 1)
+        inside = (index >= 0) & (index < image.shape[1])
+        rows = np.arange(len(peak))[:, np.newaxis]
+        pixels = image[rows, np.clip(index, 0, image.shape[1] - 1)].astype(float)
+        pixels[~inside] = 0
+        return pixels
+
+    def _parabolic(self, a, b, c):
+        # Vertex of the parabola through the 3 pixels
+        denominator = a - 2 * b + c
+        return np.where(denominator < 0, 0.5 * (a - c) / np.minimum(denominator, -1e-9), 0)
+
+    def _gaussian(self, a, b, c):
+        # Vertex of the parabola through the logarithm of the 3 pixels.
+        # Rows with a zero neighbor fall back to the parabolic fit
+        valid = (a > 0) & (c > 0)
+        with np.errstate(divide='ignore'):
+            la, lb, lc = np.log(a), np.log(b), np.log(c)
+        la, lb, lc = np.where(valid, la, 0), np.where(valid, lb, 0), np.where(valid, lc, 0)
+        return np.where(valid, self._parabolic(la, lb, lc), self._parabolic(a, b, c))
+
+    def _blais_rioux(self, pixels):
+        # Zero crossing of the 4th order derivative filter
+        #   g(i) = I(i - 2) + I(i - 1) - I(i + 1) - I(i + 2)
+        # next to the peak (pixels: peak - 3 ... peak + 3)
+        g = pixels[:, :3] + pixels[:, 1:4] - pixels[:, 3:6] - pixels[:, 4:]
+        after = g[:, 1] <= 0
+        g0 = np.where(after, g[:, 1], g[:, 0])
+        denominator = np.where(after, g[:, 2], g[:, 1]) - g0
+        before = np.where(after, 0, 1)
+        delta = np.where(denominator > 0, -g0 / np.maximum(denominator, 1e-9), before)
+        return np.clip(delta, 0, 1) - before
+
     # Segmented gaussian filter
 
-    def _sgf(self, u, v, s):
+    def _sgf(self, u, v, sigma=2.0):
         if len(u) > 1:
-            i = 0
-            sigma = 2.0
-            f = np.array([])
-            segments = [s[_r] for _r in np.ma.clump_unmasked(np.ma.masked_equal(s, 0))]
-            # Detect stripe segments
-            for segment in segments:
-                j = len(segment)
-                # Apply gaussian filter
-                fseg = scipy.ndimage.gaussian_filter(u[i:i + j], sigma=sigma)
-                f = np.concatenate((f, fseg))
-                i += j
+            # Gaussian kernel truncated at 4 sigma, as scipy.ndimage
+            radius = int(4.0 * sigma + 0.5)
+            x = np.arange(-radius, radius + 1)
+            weights = np.exp(-0.5 / sigma ** 2 * x ** 2)
+            weights /= weights.sum()
+            # Detect stripe segments: runs of consecutive rows
+            start = np.concatenate(([0], np.where(np.diff(v) > 1)[0] + 1))
+            length = np.diff(np.concatenate((start, [len(v)])))
+            first = np.repeat(start, length)
+            size = np.repeat(length, length)
+            position = np.arange(len(v)) - first
+            # Apply gaussian filter to all the segments at once
+            f = np.empty(len(u))
+            if len(u) > 2 * radius:
+                f[radius:len(u) - radius] = np.convolve(u, weights, 'valid')
+            # Rows near the segment borders: reflect the segment
+            border = np.where((position < radius) | (position >= size - radius))[0]
+            first, size = first[border, np.newaxis], size[border, np.newaxis]
+            index = (position[border, np.newaxis] + x) % (2 * size)
+            index = np.where(index < size, index, 2 * size - 1 - index)
+            f[border] = np.dot(u[first + index], weights)
             return f, v
         else:
             return u, v
 
-    # RANSAC implementation: https://github.com/ahojnnes/numpy-snippets/blob/master/ransac.py
-
     def _ransac(self, u, v):
         if len(u) > 1:
             data = np.vstack((v.ravel(), u.ravel())).T
-            dr, thetar = self.ransac(data, self.LinearLeastSquares2D(), 2, 2)
+            dr, thetar = ransac(data, LineModel(), 2, 2)[0]
             u = (dr - v * math.sin(thetar)) / math.cos(thetar)
         return u, v
 
-    class LinearLeastSquares2D(object):
-        '''
-        2D linear least squares using the hesse normal form:
-            d = x*sin(theta) + y*cos(theta)
-        which allows you to have vertical lines.
-        '''
-
-        def fit(self, data):
-            data_mean = data.mean(axis=0)
-            x0, y0 = data_mean
-            if data.shape[0] > 2:  # over determined
-                u, v, w = np.linalg.svd(data - data_mean)
-                vec = w[0]
-                theta = math.atan2(vec[0], vec[1])
-            elif data.shape[0] == 2:  # well determined
-                theta = math.atan2(data[1, 0] - data[0, 0], data[1, 1] - data[0, 1])
-            theta = (theta + math.pi * 5 / 2) % (2 * math.pi)
-            d = x0 * math.sin(theta) + y0 * math.cos(theta)
-            return d, theta
-
-        def residuals(self, model, data):
-            d, theta = model
-            dfit = data[:, 0] * math.sin(theta) + data[:, 1] * math.cos(theta)
-            return np.abs(d - dfit)
-
-        def is_degenerate(self, sample):
-            return False
-
-    def ransac(self, data, model_class, min_samples, threshold, max_trials=100):
-        '''
-        Fits a model to data with the RANSAC algorithm.
-        :param data: numpy.ndarray
-            data set to which the model is fitted, must be of shape NxD where
-            N is the number of data points and D the dimensionality of the data
-        :param model_class: object
-            object with the following methods implemented:
-             * fit(data): return the computed model
-             * residuals(model, data): return residuals for each data point
-             * is_degenerate(sample): return boolean value if sample choice is
-                degenerate
-            see LinearLeastSquares2D class for a sample implementation
-        :param min_samples: int
-            the minimum number of data points to fit a model
-        :param threshold: int or float
-            maximum distance for a data point to count as an inlier
-        :param max_trials: int, optional
-            maximum number of iterations for random sample selection, default 100
-        :returns: tuple
-            best model returned by model_class.fit, best inlier indices
-        '''
-
-        best_model = None
-        best_inlier_num = 0
-        best_inliers = None
-        data_idx = np.arange(data.shape[0])
-        for _ in xrange(max_trials):
-            sample = data[np.random.randint(0, data.shape[0], 2)]
-            if model_class.is_degenerate(sample):
-                continue
-            sample_model = model_class.fit(sample)
-            sample_model_residua = model_class.residuals(sample_model, data)
-            sample_model_inliers = data_idx[sample_model_residua < threshold]
-            inlier_num = sample_model_inliers.shape[0]
-            if inlier_num > best_inlier_num:
-                best_inlier_num = inlier_num
-                best_inliers = sample_model_inliers
-        if best_inliers is not None:
-            best_model = model_class.fit(data[best_inliers])
-        return best_model
+
+def _reflect(index, size):
+    # Border mode of cv2.blur: BORDER_REFLECT_101
+    index = np.abs(index)
+    return np.where(index < size, index, 2 * size - 2 - index)
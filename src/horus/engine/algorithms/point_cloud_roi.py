@@ -69,6 +69,13 @@ class PointCloudROI(object):
         else:
             return image
 
+    def image_window(self):
+        """Bounding box (umin, vmin, umax, vmax) of the ROI in the
+           image, None if the ROI is not used"""
+        if self._center_v != 0 and self._center_u != 0 and self._use_roi:
+            if self._umax > self._umin and self._vmax > self._vmin:
+                return self._umin, self._vmin, self._umax, self._vmax
+
     def mask_point_cloud(self, point_cloud, texture):
         if point_cloud is not None and texture is not None and len(point_cloud) > 0:
             rho = np.sqrt(np.square(point_cloud[0, :]) + np.square(point_cloud[1, :]))
@@ -86,6 +93,35 @@ class PointCloudROI(object):
 
             return point_cloud[:, idx], texture[:, idx]
 
+    def laser_split(self):
+        """Image column of the platform center that separates the two
+           laser lines, and index of the laser on its left side.
+           None if the lines are on the same side"""
+        if self._center_u != 0 and self.calibration_data.check_calibration():
+            columns = [self._laser_column(i) for i in xrange(2)]
+            if (columns[0] - self._center_u) * (columns[1] - self._center_u) < 0:
+                left = 0 if columns[0] < self._center_u else 1
+                return self._center_u, left
+
+    def _laser_column(self, index):
+        # Image column of the laser line on the platform, in front of its center
+        fx = self.calibration_data.camera_matrix[0][0]
+        cx = self.calibration_data.camera_matrix[0][2]
+        R = np.array(self.calibration_data.platform_rotation)
+        t = np.array(self.calibration_data.platform_translation).ravel()
+        n = np.array(self.calibration_data.laser_planes[index].normal).ravel()
+        d = self.calibration_data.laser_planes[index].distance
+        axis = R[:, 2]
+        # Intersection of the laser plane with the platform plane
+        w = n - np.dot(n, axis) * axis
+        origin = t + (d - np.dot(n, t)) / np.dot(n, w) * w
+        direction = np.cross(n, axis)
+        direction /= np.linalg.norm(direction)
+        radius = self._radious if self._radious > 0 else 50
+        point = min(origin + radius * direction, origin - radius * direction,
+                    key=lambda p: p[2])
+        return fx * point[0] / point[2] + cx
+
     def draw_cross(self, image):
         if self._center_v != 0 and self._center_u != 0 and self._show_center:
             thickness = 3
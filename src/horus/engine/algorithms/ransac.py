@@ -0,0 +1,132 @@
+# -*- coding: utf-8 -*-
+# This file is part of the Horus Project
+
+__author__ = 'Jesús Arroyo Torrens <jesus.arroyo@bq.com>'
+__copyright__ = 'Copyright (C) 2014-2016 Mundo Reader S.L.'
+__license__ = 'GNU General Public License v2 http://www.gnu.org/licenses/gpl2.html'
+
+import math
+import numpy as np
+
+# Maximum size of the residuals matrix of a batch of hypotheses
+MAX_BATCH_RESIDUALS = 2 ** 22
+
+
+def ransac(data, model, min_samples, threshold, max_trials=100,
+           batch_size=100, probability=0.99, random_state=None):
+    """Fit a model to data with the RANSAC algorithm.
+
+       The hypotheses are drawn, fitted and scored in batches: the
+       residuals of every hypothesis of a batch are computed at once.
+       The search stops after max_trials, or when the best inlier ratio
+       gives the probability of having drawn an all inliers sample.
+
+       data: NxD array of points
+       model: object with the methods
+            - fit(data): model fitted to the points
+            - fit_batch(samples): models of BxSxD samples
+            - residuals_batch(models, data): BxN residuals of the models
+       min_samples: number of points to fit a model
+       threshold: maximum residual of an inlier
+       random_state: seed or numpy RandomState
+
+       Return the model fitted to the best inliers and their indices
+    """
+    if not isinstance(random_state, np.random.RandomState):
+        random_state = np.random.RandomState(random_state)
+    n = data.shape[0]
+    batch_size = max(1, min(batch_size, MAX_BATCH_RESIDUALS // max(n, 1)))
+    best_inlier_num = 0
+    best_inliers = None
+    trials = 0
+    while trials < max_trials:
+        size = min(batch_size, max_trials - trials)
+        samples = data[random_state.randint(0, n, (size, min_samples))]
+        with np.errstate(invalid='ignore', divide='ignore'):
+            # Degenerate samples have no inliers
+            inliers = model.residuals_batch(model.fit_batch(samples), data) < threshold
+        inlier_num = inliers.sum(axis=1)
+        best = inlier_num.argmax()
+        if inlier_num[best] > best_inlier_num:
+            best_inlier_num = inlier_num[best]
+            best_inliers = np.where(inliers[best])[0]
+        trials += size
+        if best_inlier_num > 0 and \
+           trials >= required_trials(float(best_inlier_num) / n, min_samples, probability):
+            break
+    if best_inliers is not None:
+        return model.fit(data[best_inliers]), best_inliers
+    return None, None
+
+
+def required_trials(inlier_ratio, min_samples, probability):
+    """Number of trials to draw an all inliers sample with probability"""
+    outlier_probability = 1 - inlier_ratio ** min_samples
+    if outlier_probability <= 0:
+        return 0
+    if outlier_probability >= 1 or probability >= 1:
+        return float('inf')
+    return math.log(1 - probability) / math.log(outlier_probability)
+
+
+class LineModel(object):
+
+    """2D line in hesse normal form, which allows vertical lines:
+        d = x * sin(theta) + y * cos(theta)
+    """
+
+    def fit(self, data):
+        data_mean = data.mean(axis=0)
+        x0, y0 = data_mean
+        if data.shape[0] > 2:  # over determined
+            u, v, w = np.linalg.svd(data - data_mean, full_matrices=False)
+            vec = w[0]
+            theta = math.atan2(vec[0], vec[1])
+        else:  # well determined
+            theta = math.atan2(data[1, 0] - data[0, 0], data[1, 1] - data[0, 1])
+        theta = (theta + math.pi * 5 / 2) % (2 * math.pi)
+        d = x0 * math.sin(theta) + y0 * math.cos(theta)
+        return d, theta
+
+    def fit_batch(self, samples):
+        # Line through the two points of each sample
+        delta = samples[:, 1] - samples[:, 0]
+        theta = (np.arctan2(delta[:, 0], delta[:, 1]) + np.pi * 5 / 2) % (2 * np.pi)
+        x0, y0 = samples.mean(axis=1).T
+        return x0 * np.sin(theta) + y0 * np.cos(theta), theta
+
+    def residuals_batch(self, models, data):
+        d, theta = models
+        return np.abs(d[:, np.newaxis] -
+                      np.outer(np.sin(theta), data[:, 0]) -
+                      np.outer(np.cos(theta), data[:, 1]))
+
+
+class PlaneModel(object):
+
+    """3D plane: distance to the origin and normal, oriented to +z"""
+
+    def fit(self, data):
+        M, Xm = self._compute_m(data)
+        normal = np.linalg.svd(M, full_matrices=False)[0][:, 2]
+        if normal[2] < 0:
+            normal *= -1
+        dist = np.dot(normal, Xm)
+        return dist, normal, M
+
+    def fit_batch(self, samples):
+        # Plane through the three points of each sample
+        normal = np.cross(samples[:, 1] - samples[:, 0], samples[:, 2] - samples[:, 0])
+        normal /= np.linalg.norm(normal, axis=1)[:, np.newaxis]
+        normal[normal[:, 2] < 0] *= -1
+        return (normal * samples.mean(axis=1)).sum(axis=1), normal
+
+    def residuals_batch(self, models, data):
+        dist, normal = models
+        return np.abs(np.dot(normal, data.T) - dist[:, np.newaxis])
+
+    def _compute_m(self, X):
+        n = X.shape[0]
+        Xm = X.sum(axis=0) / n
+        M = np.array(X - Xm).T
+        return M, Xm
@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+# This file is part of the Horus Project
+
+__author__ = 'Jesús Arroyo Torrens <jesus.arroyo@bq.com>'
+__copyright__ = 'Copyright (C) 2014-2016 Mundo Reader S.L.'
+__license__ = 'GNU General Public License v2 http://www.gnu.org/licenses/gpl2.html'
+
+"""Fused laser segmentation: threshold, blur, window mask and center of
+mass in one pass per row. The kernel is compiled with Numba when it is
+installed; without it, the functions are plain python, only suitable
+for tests, and the OpenCV path is used instead."""
+
+import numpy as np
+
+try:
+    import numba
+except ImportError:
+    numba = None
+
+
+def jit(function):
+    if numba is None:
+        return function
+    return numba.njit(cache=True, nogil=True)(function)
+
+
+@jit
+def _reflect(index, size):
+    # Border mode of cv2.blur: BORDER_REFLECT_101
+    if size == 1:
+        return 0
+    while index < 0 or index >= size:
+        if index < 0:
+            index = -index
+        if index >= size:
+            index = 2 * size - 2 - index
+    return index
+
+
+@jit
+def segment_rows(channel, threshold, blur, window, segmented, s, center):
+    """Segment the laser line of each row of channel, as the threshold,
+       blur, threshold and window mask of LaserSegmentation.
+
+       threshold: TOZERO threshold, -1 to disable
+       blur: box filter size, 1 to disable
+       window: pixels kept around the peak, -1 to disable
+       segmented: zeroed output image, same shape as channel
+       s, center: output intensity and center of mass of each row"""
+    height, width = channel.shape
+    radius = blur // 2
+    scale = 1.0 / (blur * blur)
+    # Thresholded column sums of the rows in the blur kernel
+    columns = np.zeros(width, np.int64)
+    row = np.zeros(width, np.int64)
+    for k in range(-radius, radius + 1):
+        r = _reflect(k, height)
+        for j in range(width):
+            x = int(channel[r, j])
+            if x > threshold:
+                columns[j] += x
+    for i in range(height):
+        if i > 0:
+            add = _reflect(i + radius, height)
+            sub = _reflect(i - radius - 1, height)
+            for j in range(width):
+                x = int(channel[add, j])
+                y = int(channel[sub, j])
+                if x > threshold:
+                    columns[j] += x
+                if y > threshold:
+                    columns[j] -= y
+        # Horizontal box sum, threshold and peak
+        total = 0
+        for k in range(-radius, radius + 1):
+            total += columns[_reflect(k, width)]
+        peak = 0
+        peak_value = -1
+        for j in range(width):
+            if j > 0:
+                total += columns[_reflect(j + radius, width)] - \
+                    columns[_reflect(j - radius - 1, width)]
+            x = int(total * scale + 0.5)
+            if x <= threshold:
+                x = 0
+            row[j] = x
+            if x > peak_value:
+                peak_value = x
+                peak = j
+        # Window mask and center of mass
+        lower, upper = 0, width
+        if window >= 0:
+            lower = max(peak - window, 0)
+            upper = min(peak + window + 1, width)
+        intensity = 0
+        moment = 0
+        for j in range(lower, upper):
+            x = row[j]
+            segmented[i, j] = x
+            intensity += x
+            moment += j * x
+        s[i] = intensity
+        if intensity > 0:
+            center[i] = float(moment) / intensity
@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+# This file is part of the Horus Project
+
+__author__ = 'Jesús Arroyo Torrens <jesus.arroyo@bq.com>'
+__copyright__ = 'Copyright (C) 2014-2016 Mundo Reader S.L.'
+__license__ = 'GNU General Public License v2 http://www.gnu.org/licenses/gpl2.html'
+
+import cv2
+import numpy as np
+
+from horus.engine.driver.camera import orient_image
+
+
+class SettleDetector(object):
+
+    """Detect when the camera stream has settled after a change:
+       a laser switched on or off, or new camera settings.
+
+       The frames are compared downsampled and in gray. The stream has
+       settled when a frame differs from the reference taken before the
+       change, and the next frame is equal to it. The number of frames
+       needed for each kind of change, or to time out, is learned to
+       bound the wait.
+       Native camera frames are oriented after downsampling
+    """
+
+    def __init__(self, scale=8, threshold=16, fraction=0.0005, max_frames=10):
+        self.scale = scale
+        self.threshold = threshold
+        self.fraction = fraction
+        self.max_frames = max_frames
+        self.reset()
+
+    def reset(self):
+        self.latency = {}
+
+    def thumbnail(self, image, orientation=None):
+        if image is None:
+            return None
+        height, width = image.shape[:2]
+        image = cv2.resize(image, (max(1, width / self.scale), max(1, height / self.scale)),
+                           interpolation=cv2.INTER_AREA)
+        if orientation is not None:
+            image = orient_image(image, orientation)
+        if image.ndim == 3:
+            image = cv2.cvtColor(image, cv2.COLOR_RGB2GRAY)
+        return image
+
+    def changed(self, thumbnail, reference):
+        diff = cv2.absdiff(thumbnail, reference)
+        return np.count_nonzero(diff > self.threshold) > self.fraction * diff.size
+
+    def limit(self, kind, minimum=0):
+        """Maximum number of frames to wait for a change, at least minimum"""
+        if kind in self.latency:
+            limit = min(self.max_frames, int(np.ceil(self.latency[kind])) + 2)
+        else:
+            limit = self.max_frames
+        return max(minimum, limit)
+
+    def wait(self, kind, reference, next_frame, orientation=None, minimum=0):
+        """Read frames with next_frame until the stream has settled.
+           Without reference, the first frame is the reference and an
+           unchanged stream has settled after minimum frames.
+           Return the settled image and the number of frames read"""
+        limit = self.limit(kind, minimum)
+        seeded = reference is None
+        changed = False
+        previous = None
+        image = None
+        frames = 0
+        while frames < limit:
+            image = next_frame()
+            frames += 1
+            if image is None:
+                return image, frames
+            thumbnail = self.thumbnail(image, orientation)
+            if reference is None:
+                reference = thumbnail
+            elif changed:
+                if not self.changed(thumbnail, previous):
+                    self._learn(kind, frames)
+                    return image, frames
+            else:
+                changed = self.changed(thumbnail, reference)
+                if not changed and seeded and frames >= minimum:
+                    return image, frames
+            previous = thumbnail
+        # Timeout: a change that is not visible in the image is
+        # bounded by the minimum, the flush count
+        self._learn(kind, frames if changed else max(1, minimum))
+        return image, frames
+
+    def _learn(self, kind, frames):
+        if kind in self.latency:
+            self.latency[kind] += 0.2 * (frames - self.latency[kind])
+        else:
+            self.latency[kind] = float(frames)
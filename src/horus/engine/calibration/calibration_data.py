@@ -6,6 +6,7 @@ __copyright__ = 'Copyright (C) 2014-2016 Mundo Reader S.L.'
 __license__ = 'GNU General Public License v2 http://www.gnu.org/licenses/gpl2.html'
 
 
+import os
 import md5
 import cv2
 import numpy as np
@@ -31,10 +32,13 @@ class CalibrationData(object):
         self._distortion_vector = None
         self._roi = None
         self._dist_camera_matrix = None
-        self._weight_matrix = None
 
         self._md5_hash = None
 
+        # Undistortion maps, computed once for each calibration and resolution
+        self._maps_path = None
+        self._maps = None  # (key, maps)
+
         self.laser_planes = [LaserPlane(), LaserPlane()]
         self.platform_rotation = None
         self.platform_translation = None
@@ -43,7 +47,7 @@ class CalibrationData(object):
         if self.width != width or self.height != height:
             self.width = width
             self.height = height
-            self._compute_weight_matrix()
+            self._compute_dist_camera_matrix()
 
     @property
     def camera_matrix(self):
@@ -71,10 +75,6 @@ class CalibrationData(object):
     def dist_camera_matrix(self):
         return self._dist_camera_matrix
 
-    @property
-    def weight_matrix(self):
-        return self._weight_matrix
-
     def _compute_dist_camera_matrix(self):
         if self._camera_matrix is not None and self._distortion_vector is not None:
             self._dist_camera_matrix, self._roi = cv2.getOptimalNewCameraMatrix(
@@ -85,9 +85,90 @@ class CalibrationData(object):
             self._md5_hash.update(self._distortion_vector)
             self._md5_hash = self._md5_hash.hexdigest()
 
-    def _compute_weight_matrix(self):
-        self._weight_matrix = np.array((np.matrix(np.linspace(0, self.width - 1, self.width)).T *
-                                        np.matrix(np.ones(self.height))).T)
+    def set_maps_path(self, value):
+        """Directory to save the undistortion maps. None disables it"""
+        self._maps_path = value
+
+    def undistort_image(self, image, window=None):
+        """Undistort the image. With a window (umin, vmin, umax, vmax),
+           only that part of the undistorted image is computed"""
+        maps = self._undistort_maps(image.shape[1], image.shape[0])
+        if maps is None:
+            if window is not None:
+                umin, vmin, umax, vmax = window
+                image = image[vmin:vmax, umin:umax].copy()
+            return image
+        if window is not None:
+            umin, vmin, umax, vmax = window
+            maps = maps[0][vmin:vmax, umin:umax], maps[1][vmin:vmax, umin:umax]
+        return cv2.remap(image, maps[0], maps[1], cv2.INTER_LINEAR)
+
+    def distort_window(self, window):
+        """Window of the raw image whose pixels are undistorted
+           into the window of the undistorted image"""
+        maps = self._undistort_maps(self.width, self.height)
+        if maps is None:
+            return window
+        umin, vmin, umax, vmax = window
+        map1 = maps[0][vmin:vmax, umin:umax]
+        border = np.concatenate((map1[0], map1[-1], map1[:, 0], map1[:, -1]))
+        # Bilinear interpolation reads the next pixel
+        umin, vmin = np.maximum(border.min(axis=0), 0)
+        umax, vmax = np.minimum(border.max(axis=0) + 2, (self.width, self.height))
+        return int(umin), int(vmin), int(umax), int(vmax)
+
+    def undistort_points(self, points_2d):
+        """Map image points to the undistorted image.
+           Points outside the image are discarded"""
+        u, v = points_2d
+        if self._dist_camera_matrix is None or len(u) == 0:
+            return points_2d
+        points = np.array([u, v], np.float32).T.reshape(-1, 1, 2)
+        points = cv2.undistortPoints(points, self._camera_matrix, self._distortion_vector,
+                                     P=self._dist_camera_matrix)
+        u, v = points.reshape(-1, 2).T
+        inside = (u >= 0) & (u <= self.width - 1) & (v >= 0) & (v <= self.height - 1)
+        return u[inside], v[inside]
+
+    def _undistort_maps(self, width, height):
+        if self._dist_camera_matrix is None:
+            return None
+        key = '{0}_{1}x{2}'.format(self._md5_hash, width, height)
+        # The key and the maps are published in one assignment: the capture
+        # and the scan threads can read them concurrently
+        cached = self._maps
+        if cached is None or cached[0] != key:
+            maps = self._load_maps(key)
+            if maps is None:
+                maps = cv2.initUndistortRectifyMap(
+                    self._camera_matrix, self._distortion_vector, None,
+                    self._dist_camera_matrix, (width, height), cv2.CV_16SC2)
+                self._save_maps(key, maps)
+            cached = self._maps = (key, maps)
+        return cached[1]
+
+    def _maps_filename(self, key):
+        if self._maps_path is not None:
+            return os.path.join(self._maps_path, 'undistort_{0}.npz'.format(key))
+
+    def _load_maps(self, key):
+        filename = self._maps_filename(key)
+        if filename is not None and os.path.exists(filename):
+            try:
+                data = np.load(filename)
+                return data['map1'], data['map2']
+            except Exception:
+                pass
+
+    def _save_maps(self, key, maps):
+        filename = self._maps_filename(key)
+        if filename is not None:
+            try:
+                if not os.path.exists(self._maps_path):
+                    os.makedirs(self._maps_path)
+                np.savez(filename, map1=maps[0], map2=maps[1])
+            except (IOError, OSError):
+                pass
 
     def check_calibration(self):
         if self.camera_matrix is None or self.distortion_vector is None:
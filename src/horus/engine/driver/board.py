@@ -43,13 +43,23 @@ class Board(object):
 
         G1 Fnnn : feed rate
         G1 Xnnn : move motor
+        G4 P0   : wait until the movements are completed
         G50     : reset origin position
+        !       : feed hold
+        ~       : cycle start, resume
+        Ctrl-x  : reset, discard the queued movements
 
         M70 Tn  : switch off laser n
         M71 Tn  : switch on laser n
 
         M50 Tn  : read ldr sensor
 
+    Each command is answered when it is parsed. A movement is answered
+    when it is queued, not when it is completed: the laser and sensor
+    commands are executed while the platform is moving. G4 P0 is answered
+    when the queued movements are completed. The realtime commands
+    (!, ~, Ctrl-x) are not answered.
+
     """
 
     def __init__(self, parent=None, serial_name='/dev/ttyUSB0', baud_rate=115200):
@@ -68,6 +78,8 @@ class Board(object):
         self._laser_number = 2
         self._laser_enabled = self._laser_number * [False]
         self._tries = 0  # Check if command fails
+        # Serial port access from the scan, motion and GUI threads
+        self._lock = threading.RLock()
 
     def connect(self):
         """Open serial port and perform handshake"""
@@ -157,9 +169,54 @@ class Board(object):
             self._motor_position = 0
 
     def motor_move(self, step=0, nonblocking=False, callback=None):
+        """Move the motor and wait until the movement is completed"""
         if self._is_connected:
             self._motor_position += step * self._motor_direction
-            self.send_command("G1X{0}".format(self._motor_position), nonblocking, callback)
+            if nonblocking:
+                threading.Thread(target=self._motor_move,
+                                 args=(self._motor_position, callback)).start()
+            else:
+                self._motor_move(self._motor_position, callback)
+
+    def _motor_move(self, position, callback=None):
+        self._send_command("G1X{0}".format(position))
+        self._send_command("G4P0", callback)
+
+    def motor_start(self, step=0):
+        """Queue the movement without waiting until it is completed,
+           so that other commands can be sent while it is executed"""
+        if self._is_connected:
+            self._motor_position += step * self._motor_direction
+            self._send_command("G1X{0}".format(self._motor_position))
+
+    def motor_wait(self):
+        """Block until the queued movements are completed"""
+        if self._is_connected:
+            self._send_command("G4P0")
+
+    def motor_hold(self):
+        if self._is_connected:
+            self._send_realtime_command("!")
+
+    def motor_resume(self):
+        if self._is_connected:
+            self._send_realtime_command("~")
+
+    def motor_flush(self):
+        """Discard the queued movements. The movement must be held
+           and at rest to keep the position of the platform"""
+        if self._is_connected:
+            with self._lock:
+                self._reset()
+                # Wait for the firmware to restart
+                end = time.time() + 2
+                line = ''
+                while "['$' for help]" not in line and time.time() < end:
+                    line = self._serial_port.readline()
+                # The reset restores the default feed rate
+                speed, self._motor_speed = self._motor_speed, 0
+                self.motor_speed(speed)
+                self.motor_reset_origin()
 
     def laser_on(self, index):
         if self._is_connected:
@@ -195,24 +252,36 @@ class Board(object):
         else:
             self._send_command(req, callback, read_lines)
 
-    def _send_command(self, req, callback=None, read_lines=False):
-        """Sends the request and returns the response"""
-        ret = ''
-        if self._is_connected and req != '':
+    def _send_realtime_command(self, req):
+        """Sends the request without flushing the input nor waiting for
+           the response of the command that is being executed"""
+        with self._lock:
             if self._serial_port is not None and self._serial_port.isOpen():
                 try:
-                    self._serial_port.flushInput()
-                    self._serial_port.flushOutput()
-                    self._serial_port.write(req + "\r\n")
-                    while req != '~' and req != '!' and ret == '':
-                        ret = self.read(read_lines)
-                        time.sleep(0.01)
-                    self._success()
+                    self._serial_port.write(req)
                 except:
                     if hasattr(self, '_serial_port'):
-                        if callback is not None:
-                            callback(ret)
                         self._fail()
+
+    def _send_command(self, req, callback=None, read_lines=False):
+        """Sends the request and returns the response"""
+        ret = ''
+        if self._is_connected and req != '':
+            with self._lock:
+                if self._serial_port is not None and self._serial_port.isOpen():
+                    try:
+                        self._serial_port.flushInput()
+                        self._serial_port.flushOutput()
+                        self._serial_port.write(req + "\r\n")
+                        while req != '~' and req != '!' and ret == '':
+                            ret = self.read(read_lines)
+                            time.sleep(0.01)
+                        self._success()
+                    except:
+                        if hasattr(self, '_serial_port'):
+                            if callback is not None:
+                                callback(ret)
+                            self._fail()
         if callback is not None:
             callback(ret)
         return ret
@@ -239,10 +308,11 @@ class Board(object):
                     self.unplug_callback()
 
     def _reset(self):
-        self._serial_port.flushInput()
-        self._serial_port.flushOutput()
-        self._serial_port.write("\x18\r\n")  # Ctrl-x
-        self._serial_port.readline()
+        with self._lock:
+            self._serial_port.flushInput()
+            self._serial_port.flushOutput()
+            self._serial_port.write("\x18\r\n")  # Ctrl-x
+            self._serial_port.readline()
 
     def get_serial_list(self):
         """Obtain list of serial devices"""
@@ -10,17 +10,53 @@ import math
 import time
 import glob
 import platform
+import threading
 
 import logging
 logger = logging.getLogger(__name__)
 
 system = platform.system()
 
+# Number of frames kept by the grabber
+FRAME_BUFFER_SIZE = 8
+
 if system == 'Darwin':
     import uvc
     from uvc.mac import *
 
 
+def orient_image(image, orientation):
+    """Transform a native camera frame (BGR) with the camera
+       orientation (rotate, hflip, vflip) into an RGB image"""
+    rotate, hflip, vflip = orientation
+    if rotate:
+        image = cv2.transpose(image)
+    if hflip:
+        image = cv2.flip(image, 1)
+    if vflip:
+        image = cv2.flip(image, 0)
+    if image.ndim == 3:
+        image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+    return image
+
+
+def native_window(window, shape, orientation):
+    """Window (umin, vmin, umax, vmax) of the oriented image in
+       a native camera frame of the given shape"""
+    rotate, hflip, vflip = orientation
+    umin, vmin, umax, vmax = window
+    height, width = shape[:2]
+    if rotate:
+        height, width = width, height
+    if hflip:
+        umin, umax = width - umax, width - umin
+    if vflip:
+        vmin, vmax = height - vmax, height - vmin
+    if rotate:
+        umin, vmin, umax, vmax = vmin, umin, vmax, umax
+    return umin, vmin, umax, vmax
+
+
 class WrongCamera(Exception):
 
     def __init__(self):
@@ -62,9 +98,19 @@ class Camera(object):
 
         self._capture = None
         self._is_connected = False
-        self._reading = False
-        self._updating = False
+        # Serializes the access to the video capture
+        self._lock = threading.Lock()
         self._last_image = None
+        # Time when the last image returned was captured
+        self.timestamp = None
+        # Grabber thread and ring buffer of (sequence, timestamp, image)
+        self._use_grabber = True
+        self._grabber = None
+        self._grabbing = False
+        self._frames = threading.Condition()
+        self._buffer = [None] * FRAME_BUFFER_SIZE
+        self._sequence = 0
+        self._frame_period = 1 / 30.
         self._video_list = None
         self._tries = 0  # Check if command fails
         self._luminosity = 1.0
@@ -109,6 +155,7 @@ class Camera(object):
             for device in uvc.mac.Camera_List():
                 if device.src_id == self.camera_id:
                     self.controls = uvc.mac.Controls(device.uId)
+        self._stop_grabber()
         if self._capture is not None:
             self._capture.release()
         self._capture = cv2.VideoCapture(self.camera_id)
@@ -121,21 +168,21 @@ class Camera(object):
             self._check_video()
             self._check_camera()
             self._check_driver()
+            if self._use_grabber:
+                self._start_grabber()
             logger.info(" Done")
         else:
             raise CameraNotConnected()
 
     def disconnect(self):
-        tries = 0
         if self._is_connected:
             logger.info("Disconnecting camera {0}".format(self.camera_id))
+            self._stop_grabber()
             if self._capture is not None:
                 if self._capture.isOpened():
                     self._is_connected = False
-                    while tries < 10:
-                        tries += 1
-                        if not self._reading:
-                            self._capture.release()
+                    with self._lock:
+                        self._capture.release()
                 logger.info(" Done")
 
     def set_unplug_callback(self, value):
@@ -181,44 +228,139 @@ class Camera(object):
             if mean > 200:
                 raise WrongDriver()
 
-    def capture_image(self, flush=0, auto=False):
-        """Capture image from camera"""
+    @property
+    def use_grabber(self):
+        return self._grabber is not None
+
+    def set_use_grabber(self, value):
+        self._use_grabber = value
         if self._is_connected:
-            if self._updating:
+            if value:
+                self._start_grabber()
+            else:
+                self._stop_grabber()
+
+    @property
+    def orientation(self):
+        return self._rotate, self._hflip, self._vflip
+
+    def capture_image(self, flush=0, auto=False, since=None, native=False):
+        """Capture image from camera.
+           With the grabber, return the first image whose exposure
+           started after since, without flush, or skip flush images.
+           A native image keeps the sensor layout and BGR channels"""
+        if self._is_connected:
+            if self._grabber is not None:
+                timestamp, image = self._wait_frame(flush, since)
+                ret = image is not None
+            elif not self._lock.acquire(False):
+                # The camera settings are being updated
                 return self._last_image
             else:
-                self._reading = True
-                if auto:
-                    b, e = 0, 0
-                    while e - b < (0.030):
-                        b = time.time()
-                        self._capture.grab()
-                        e = time.time()
-                else:
-                    if flush > 0:
-                        for i in xrange(flush):
-                            self._capture.read()
-                            # Note: Windows needs read() to perform
-                            #       the flush instead of grab()
-                ret, image = self._capture.read()
-                self._reading = False
-                if ret:
-                    if self._rotate:
-                        image = cv2.transpose(image)
-                    if self._hflip:
-                        image = cv2.flip(image, 1)
-                    if self._vflip:
-                        image = cv2.flip(image, 0)
-                    self._success()
-                    image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+                try:
+                    if auto:
+                        b, e = 0, 0
+                        while e - b < (0.030):
+                            b = time.time()
+                            self._capture.grab()
+                            e = time.time()
+                    else:
+                        self._flush(flush)
+                    ret, image = self._capture.read()
+                    timestamp = time.time()
+                finally:
+                    self._lock.release()
+            if ret:
+                self._success()
+                if not native:
+                    image = orient_image(image, self.orientation)
                     self._last_image = image
-                    return image
-                else:
-                    self._fail()
-                    return None
+                self.timestamp = timestamp
+                return image
+            else:
+                self._fail()
+                return None
         else:
             return None
 
+    def flush(self, count=1):
+        """Discard buffered images"""
+        if self._is_connected:
+            if self._grabber is not None:
+                self._wait_frame(count - 1)
+            elif self._lock.acquire(False):
+                try:
+                    self._flush(count)
+                finally:
+                    self._lock.release()
+
+    def _flush(self, count):
+        for i in xrange(count):
+            self._capture.read()
+            # Note: Windows needs read() to perform
+            #       the flush instead of grab()
+
+    def _start_grabber(self):
+        if self._grabber is None:
+            with self._frames:
+                self._buffer = [None] * FRAME_BUFFER_SIZE
+                self._sequence = 0
+            self._grabbing = True
+            self._grabber = threading.Thread(target=self._grab)
+            self._grabber.daemon = True
+            self._grabber.start()
+
+    def _stop_grabber(self):
+        if self._grabber is not None:
+            self._grabbing = False
+            self._grabber.join()
+            self._grabber = None
+
+    def _grab(self):
+        """Read the camera frames continuously into the ring buffer.
+           The timestamp is taken when the frame is dequeued"""
+        while self._grabbing:
+            with self._lock:
+                ret, image = self._capture.read()
+            timestamp = time.time()
+            if not ret:
+                image = None
+            with self._frames:
+                previous = self._buffer[self._sequence % FRAME_BUFFER_SIZE]
+                if previous is not None and previous[2] is not None and image is not None:
+                    # Smoothed frame period
+                    self._frame_period += 0.1 * (
+                        timestamp - previous[1] - self._frame_period)
+                self._sequence += 1
+                self._buffer[self._sequence % FRAME_BUFFER_SIZE] = (
+                    self._sequence, timestamp, image)
+                self._frames.notify_all()
+            if not ret:
+                time.sleep(self._frame_period)
+
+    def _wait_frame(self, skip=0, since=None, timeout=1.0):
+        """Wait for the first frame whose exposure started after since,
+           or for the first frame after skipping skip frames. A frame
+           exposed after since is fresh: no frames are skipped. The
+           exposure is assumed to start one frame period before the
+           frame is dequeued"""
+        end = time.time() + timeout
+        with self._frames:
+            sequence = self._sequence + 1
+            if since is None:
+                sequence += skip
+            while True:
+                frames = [frame for frame in self._buffer
+                          if frame is not None and frame[0] >= sequence and
+                          (since is None or frame[1] - self._frame_period >= since)]
+                if len(frames) > 0:
+                    _, timestamp, image = min(frames)
+                    return timestamp, image
+                remaining = end - time.time()
+                if remaining <= 0 or not self._grabbing:
+                    return None, None
+                self._frames.wait(remaining)
+
     def save_image(self, filename, image):
         image = cv2.cvtColor(image, cv2.COLOR_RGB2BGR)
         cv2.imwrite(filename, image)
@@ -235,69 +377,65 @@ class Camera(object):
     def set_brightness(self, value):
         if self._is_connected:
             if self._brightness != value:
-                self._updating = True
-                self._brightness = value
-                if system == 'Darwin':
-                    ctl = self.controls['UVCC_REQ_BRIGHTNESS_ABS']
-                    ctl.set_val(self._line(value, 0, self._max_brightness, ctl.min, ctl.max))
-                else:
-                    value = int(value) / self._max_brightness
-                    ret = self._capture.set(cv2.cv.CV_CAP_PROP_BRIGHTNESS, value)
-                    if system == 'Linux' and ret:
-                        raise InputOutputError()
-                self._updating = False
+                with self._lock:
+                    self._brightness = value
+                    if system == 'Darwin':
+                        ctl = self.controls['UVCC_REQ_BRIGHTNESS_ABS']
+                        ctl.set_val(self._line(value, 0, self._max_brightness, ctl.min, ctl.max))
+                    else:
+                        value = int(value) / self._max_brightness
+                        ret = self._capture.set(cv2.cv.CV_CAP_PROP_BRIGHTNESS, value)
+                        if system == 'Linux' and ret:
+                            raise InputOutputError()
 
     def set_contrast(self, value):
         if self._is_connected:
             if self._contrast != value:
-                self._updating = True
-                self._contrast = value
-                if system == 'Darwin':
-                    ctl = self.controls['UVCC_REQ_CONTRAST_ABS']
-                    ctl.set_val(self._line(value, 0, self._max_contrast, ctl.min, ctl.max))
-                else:
-                    value = int(value) / self._max_contrast
-                    ret = self._capture.set(cv2.cv.CV_CAP_PROP_CONTRAST, value)
-                    if system == 'Linux' and ret:
-                        raise InputOutputError()
-                self._updating = False
+                with self._lock:
+                    self._contrast = value
+                    if system == 'Darwin':
+                        ctl = self.controls['UVCC_REQ_CONTRAST_ABS']
+                        ctl.set_val(self._line(value, 0, self._max_contrast, ctl.min, ctl.max))
+                    else:
+                        value = int(value) / self._max_contrast
+                        ret = self._capture.set(cv2.cv.CV_CAP_PROP_CONTRAST, value)
+                        if system == 'Linux' and ret:
+                            raise InputOutputError()
 
     def set_saturation(self, value):
         if self._is_connected:
             if self._saturation != value:
-                self._updating = True
-                self._saturation = value
-                if system == 'Darwin':
-                    ctl = self.controls['UVCC_REQ_SATURATION_ABS']
-                    ctl.set_val(self._line(value, 0, self._max_saturation, ctl.min, ctl.max))
-                else:
-                    value = int(value) / self._max_saturation
-                    ret = self._capture.set(cv2.cv.CV_CAP_PROP_SATURATION, value)
-                    if system == 'Linux' and ret:
-                        raise InputOutputError()
-                self._updating = False
+                with self._lock:
+                    self._saturation = value
+                    if system == 'Darwin':
+                        ctl = self.controls['UVCC_REQ_SATURATION_ABS']
+                        ctl.set_val(self._line(value, 0, self._max_saturation, ctl.min, ctl.max))
+                    else:
+                        value = int(value) / self._max_saturation
+                        ret = self._capture.set(cv2.cv.CV_CAP_PROP_SATURATION, value)
+                        if system == 'Linux' and ret:
+                            raise InputOutputError()
 
     def set_exposure(self, value, force=False):
         if self._is_connected:
             if self._exposure != value or force:
-                self._updating = True
-                self._exposure = value
-                value *= self._luminosity
-                if value < 1:
-                    value = 1
-                if system == 'Darwin':
-                    ctl = self.controls['UVCC_REQ_EXPOSURE_ABS']
-                    value = int(value * self._rel_exposure)
-                    ctl.set_val(value)
-                elif system == 'Windows':
-                    value = int(round(-math.log(value) / math.log(2)))
-                    self._capture.set(cv2.cv.CV_CAP_PROP_EXPOSURE, value)
-                else:
-                    value = int(value) / self._max_exposure
-                    ret = self._capture.set(cv2.cv.CV_CAP_PROP_EXPOSURE, value)
-                    if system == 'Linux' and ret:
-                        raise InputOutputError()
-                self._updating = False
+                with self._lock:
+                    self._exposure = value
+                    value *= self._luminosity
+                    if value < 1:
+                        value = 1
+                    if system == 'Darwin':
+                        ctl = self.controls['UVCC_REQ_EXPOSURE_ABS']
+                        value = int(value * self._rel_exposure)
+                        ctl.set_val(value)
+                    elif system == 'Windows':
+                        value = int(round(-math.log(value) / math.log(2)))
+                        self._capture.set(cv2.cv.CV_CAP_PROP_EXPOSURE, value)
+                    else:
+                        value = int(value) / self._max_exposure
+                        ret = self._capture.set(cv2.cv.CV_CAP_PROP_EXPOSURE, value)
+                        if system == 'Linux' and ret:
+                            raise InputOutputError()
 
     def set_luminosity(self, value):
         possible_values = {
@@ -312,18 +450,16 @@ class Camera(object):
         if self._is_connected:
             if self._frame_rate != value:
                 self._frame_rate = value
-                self._updating = True
-                self._capture.set(cv2.cv.CV_CAP_PROP_FPS, value)
-                self._updating = False
+                with self._lock:
+                    self._capture.set(cv2.cv.CV_CAP_PROP_FPS, value)
 
     def set_resolution(self, width, height):
         if self._is_connected:
             if self._width != width or self._height != height:
-                self._updating = True
-                self._set_width(width)
-                self._set_height(height)
-                self._update_resolution()
-                self._updating = False
+                with self._lock:
+                    self._set_width(width)
+                    self._set_height(height)
+                    self._update_resolution()
 
     def _set_width(self, value):
         self._capture.set(cv2.cv.CV_CAP_PROP_FRAME_WIDTH, value)
@@ -0,0 +1,115 @@
+# -*- coding: utf-8 -*-
+# This file is part of the Horus Project
+
+__author__ = 'Jesús Arroyo Torrens <jesus.arroyo@bq.com>'
+__copyright__ = 'Copyright (C) 2014-2016 Mundo Reader S.L.'
+__license__ = 'GNU General Public License v2 http://www.gnu.org/licenses/gpl2.html'
+
+import time
+import threading
+import collections
+
+
+def capture_size(capture):
+    """Memory used by the images of a scan capture, in bytes"""
+    size = 0
+    if capture.texture is not None:
+        size += capture.texture.nbytes
+    for laser in capture.lasers:
+        if laser is not None:
+            size += laser.nbytes
+    return size
+
+
+class CaptureQueue(object):
+
+    """Queue of scan captures bounded by their size in bytes.
+       When the queue is full, put follows the backpressure policy:
+
+        - Block: wait until the process thread gets enough captures
+        - Drop oldest: discard the oldest captures to make room
+        - Adaptive step: wait like Block, and CiclopScan coarsens
+          the motor step while the queue is filling up
+
+       A queue always accepts one capture, even if it exceeds the capacity.
+       None is used to finish the consumer and it is never blocked
+    """
+
+    def __init__(self, capacity=128 * 2 ** 20, policy='Block'):
+        self.capacity = capacity
+        self.policy = policy
+        self._condition = threading.Condition()
+        self._items = collections.deque()
+        self._bytes = 0
+        self.clear()
+
+    def clear(self):
+        with self._condition:
+            self._items.clear()
+            self._bytes = 0
+            self._puts = 0
+            self._drops = 0
+            self._stalls = 0
+            self._stall_time = 0.0
+            self._peak_bytes = 0
+
+    def put(self, capture, policy=None):
+        with self._condition:
+            if capture is None:
+                self._items.append((None, 0))
+                self._condition.notify_all()
+                return
+            size = capture_size(capture)
+            if policy is None:
+                policy = self.policy
+            if policy == 'Drop oldest':
+                while not self._fits(size) and self._items[0][0] is not None:
+                    _, dropped = self._items.popleft()
+                    self._bytes -= dropped
+                    self._drops += 1
+            elif not self._fits(size):
+                self._stalls += 1
+                begin = time.time()
+                while not self._fits(size):
+                    self._condition.wait()
+                self._stall_time += time.time() - begin
+            self._items.append((capture, size))
+            self._bytes += size
+            self._puts += 1
+            self._peak_bytes = max(self._peak_bytes, self._bytes)
+            self._condition.notify_all()
+
+    def get(self):
+        with self._condition:
+            while len(self._items) == 0:
+                self._condition.wait()
+            capture, size = self._items.popleft()
+            self._bytes -= size
+            self._condition.notify_all()
+            return capture
+
+    def qsize(self):
+        with self._condition:
+            return len(self._items)
+
+    def fill(self):
+        """Fraction of the capacity in use"""
+        with self._condition:
+            if self.capacity > 0:
+                return float(self._bytes) / self.capacity
+            return 1.0
+
+    def statistics(self):
+        with self._condition:
+            return {
+                'policy': self.policy,
+                'capacity': self.capacity,
+                'puts': self._puts,
+                'drops': self._drops,
+                'stalls': self._stalls,
+                'stall_time': self._stall_time,
+                'peak_bytes': self._peak_bytes
+            }
+
+    def _fits(self, size):
+        return len(self._items) == 0 or self._bytes + size <= self.capacity
@@ -5,16 +5,26 @@ __author__ = 'Jesús Arroyo Torrens <jesus.arroyo@bq.com>'
 __copyright__ = 'Copyright (C) 2014-2016 Mundo Reader S.L.'
 __license__ = 'GNU General Public License v2 http://www.gnu.org/licenses/gpl2.html'
 
+import os
 import time
-import Queue
+import threading
+import collections
 import numpy as np
 import datetime
 
 from horus import Singleton
 from horus.engine.scan.scan import Scan
-from horus.engine.scan.scan_capture import ScanCapture
+from horus.engine.scan.scan_pool import ScanPool
+from horus.engine.scan.capture_queue import CaptureQueue
+from horus.engine.scan.ply_writer import PLYWriter
+from horus.engine.scan.motor_kinematics import MotorKinematics
+from horus.engine.scan.scan_capture import ScanCapture, ScanResult
+from horus.engine.scan.scan_telemetry import ScanTelemetry
+from horus.engine.scan.scan_session import ScanSessionWriter, ScanSessionReader
 from horus.engine.scan.current_video import CurrentVideo
 from horus.engine.calibration.calibration_data import CalibrationData
+from horus.engine.algorithms.laser_segmentation import LaserSegmentation
+from horus.engine.algorithms.point_cloud_generation import PointCloudGeneration
 
 import logging
 logger = logging.getLogger(__name__)
@@ -22,6 +32,13 @@ logger = logging.getLogger(__name__)
 import platform
 system = platform.system()
 
+# Maximum coarsening of the motor step by the adaptive backpressure policy
+MAX_STEP_FACTOR = 4
+
+# Columns around the platform center without laser light
+# to separate the lines of a dual laser capture
+DUAL_LASER_MARGIN = 10
+
 
 class ScanError(Exception):
 
@@ -34,7 +51,11 @@ class CiclopScan(Scan):
     """Perform Ciclop scanning algorithm:
 
         - Capture Thread: capture raw images and manage motor and lasers
-        - Process Thread: compute 3D point cloud from raw images
+        - Process Thread: dispatch raw images to the worker pool, that
+          computes the 3D point cloud, and return the results in order
+
+       The raw captures can be recorded in a scan session, and a recorded
+       session can be replayed instead of the camera and the board
     """
 
     def __init__(self):
@@ -42,19 +63,47 @@ class CiclopScan(Scan):
         self.image = None
         self.current_video = CurrentVideo()
         self.calibration_data = CalibrationData()
+        self.telemetry = ScanTelemetry()
         self.capture_texture = True
         self.laser = [True, True]
         self.move_motor = True
         self.motor_step = 0
         self.motor_speed = 0
         self.motor_acceleration = 0
+        self.motion_mode = 'Stop and go'
+        self.texture_pass = 'Every angle'
+        self.texture_step = 1
         self.color = (0, 0, 0)
 
         self._theta = 0
         self._debug = False
         self._bicolor = False
-        self._scan_sleep = 0.05
-        self._captures_queue = Queue.Queue(10)
+        self._undistort_points = False
+        self._dual_laser = False
+        self._laser_split = None
+        self._second_pass = False
+        self._held = collections.deque()
+        self._first_texture = None
+        self._last_texture = None
+        self._bands = [None, None]
+        self._scan_sleep = 0.0
+        self._completed = False
+        self._captures_queue = CaptureQueue()
+        self._step_factor = 1
+        self._step_changes = 0
+        self._workers = 2
+        self._workers_backend = 'Thread'
+        self._pool = None
+        self._motion_done = threading.Event()
+        self._motion_done.set()
+        self._record_path = None
+        self._replay_path = None
+        self._session_writer = None
+        self._session_reader = None
+        self._autosave_path = None
+        self._ply_writer = None
+        self._telemetry_path = None
+        self._name = None
         self.point_cloud_callback = None
 
     def set_capture_texture(self, value):
@@ -78,19 +127,122 @@ class CiclopScan(Scan):
     def set_motor_acceleration(self, value):
         self.motor_acceleration = value
 
+    def set_motion_mode(self, value):
+        self.motion_mode = value
+
+    def set_texture_pass(self, value):
+        self.texture_pass = value
+
+    def set_texture_step(self, value):
+        self.texture_step = max(1, int(value))
+
     def set_debug(self, value):
         self._debug = value
 
+    def set_dual_laser(self, value):
+        self._dual_laser = value
+
+    def set_undistort_points(self, value):
+        self._undistort_points = value
+
     def set_scan_sleep(self, value):
         self._scan_sleep = value / 1000.
 
+    def set_queue_size(self, value):
+        self._captures_queue.capacity = int(value * 2 ** 20)
+
+    def set_queue_policy(self, value):
+        self._captures_queue.policy = value
+
+    def set_workers(self, value):
+        self._workers = value
+
+    def set_workers_backend(self, value):
+        self._workers_backend = value
+
+    def set_record_path(self, value):
+        self._record_path = value
+
+    def set_replay_path(self, value):
+        self._replay_path = value
+
+    def set_autosave_path(self, value):
+        self._autosave_path = value
+
+    def set_telemetry_path(self, value):
+        self._telemetry_path = value
+
     def _initialize(self):
         self.image = None
         self.image_capture.stream = False
         self._theta = 0
         self._progress = 0
-        self._captures_queue.queue.clear()
+        self._completed = False
+        self._motion_done.set()
+        self._captures_queue.clear()
+        self._step_factor = 1
+        self._step_changes = 0
         self._begin = time.time()
+        self._end = self._begin
+        self._name = datetime.datetime.now().strftime('scan_%Y%m%d_%H%M%S')
+        self.telemetry.reset()
+
+        # Setup scan session
+        self._session_reader = None
+        if self._replay_path:
+            self._session_reader = ScanSessionReader(self._replay_path)
+            self._session_reader.open()
+            # Captures are processed with the recorded calibration and
+            # segmentation, restored at the end of the scan
+            self._session_reader.apply_settings()
+            self._range = len(self._session_reader)
+
+        # Setup texture capture in a second rotation
+        if self._session_reader is not None:
+            self._second_pass = self._session_reader.settings.get('second_pass', False)
+        else:
+            self._second_pass = self.capture_texture and not self._bicolor and \
+                self.texture_pass == 'Second pass' and \
+                self.move_motor and self.motion_mode != 'Continuous'
+        self._held.clear()
+        self._first_texture = None
+        self._last_texture = None
+        self._bands = [None, None]
+
+        # The captures are cropped to the ROI window of the image
+        if self._session_reader is None:
+            self.image_capture.set_window(self.point_cloud_roi.image_window())
+
+        self._session_writer = None
+        if self._record_path:
+            self._session_writer = ScanSessionWriter(os.path.join(
+                self._record_path, datetime.datetime.now().strftime('session_%Y%m%d_%H%M%S')))
+            self._session_writer.open({
+                'capture_texture': self.capture_texture,
+                'laser': self.laser,
+                'motor_step': self.motor_step,
+                'second_pass': self._second_pass,
+                'raw_lasers': self._raw_lasers(),
+                'orientation': self._native_orientation()})
+
+        # Setup point cloud autosave
+        self._ply_writer = None
+        if self._autosave_path:
+            self._ply_writer = PLYWriter(
+                os.path.join(self._autosave_path, self._name + '.ply'))
+            self._ply_writer.open()
+
+        # Setup dual laser capture
+        self._laser_split = None
+        if self._dual_laser and self.laser[0] and self.laser[1]:
+            self._laser_split = self.point_cloud_roi.laser_split()
+            if self._laser_split is None:
+                logger.info(" The laser lines can not be separated: dual laser capture disabled")
+
+        # Setup worker pool
+        self._pool = ScanPool(self._workers, self._workers_backend,
+                              load_engine_state, (save_engine_state(),))
+        self._pool.start()
 
         # Setup console
         logger.info("Start scan")
@@ -101,138 +253,441 @@ class CiclopScan(Scan):
             print string_time + " elapsed angle: 0º"
             print string_time + " capture: 0 ms"
 
-        # Setup scanner
-        self.driver.board.lasers_off()
-        if self.move_motor:
-            self.driver.board.motor_enable()
-            self.driver.board.motor_reset_origin()
-            self.driver.board.motor_speed(self.motor_speed)
-            self.driver.board.motor_acceleration(self.motor_acceleration)
-        else:
-            self.driver.board.motor_disable()
+        # Setup scanner: a replayed session does not use the board
+        if self._session_reader is None:
+            self.driver.board.lasers_off()
+            if self.move_motor:
+                self.driver.board.motor_enable()
+                self.driver.board.motor_reset_origin()
+                self.driver.board.motor_speed(self.motor_speed)
+                self.driver.board.motor_acceleration(self.motor_acceleration)
+            else:
+                self.driver.board.motor_disable()
 
     def _capture(self):
+        if self._session_reader is not None:
+            self._replay()
+            return
+        if self.move_motor and self.motion_mode == 'Continuous':
+            self._capture_continuous()
+            return
         # Flush buffer of texture captures
         self.image_capture.flush_laser()
+        try:
+            while self.is_scanning:
+                if self._inactive:
+                    self.image_capture.stream = True
+                    # Block until resume or stop
+                    self._resume_event.wait()
+                    continue
+                self.image_capture.stream = False
+                if abs(self._theta) >= 360.0:
+                    self._completed = True
+                    break
+                begin = time.time()
+                pipelined = self.move_motor and self.motion_mode == 'Pipelined'
+                # The last movement ends the turn at the origin, where the
+                # second texture pass starts, even with adaptive step
+                step = self._adapt_step()
+                remaining = 360.0 - abs(self._theta)
+                if abs(step) > remaining:
+                    step = np.copysign(remaining, step)
+                try:
+                    # Capture images
+                    capture = self._capture_images()
+                    if pipelined:
+                        # The next angle is prepared while the platform is moving
+                        self._start_motion(step)
+                    # Put images into queue
+                    self._captures_queue.put(capture)
+                    self.telemetry.record('queue_depth', self._captures_queue.qsize())
+                except Exception as e:
+                    self.is_scanning = False
+                    response = (False, e)
+                    if self._after_callback is not None:
+                        self._after_callback(response)
+                    break
+
+                # Move motor
+                if self.move_motor:
+                    if not pipelined:
+                        motion = time.time()
+                        self.driver.board.motor_move(step)
+                        self._settle()
+                        self.telemetry.record('motion', time.time() - motion)
+                else:
+                    time.sleep(0.130)  # Time for 0.45º movement
+
+                # Update theta
+                self._theta += step
+                # Refresh progress
+                if self.motor_step != 0:
+                    self._progress = abs(self._theta / self.motor_step)
+                    self._range = abs(360.0 / self.motor_step)
+                    if self._second_pass:
+                        self._range *= 1 + 1.0 / self.texture_step
+
+                # Print info
+                self._end = time.time()
+                string_time = str(datetime.datetime.now())[:-3] + " - "
+
+                if self._debug and system == 'Linux':
+                    # Cursor up + remove lines
+                    print "\x1b[1A\x1b[1A\x1b[1A\x1b[1A\x1b[2K\x1b[1A"
+                    print string_time + " elapsed progress: {0} %".format(
+                        int(self._theta / 3.6))
+                    print string_time + " elapsed time: {0}".format(
+                        time.strftime("%M' %S\"", time.gmtime(self._end - self._begin)))
+                    print string_time + " elapsed angle: {0}º".format(
+                        float(self._theta))
+                    print string_time + " capture: {0} ms".format(
+                        int((self._end - begin) * 1000))
+
+            if self._completed and self._second_pass:
+                self._completed = False
+                self._capture_textures()
+        finally:
+            # Wake up the process thread: no more captures
+            self._captures_queue.put(None)
+
+        self._wait_motion()
+        self.driver.board.lasers_off()
+        self.driver.board.motor_disable()
+
+    def _capture_textures(self):
+        # Second rotation: a texture every texture_step angles, without
+        # laser images. The camera stays in texture mode
+        self._wait_motion()
+        self.image_capture.set_mode_texture()
+        step = self.texture_step * self.motor_step
+        count = 0
         while self.is_scanning:
             if self._inactive:
                 self.image_capture.stream = True
-                time.sleep(0.1)
-            else:
+                # Block until resume or stop
+                self._resume_event.wait()
+                continue
+            self.image_capture.stream = False
+            theta = count * step
+            if abs(theta) >= 360.0:
+                self._completed = True
+                break
+            try:
+                capture = ScanCapture()
+                capture.theta = np.deg2rad(theta)
+                capture.second_pass = True
+                self.image_capture.reset_timings()
+                begin = time.time()
+                capture.texture = self.image_capture.capture_texture()
+                capture.texture_window = self.image_capture.capture_window()
+                self.current_video.set_texture(capture.texture, capture.texture_window)
+                self.image_capture.timings['capture'] = time.time() - begin
+                self.telemetry.record_all(self.image_capture.timings)
+                self._captures_queue.put(capture)
+            except Exception as e:
+                self.is_scanning = False
+                response = (False, e)
+                if self._after_callback is not None:
+                    self._after_callback(response)
+                break
+
+            motion = time.time()
+            self.driver.board.motor_move(step)
+            self._settle()
+            self.telemetry.record('motion', time.time() - motion)
+
+            count += 1
+            self._progress = abs(360.0 / self.motor_step) + count
+            self._end = time.time()
+
+    def _capture_continuous(self):
+        # The platform rotates at the motor speed while the frames are captured.
+        # The angle of each frame is computed from its timestamp
+        direction = -1 if self.motor_step < 0 else 1
+        kinematics = MotorKinematics(self.motor_speed, self.motor_acceleration)
+        # Full turn at cruise speed, then decelerate
+        distance = 360.0 + abs(self.motor_step) + kinematics.braking_distance()
+        hold = False
+        self.image_capture.flush_laser()
+        try:
+            # The movement is answered when it is queued: the laser commands
+            # are sent while the platform is moving, tracked with the kinematics
+            kinematics.start(time.time())
+            self.driver.board.motor_start(direction * distance)
+            while self.is_scanning:
+                if self._inactive:
+                    self.image_capture.stream = True
+                    self.driver.board.motor_hold()
+                    kinematics.hold(time.time())
+                    hold = True
+                    # Block until resume or stop
+                    self._resume_event.wait()
+                    if self.is_scanning:
+                        self.driver.board.motor_resume()
+                        kinematics.start(time.time())
+                        hold = False
+                    continue
                 self.image_capture.stream = False
+                begin = time.time()
+                try:
+                    capture = self._capture_images(kinematics, direction)
+                except Exception as e:
+                    self.is_scanning = False
+                    response = (False, e)
+                    if self._after_callback is not None:
+                        self._after_callback(response)
+                    break
+                # Angle of the last frame
+                thetas = [theta for theta in capture.laser_thetas if theta is not None]
+                self._theta = np.rad2deg(max([capture.theta] + thetas, key=abs))
                 if abs(self._theta) >= 360.0:
+                    self._completed = True
                     break
-                else:
-                    begin = time.time()
-                    try:
-                        # Capture images
-                        capture = self._capture_images()
-                        # Put images into queue
-                        self._captures_queue.put(capture)
-                    except Exception as e:
-                        self.is_scanning = False
-                        response = (False, e)
-                        if self._after_callback is not None:
-                            self._after_callback(response)
-                        break
-
-                    # Move motor
-                    if self.move_motor:
-                        self.driver.board.motor_move(self.motor_step)
-                    else:
-                        time.sleep(0.130)  # Time for 0.45º movement
-
-                    # Update theta
-                    self._theta += self.motor_step
-                    # Refresh progress
-                    if self.motor_step != 0:
-                        self._progress = abs(self._theta / self.motor_step)
-                        self._range = abs(360.0 / self.motor_step)
-
-                    # Print info
-                    self._end = time.time()
-                    string_time = str(datetime.datetime.now())[:-3] + " - "
-
-                    if self._debug and system == 'Linux':
-                        # Cursor up + remove lines
-                        print "\x1b[1A\x1b[1A\x1b[1A\x1b[1A\x1b[2K\x1b[1A"
-                        print string_time + " elapsed progress: {0} %".format(
-                            int(self._theta / 3.6))
-                        print string_time + " elapsed time: {0}".format(
-                            time.strftime("%M' %S\"", time.gmtime(self._end - self._begin)))
-                        print string_time + " elapsed angle: {0}º".format(
-                            float(self._theta))
-                        print string_time + " capture: {0} ms".format(
-                            int((self._end - begin) * 1000))
-            # Sleep
-            time.sleep(self._scan_sleep)
-
+                self._captures_queue.put(capture)
+                self.telemetry.record('queue_depth', self._captures_queue.qsize())
+
+                # Refresh progress
+                if self.motor_step != 0:
+                    self._progress = abs(self._theta / self.motor_step)
+                    self._range = abs(360.0 / self.motor_step)
+                self._end = time.time()
+                if self._debug:
+                    logger.debug("Capture {0:.2f}º {1} ms".format(
+                        float(self._theta), int((self._end - begin) * 1000)))
+        finally:
+            try:
+                # The board is released before the end of the scan
+                self._stop_continuous(kinematics, distance, hold)
+            finally:
+                # Wake up the process thread: no more captures
+                self._captures_queue.put(None)
+
+    def _stop_continuous(self, kinematics, distance, hold):
+        if not self._completed:
+            # Stop the platform and discard the rest of the turn
+            if not hold:
+                self.driver.board.motor_hold()
+                if self.driver.is_connected:
+                    time.sleep(kinematics.braking_time(time.time()))
+            self.driver.board.motor_flush()
+        elif self.driver.is_connected:
+            time.sleep(kinematics.remaining_time(time.time(), distance))
+            # Synchronize with the end of the movement
+            self.driver.board.motor_wait()
         self.driver.board.lasers_off()
         self.driver.board.motor_disable()
 
-    def _capture_images(self):
+    def _replay(self):
+        try:
+            for capture in self._session_reader.captures():
+                if self._inactive:
+                    # Block until resume or stop
+                    self._resume_event.wait()
+                if not self.is_scanning:
+                    break
+                self._theta = np.rad2deg(capture.theta)
+                if capture.texture is not None:
+                    self.current_video.set_texture(capture.texture, capture.texture_window)
+                self.current_video.set_laser(capture.lasers, capture.orientation, capture.window)
+                # Replayed captures are never dropped
+                self._captures_queue.put(capture, 'Block')
+                self._progress += 1
+                self._end = time.time()
+            else:
+                self._completed = True
+        finally:
+            # Wake up the process thread: no more captures
+            self._captures_queue.put(None)
+
+    def _adapt_step(self):
+        # Coarsen the motor step while the processing falls behind
+        if self._captures_queue.policy == 'Adaptive step':
+            fill = self._captures_queue.fill()
+            if fill > 0.75 and self._step_factor < MAX_STEP_FACTOR:
+                self._step_factor *= 2
+                self._step_changes += 1
+                logger.info(" Motor step x{0}".format(self._step_factor))
+            elif fill < 0.25 and self._step_factor > 1:
+                self._step_factor /= 2
+                self._step_changes += 1
+                logger.info(" Motor step x{0}".format(self._step_factor))
+        return self._step_factor * self.motor_step
+
+    def _start_motion(self, step):
+        if self.driver.is_connected:
+            self._motion_done.clear()
+            self.driver.board.motor_move(
+                step, nonblocking=True, callback=lambda ret: self._motion_done.set())
+
+    def _wait_motion(self):
+        if not self._motion_done.is_set():
+            begin = time.time()
+            self._motion_done.wait()
+            self._settle()
+            self.telemetry.record('motion', time.time() - begin)
+
+    def _settle(self):
+        # Optional settle time after each movement
+        if self._scan_sleep > 0:
+            time.sleep(self._scan_sleep)
+
+    def _capture_images(self, kinematics=None, direction=1):
         capture = ScanCapture()
         capture.theta = np.deg2rad(self._theta)
+        self.image_capture.reset_timings()
 
-        if self.capture_texture:
+        # Camera settings are sent while the platform is moving,
+        # the exposure starts when the movement is completed
+        capture_texture = self.capture_texture and not self._second_pass
+        if capture_texture:
+            self.image_capture.set_mode_texture()
+        else:
+            self.image_capture.set_mode_laser()
+        if kinematics is None:
+            self._wait_motion()
+        begin = time.time()
+
+        if capture_texture:
             capture.texture = self.image_capture.capture_texture()
+            capture.texture_window = self.image_capture.capture_window()
+            texture_timestamp = self.image_capture.timestamp
             # Flush buffer to improve the synchronization when
             # the texture exposure is around 33 ms
             self.image_capture.flush_laser()
-        else:
-            r, g, b = self.color
-            ones = np.zeros((self.calibration_data.height,
-                             self.calibration_data.width, 3), np.uint8)
-            ones[:, :, 0] = r
-            ones[:, :, 1] = g
-            ones[:, :, 2] = b
-            capture.texture = ones
-
-        if self.laser[0] and self.laser[1]:
-            capture.lasers = self.image_capture.capture_lasers()
+
+        # Native laser images are segmented before the orientation
+        # and the undistortion
+        capture.raw_lasers = self._raw_lasers()
+        capture.orientation = self._native_orientation()
+        native = capture.orientation is not None
+        capture.window = self.image_capture.capture_window(native)
+        lasers = None
+        if self._laser_split is not None:
+            lasers = self._capture_dual_lasers(capture.orientation, capture.window)
+        if lasers is not None:
+            capture.lasers = lasers
+        elif self.laser[0] and self.laser[1]:
+            capture.lasers = self.image_capture.capture_lasers(native)
         else:
             for i in xrange(2):
                 if self.laser[i]:
-                    capture.lasers[i] = self.image_capture.capture_laser(i)
+                    capture.lasers[i] = self.image_capture.capture_laser(i, native)
+
+        if kinematics is not None:
+            # Angle of each frame from its capture timestamp
+            for i in xrange(2):
+                if capture.lasers[i] is not None:
+                    capture.laser_thetas[i] = np.deg2rad(
+                        direction * kinematics.angle(self.image_capture.laser_timestamps[i]))
+            thetas = [theta for theta in capture.laser_thetas if theta is not None]
+            if capture_texture:
+                capture.theta = np.deg2rad(direction * kinematics.angle(texture_timestamp))
+            elif len(thetas) > 0:
+                capture.theta = thetas[0]
 
         # Set current video images
-        self.current_video.set_texture(capture.texture)
-        self.current_video.set_laser(capture.lasers)
+        if capture.texture is not None:
+            self.current_video.set_texture(capture.texture, capture.texture_window)
+        self.current_video.set_laser(capture.lasers, capture.orientation, capture.window)
+
+        self.image_capture.timings['capture'] = time.time() - begin
+        self.telemetry.record_all(self.image_capture.timings)
 
         return capture
 
+    def _capture_dual_lasers(self, orientation, window=None):
+        """Capture both lasers in one image and split it by the platform
+           center. Return None if a line crosses the center"""
+        image = self.image_capture.capture_all_lasers(orientation is not None)
+        if image is None:
+            return None
+        column, left = self._laser_split
+        if window is not None:
+            column -= window[0]
+        band = image[column_index(
+            image, column - DUAL_LASER_MARGIN, column + DUAL_LASER_MARGIN, orientation)]
+        band = self.laser_segmentation.compute_line_segmentation(band, orientation=orientation)
+        separated = band is None or not band.any()
+        self.telemetry.record('dual_laser', float(separated))
+        if not separated:
+            return None
+        lasers = [None, None]
+        for i, (start, stop) in enumerate(((0, column), (column, None))):
+            index = column_index(image, start, stop, orientation)
+            laser = np.zeros_like(image)
+            laser[index] = image[index]
+            lasers[left if i == 0 else 1 - left] = laser
+        return lasers
+
+    def _raw_lasers(self):
+        return self._undistort_points and self.image_capture.use_distortion
+
+    def _native_orientation(self):
+        # Laser images undistorted as images must be oriented
+        if self._raw_lasers() or not self.image_capture.use_distortion:
+            return self.driver.camera.orientation
+
     def _process(self):
-        ret = False
-        while self.is_scanning:
-            if self._inactive:
-                self.image_detection.stream = True
-                time.sleep(0.1)
+        pending = collections.deque()
+        max_pending = 2 * max(1, self._pool.workers)
+        error = None
+        while True:
+            # Block until the next capture is available
+            capture = self._captures_queue.get()
+            if capture is None:
+                break
+            # Discard the pending captures if the scan has been stopped
+            if self.is_scanning:
+                try:
+                    self._process_capture(capture, pending, max_pending)
+                except Exception as e:
+                    # Stop the capture: the queue is drained until its end
+                    logger.error("Error processing the scan: {0}".format(e))
+                    error = e
+                    self.stop()
+
+        try:
+            if self._completed and self.is_scanning:
+                try:
+                    while len(pending) > 0:
+                        self._handle_result(pending.popleft().get())
+                    if self._second_pass:
+                        self._apply_texture(None)
+                    self._pool.close()
+                except Exception as e:
+                    logger.error("Error processing the scan: {0}".format(e))
+                    error = e
+                    self._pool.terminate()
             else:
-                self.image_detection.stream = False
-                if self._theta >= 360.0:
-                    self.is_scanning = False
-                    ret = True
-                    break
-                else:
-                    if not self._captures_queue.empty():
-                        # Get capture from queue
-                        capture = self._captures_queue.get(timeout=0.1)
-                        self._captures_queue.task_done()
-                        # Process capture
-                        self._process_capture(capture)
-            # Sleep
-            time.sleep(self._scan_sleep)
-
-        if ret:
-            response = (True, None)
-        else:
-            response = (False, ScanError())
+                self._pool.terminate()
+        finally:
+            if self._session_reader is not None:
+                self._session_reader.restore_settings()
+        self._held.clear()
+
+        ret = self._completed and error is None
+        self.is_scanning = False
+
+        try:
+            if self._session_writer is not None:
+                self._session_writer.close(ret)
+        except Exception as e:
+            logger.error("Error saving the scan session: {0}".format(e))
+            error = error or e
+        try:
+            if self._ply_writer is not None:
+                self._ply_writer.close()
+        except Exception as e:
+            logger.error("Error saving the point cloud: {0}".format(e))
+            error = error or e
+        ret = ret and error is None
 
         # Cursor down
         # if self._debug and system == 'Linux':
         #     print "\x1b[1C"
 
         self.image_capture.stream = True
+        self.image_capture.set_window(None)
 
         progress = 0
         if self._range > 0:
@@ -240,53 +695,259 @@ class CiclopScan(Scan):
         logger.info("Finish scan {0} %  Time {1}".format(
             progress,
             time.strftime("%M' %S\"", time.gmtime(self._end - self._begin))))
+        statistics = self.statistics()
+        logger.info(" Workers: {0} {1}  Utilization {2} %  Task {3} ms".format(
+            statistics['workers']['workers'], statistics['workers']['backend'],
+            int(100 * statistics['workers']['utilization']),
+            int(1000 * statistics['workers']['task_time'])))
+        logger.info(" Queue: {0}  Drops {1}  Stalls {2} ({3} ms)  Peak {4} MB".format(
+            statistics['queue']['policy'], statistics['queue']['drops'],
+            statistics['queue']['stalls'], int(1000 * statistics['queue']['stall_time']),
+            statistics['queue']['peak_bytes'] / 2 ** 20))
+        self._save_telemetry(ret, statistics)
+
+        # The statistics are returned with the result of the scan
+        if ret:
+            response = (True, statistics)
+        elif error is not None:
+            response = (False, error)
+        else:
+            response = (False, ScanError())
 
         if self._after_callback is not None:
             self._after_callback(response)
 
-    def _process_capture(self, capture):
-        # Current video arrays
-        image = None
-        images = [None, None]
-        points = [None, None]
-
-        # begin = time.time()
-
+    def _process_capture(self, capture, pending, max_pending):
+        if self._session_writer is not None:
+            self._session_writer.write(capture)
+        if capture.second_pass:
+            # All the laser captures precede the textures
+            while len(pending) > 0:
+                self._handle_result(pending.popleft().get())
+            self._apply_texture(capture)
+            return
+        if self.laser_segmentation.tracking_enable:
+            # Lines of the last processed angle
+            capture.bands = list(self._bands)
+        pending.append(self._pool.submit(process_capture, capture, self._bicolor, self.color))
+        # Results are emitted in capture order
+        while len(pending) > max_pending:
+            self._handle_result(pending.popleft().get())
+        while len(pending) > 0 and pending[0].ready():
+            self._handle_result(pending.popleft().get())
+
+    def statistics(self):
+        """Worker pool and capture queue statistics of the last scan"""
+        queue = self._captures_queue.statistics()
+        queue['step_changes'] = self._step_changes
+        return {'workers': self._pool.statistics(), 'queue': queue}
+
+    def _save_telemetry(self, completed, statistics):
+        summary = self.telemetry.summary()
+        logger.info(" Stages: " + "  ".join(
+            "{0} {1} ms".format(stage, int(1000 * values['mean']))
+            for stage, values in sorted(summary.iteritems())
+            if stage not in ('queue_depth', 'points')))
+        if self._telemetry_path:
+            self.telemetry.dump(os.path.join(self._telemetry_path, self._name + '.json'), {
+                'completed': completed,
+                'elapsed_time': self._end - self._begin,
+                'motion_mode': self.motion_mode,
+                'motor_step': self.motor_step,
+                'workers': statistics['workers'],
+                'queue': statistics['queue']
+            })
+
+    def _handle_result(self, result):
         for i in xrange(2):
-            if capture.lasers[i] is not None:
-                image = capture.lasers[i]
-                self.image = image
-                # Compute 2D points from images
-                points_2d, image = self.laser_segmentation.compute_2d_points(image)
-                images[i] = image
-                points[i] = points_2d
-                # Compute point cloud from 2D points
-                point_cloud = self.point_cloud_generation.compute_point_cloud(
-                    capture.theta, points_2d, i)
-                # Compute point cloud texture
-                u, v = points_2d
-
-                if self._bicolor:
-                    if i == 0:
-                        r, g, b = 255, 0, 0
-                    else:
-                        r, g, b = 0, 255, 0
-                    texture = np.zeros((3, len(v)), np.uint8)
-                    texture[0, :] = r
-                    texture[1, :] = g
-                    texture[2, :] = b
-                else:
-                    texture = capture.texture[v, np.around(u).astype(int)].T
-
+            if result.bands[i] is not None:
+                self._bands[i] = result.bands[i]
+        if self._second_pass:
+            # The result is held until the textures of its angle are
+            # captured. The segmented images are only shown
+            self._show_result(result)
+            result.images = [None, None]
+            self._held.append(result)
+        else:
+            self._emit_result(result)
+
+    def _apply_texture(self, capture):
+        """Color the held results up to the angle of the texture capture,
+           interpolated with the previous texture, and emit them.
+           Without capture, the rest of the results are interpolated
+           with the first texture, one turn later"""
+        if capture is not None:
+            texture = (abs(capture.theta), capture.texture, capture.texture_window)
+        elif self._first_texture is not None:
+            angle, image, window = self._first_texture
+            texture = (angle + 2 * np.pi, image, window)
+        else:
+            texture = None
+        while len(self._held) > 0 and (texture is None or abs(self._held[0].theta) <= texture[0]):
+            result = self._held.popleft()
+            if texture is not None:
+                for i in xrange(2):
+                    if result.points_2d[i] is not None:
+                        result.textures[i] = interpolate_texture(
+                            abs(result.theta), result.points_2d[i], self._last_texture, texture)
+            self._emit_result(result)
+        if capture is not None:
+            if self._first_texture is None:
+                self._first_texture = texture
+            self._last_texture = texture
+
+    def _emit_result(self, result):
+        begin = time.time()
+        for i in xrange(2):
+            if result.point_clouds[i] is not None:
+                if self._ply_writer is not None:
+                    point_cloud = self.point_cloud_roi.mask_point_cloud(
+                        result.point_clouds[i], result.textures[i])
+                    if point_cloud is not None:
+                        self._ply_writer.write(*point_cloud)
                 if self.point_cloud_callback:
                     self.point_cloud_callback(self._range, self._progress,
-                                              (point_cloud, texture))
+                                              (result.point_clouds[i], result.textures[i]))
 
-        # Set current video images
-        self.current_video.set_gray(images)
-        self.current_video.set_line(points, image)
+        if any(image is not None for image in result.images):
+            self._show_result(result)
 
-        # Print info
-        """if self._debug and system == 'Linux':
-            print string_time + " process: {0} ms".format(
-                int((time.time() - begin) * 1000))"""
+        self.telemetry.record_all(result.timings)
+        self.telemetry.record('points', sum(
+            point_cloud.shape[1] for point_cloud in result.point_clouds if point_cloud is not None))
+        self.telemetry.record('callback', time.time() - begin)
+
+    def _show_result(self, result):
+        # Set current video images
+        image = None
+        for i in xrange(2):
+            if result.images[i] is not None:
+                image = result.images[i]
+        self.current_video.set_gray(result.images, result.orientation, result.window)
+        self.current_video.set_line(result.points_2d, image, result.orientation, result.window)
+
+
+def column_index(image, start, stop=None, orientation=None):
+    """Index of the columns [start, stop) of the oriented image in
+       image, which is a native camera frame if orientation is given"""
+    rotate, hflip = False, False
+    if orientation is not None:
+        rotate, hflip, _ = orientation
+    axis = 0 if rotate else 1
+    width = image.shape[axis]
+    if stop is None:
+        stop = width
+    start, stop = max(start, 0), min(stop, width)
+    if hflip:
+        start, stop = width - stop, width - start
+    index = [slice(None)] * image.ndim
+    index[axis] = slice(start, stop)
+    return tuple(index)
+
+
+def process_capture(capture, bicolor=False, color=(0, 0, 0)):
+    """Compute the point cloud and its texture from a scan capture.
+       Without texture image, the points get a constant color.
+       This function is run by the scan pool workers"""
+    calibration_data = CalibrationData()
+    laser_segmentation = LaserSegmentation()
+    point_cloud_generation = PointCloudGeneration()
+
+    result = ScanResult()
+    result.theta = capture.theta
+    result.orientation = capture.orientation
+    result.window = capture.window
+
+    for i in xrange(2):
+        if capture.lasers[i] is not None:
+            # Compute 2D points from images
+            begin = time.time()
+            points_2d, image = laser_segmentation.compute_2d_points(
+                capture.lasers[i], capture.orientation, capture.bands[i])
+            result.bands[i] = points_2d
+            if capture.window is not None:
+                # Points of the cropped image in the full image
+                points_2d = (points_2d[0] + capture.window[0], points_2d[1] + capture.window[1])
+            result.images[i] = image
+            result.points_2d[i] = points_2d
+            result.timings['segmentation'] += time.time() - begin
+            # Compute point cloud from 2D points
+            begin = time.time()
+            if capture.raw_lasers:
+                points_2d = calibration_data.undistort_points(points_2d)
+                result.points_2d[i] = points_2d
+            theta = capture.theta
+            if capture.laser_thetas[i] is not None:
+                theta = capture.laser_thetas[i]
+            result.point_clouds[i] = point_cloud_generation.compute_point_cloud(
+                theta, points_2d, i)
+            result.timings['point_cloud'] += time.time() - begin
+            # Compute point cloud texture
+            begin = time.time()
+            size = len(points_2d[1])
+            if bicolor:
+                if i == 0:
+                    texture = constant_texture((255, 0, 0), size)
+                else:
+                    texture = constant_texture((0, 255, 0), size)
+            elif capture.texture is None:
+                texture = constant_texture(color, size)
+            else:
+                texture = sample_texture(capture.texture, points_2d, capture.texture_window)
+            result.textures[i] = texture
+            result.timings['point_texture'] += time.time() - begin
+
+    return result
+
+
+def constant_texture(color, size):
+    """Texture of size points with the same color"""
+    texture = np.empty((3, size), np.uint8)
+    texture[:] = np.array(color, np.uint8).reshape(3, 1)
+    return texture
+
+
+def sample_texture(image, points_2d, window=None):
+    """Colors of the texture image at the 2D points. The image
+       can be cropped to a window of the full image"""
+    u, v = points_2d
+    if window is not None:
+        u, v = u - window[0], v - window[1]
+    height, width = image.shape[:2]
+    u = np.clip(np.around(u).astype(int), 0, width - 1)
+    v = np.clip(np.around(v).astype(int), 0, height - 1)
+    return image[v, u].T
+
+
+def interpolate_texture(theta, points_2d, previous, following):
+    """Texture of the points at angle theta from the (angle, image,
+       window) textures around it, weighted by their angular distance.
+       The previous texture is None before the first one"""
+    angle, image, window = following
+    texture = sample_texture(image, points_2d, window)
+    if previous is not None and angle > previous[0]:
+        weight = np.clip((angle - theta) / (angle - previous[0]), 0, 1)
+        if weight > 0:
+            texture = np.around(weight * sample_texture(previous[1], points_2d, previous[2]) +
+                                (1 - weight) * texture).astype(np.uint8)
+    return texture
+
+
+def save_engine_state():
+    """Snapshot of the engine settings used by process_capture"""
+    laser_segmentation = LaserSegmentation()
+    state = {}
+    # The undistortion maps are not needed to process the captures
+    state['calibration_data'] = dict(
+        (key, value) for key, value in CalibrationData().__dict__.iteritems()
+        if key != '_maps')
+    state['laser_segmentation'] = dict(
+        (key, value) for key, value in laser_segmentation.__dict__.iteritems()
+        if key != 'point_cloud_roi')
+    return state
+
+
+def load_engine_state(state):
+    """Restore the engine settings in a process worker"""
+    CalibrationData().__dict__.update(state['calibration_data'])
+    LaserSegmentation().__dict__.update(state['laser_segmentation'])
@@ -9,12 +9,20 @@ import cv2
 import numpy as np
 
 from horus import Singleton
+from horus.engine.driver.camera import orient_image
+from horus.engine.calibration.calibration_data import CalibrationData
 
 
 @Singleton
 class CurrentVideo(object):
 
+    """Last images of the scan for each video mode. The laser images can
+       be native camera frames: they are combined and oriented only when
+       their mode is shown. Images cropped to a window of the oriented
+       image are placed in a full size image"""
+
     def __init__(self):
+        self.calibration_data = CalibrationData()
         self.mode = 'Texture'
 
         self.images = {}
@@ -22,28 +30,52 @@ class CurrentVideo(object):
         self.images['Laser'] = None
         self.images['Gray'] = None
         self.images['Line'] = None
+        self._updates = {}
 
-    def set_texture(self, image):
-        self.images['Texture'] = image
+    def set_texture(self, image, window=None):
+        if window is None:
+            self._updates.pop('Texture', None)
+            self.images['Texture'] = image
+        else:
+            self._updates['Texture'] = (self._uncrop_image, (image, window))
 
-    def set_laser(self, images):
-        image = self._combine_images(images)
-        self.images['Laser'] = image
+    def set_laser(self, images, orientation=None, window=None):
+        self._updates['Laser'] = (self._compute_laser_image, (images, orientation, window))
+
+    def set_gray(self, images, orientation=None, window=None):
+        self._updates['Gray'] = (self._compute_gray_image, (images, orientation, window))
+
+    def set_line(self, points, image, orientation=None, window=None):
+        if image is not None:
+            self._updates['Line'] = (self._compute_line_image,
+                                     (points, image, orientation, window))
 
-    def set_gray(self, images):
+    def _compute_laser_image(self, images, orientation, window=None):
         image = self._combine_images(images)
-        image = cv2.merge((image, image, image))
-        self.images['Gray'] = image
+        if image is not None and orientation is not None:
+            image = orient_image(image, orientation)
+        return self._uncrop_image(image, window)
 
-    def set_line(self, points, image):
+    def _compute_gray_image(self, images, orientation, window=None):
+        image = self._compute_laser_image(images, orientation, window)
+        if image is not None:
+            image = cv2.merge((image, image, image))
+        return image
+
+    def _compute_line_image(self, points, image, orientation, window=None):
+        shape = image.shape
+        if window is not None:
+            shape = (self.calibration_data.height, self.calibration_data.width)
+        elif orientation is not None and orientation[0]:
+            shape = shape[::-1]
         images = [None, None]
+        for i in xrange(2):
+            if points[i]:
+                images[i] = self._compute_points_image(points[i], shape)
+        image = self._combine_images(images)
         if image is not None:
-            for i in xrange(2):
-                if points[i]:
-                    images[i] = self._compute_line_image(points[i], image)
-            image = self._combine_images(images)
             image = cv2.merge((image, image, image))
-            self.images['Line'] = image
+        return image
 
     def _combine_images(self, images):
         if images[0] is not None and images[1] is not None:
@@ -55,12 +87,25 @@ class CurrentVideo(object):
         if images[1] is not None:
             return images[1]
 
-    def _compute_line_image(self, points, image):
+    def _uncrop_image(self, image, window):
+        if image is None or window is None:
+            return image
+        umin, vmin, umax, vmax = window
+        full = np.zeros((self.calibration_data.height, self.calibration_data.width) +
+                        image.shape[2:], image.dtype)
+        full[vmin:vmax, umin:umax] = image
+        return full
+
+    def _compute_points_image(self, points, shape):
         if points is not None:
             u, v = points
-            image = np.zeros_like(image)
-            image[v.astype(int), np.around(u).astype(int)] = 255
+            image = np.zeros(shape, np.uint8)
+            image[np.around(v).astype(int), np.around(u).astype(int)] = 255
             return image
 
     def capture(self):
+        update = self._updates.pop(self.mode, None)
+        if update is not None:
+            function, args = update
+            self.images[self.mode] = function(*args)
         return self.images[self.mode]
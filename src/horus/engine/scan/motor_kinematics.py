@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+# This file is part of the Horus Project
+
+__author__ = 'Jesús Arroyo Torrens <jesus.arroyo@bq.com>'
+__copyright__ = 'Copyright (C) 2014-2016 Mundo Reader S.L.'
+__license__ = 'GNU General Public License v2 http://www.gnu.org/licenses/gpl2.html'
+
+
+class MotorKinematics(object):
+
+    """Trapezoidal motion profile of the rotating platform.
+       Speed in º/s and acceleration in º/s², as sent to the board"""
+
+    def __init__(self, speed, acceleration):
+        self.speed = abs(float(speed))
+        self.acceleration = abs(float(acceleration))
+        self._origin = 0.0
+        self._start = None
+
+    def start(self, timestamp):
+        """The platform starts moving from rest at timestamp"""
+        self._start = timestamp
+
+    def hold(self, timestamp):
+        """The platform decelerates to rest from timestamp"""
+        self._origin += self._distance(timestamp) + self.braking_distance(timestamp)
+        self._start = None
+
+    def angle(self, timestamp):
+        """Angle travelled at timestamp, without the final deceleration"""
+        return self._origin + self._distance(timestamp)
+
+    def current_speed(self, timestamp):
+        if self._start is None or timestamp <= self._start:
+            return 0.0
+        if self.acceleration > 0:
+            return min(self.speed, self.acceleration * (timestamp - self._start))
+        return self.speed
+
+    def braking_distance(self, timestamp=None):
+        """Angle travelled to rest, from the cruise speed by default"""
+        if timestamp is None:
+            speed = self.speed
+        else:
+            speed = self.current_speed(timestamp)
+        if self.acceleration > 0:
+            return speed ** 2 / (2 * self.acceleration)
+        return 0.0
+
+    def braking_time(self, timestamp=None):
+        """Time to rest, from the cruise speed by default"""
+        if timestamp is None:
+            speed = self.speed
+        else:
+            speed = self.current_speed(timestamp)
+        if self.acceleration > 0:
+            return speed / self.acceleration
+        return 0.0
+
+    def remaining_time(self, timestamp, angle):
+        """Estimated time to complete a movement of angle"""
+        if self.speed > 0:
+            remaining = angle - self.angle(timestamp)
+            if self.acceleration > 0:
+                return max(0.0, remaining / self.speed + self.speed / (2 * self.acceleration))
+            return max(0.0, remaining / self.speed)
+        return 0.0
+
+    def _distance(self, timestamp):
+        if self._start is None or timestamp <= self._start:
+            return 0.0
+        t = timestamp - self._start
+        if self.acceleration > 0:
+            t_cruise = self.speed / self.acceleration
+            if t < t_cruise:
+                return 0.5 * self.acceleration * t ** 2
+            return 0.5 * self.speed * t_cruise + self.speed * (t - t_cruise)
+        return self.speed * t
@@ -0,0 +1,124 @@
+# -*- coding: utf-8 -*-
+# This file is part of the Horus Project
+
+__author__ = 'Jesús Arroyo Torrens <jesus.arroyo@bq.com>'
+__copyright__ = 'Copyright (C) 2014-2016 Mundo Reader S.L.'
+__license__ = 'GNU General Public License v2 http://www.gnu.org/licenses/gpl2.html'
+
+"""
+Streaming PLY writer for the scanned point clouds.
+
+The vertex count of the header has a fixed width, so it is updated in place
+after each write: the file is a valid binary PLY during the whole scan.
+
+http://en.wikipedia.org/wiki/PLY_(file_format)
+"""
+
+import os
+import numpy as np
+
+from horus import __version__
+
+import logging
+logger = logging.getLogger(__name__)
+
+
+VERTEX_DTYPE = np.dtype([('v', '<f4', (3,)), ('c', 'u1', (3,))])
+COUNT_FORMAT = '{0:010d}'
+
+
+def _header(count):
+    header = "ply\n"
+    header += "format binary_little_endian 1.0\n"
+    header += "comment Generated by Horus {0}\n".format(__version__)
+    header += "element vertex " + COUNT_FORMAT.format(count) + "\n"
+    header += "property float x\n"
+    header += "property float y\n"
+    header += "property float z\n"
+    header += "property uchar red\n"
+    header += "property uchar green\n"
+    header += "property uchar blue\n"
+    header += "element face 0\n"
+    header += "end_header\n"
+    return header
+
+
+def _count_offset():
+    return _header(0).index("element vertex ") + len("element vertex ")
+
+
+class PLYWriter(object):
+
+    """Append colored point clouds to a binary PLY file.
+       Memory usage does not depend on the size of the scan"""
+
+    def __init__(self, filename):
+        self.filename = filename
+        self.vertex_count = 0
+        self._file = None
+
+    def open(self):
+        directory = os.path.dirname(self.filename)
+        if directory and not os.path.isdir(directory):
+            os.makedirs(directory)
+        self.vertex_count = 0
+        self._file = open(self.filename, 'wb')
+        self._file.write(_header(0))
+        self._file.flush()
+
+    def write(self, point_cloud, texture):
+        """Append a 3xN point cloud with its 3xN texture"""
+        if self._file is not None and point_cloud is not None and point_cloud.shape[1] > 0:
+            data = np.empty(point_cloud.shape[1], dtype=VERTEX_DTYPE)
+            data['v'] = point_cloud.T
+            data['c'] = texture.T
+            self._file.write(data.tostring())
+            self.vertex_count += len(data)
+            self._update_count()
+
+    def close(self):
+        if self._file is not None:
+            try:
+                self._update_count()
+            finally:
+                self._file.close()
+                self._file = None
+            logger.info("Saved point cloud: {0} ({1} points)".format(
+                self.filename, self.vertex_count))
+
+    def _update_count(self):
+        self._file.seek(_count_offset())
+        self._file.write(COUNT_FORMAT.format(self.vertex_count))
+        self._file.seek(0, os.SEEK_END)
+        self._file.flush()
+
+
+def recover_ply(filename):
+    """Fix the header of a PLY file written by an interrupted PLYWriter,
+       and remove the incomplete last vertex. Return the vertex count.
+       The file can be written by any version of Horus"""
+    with open(filename, 'r+b') as f:
+        header = f.read(4096)
+        end = header.find("end_header\n")
+        if end < 0 or _structure(header[:end]) != _structure(_header(0)):
+            logger.error("Error: incorrect file format.")
+            return None
+        header = header[:end + len("end_header\n")]
+        f.seek(0, os.SEEK_END)
+        count = max(0, f.tell() - len(header)) // VERTEX_DTYPE.itemsize
+        f.truncate(len(header) + count * VERTEX_DTYPE.itemsize)
+        f.seek(header.index("element vertex ") + len("element vertex "))
+        f.write(COUNT_FORMAT.format(count))
+    return count
+
+
+def _structure(header):
+    # Header lines without the comments. The vertex count field
+    # must have the fixed width to be updated in place
+    lines = []
+    for line in header.split("\n"):
+        if line.startswith("element vertex "):
+            line = "element vertex " + "#" * len(line[len("element vertex "):])
+        if not line.startswith("comment") and line != "end_header":
+            lines.append(line)
+    return lines
@@ -34,7 +34,13 @@ class Scan(object):
         self._after_callback = None
         self._progress = 0
         self._range = 0
-        self._inactive = False
+        # Set while scanning, cleared while the scan is paused
+        self._resume_event = threading.Event()
+        self._resume_event.set()
+
+    @property
+    def _inactive(self):
+        return not self._resume_event.is_set()
 
     def set_callbacks(self, before, progress, after):
         self._before_callback = before
@@ -52,20 +58,21 @@ class Scan(object):
             self._initialize()
 
             self.is_scanning = True
-            self._inactive = False
+            self._resume_event.set()
 
             threading.Thread(target=self._capture).start()
             threading.Thread(target=self._process).start()
 
     def stop(self):
-        self._inactive = False
         self.is_scanning = False
+        # Wake up the threads waiting for a resume
+        self._resume_event.set()
 
     def pause(self):
-        self._inactive = True
+        self._resume_event.clear()
 
     def resume(self):
-        self._inactive = False
+        self._resume_event.set()
 
     def _initialize(self):
         pass
@@ -12,3 +12,36 @@ class ScanCapture(object):
         self.theta = 0
         self.texture = None
         self.lasers = [None, None]
+        # Angle of each laser frame, if it differs from theta
+        self.laser_thetas = [None, None]
+        # Laser images without undistortion: their 2D points are undistorted
+        self.raw_lasers = False
+        # Camera orientation of native laser images, None if oriented
+        self.orientation = None
+        # Windows (umin, vmin, umax, vmax) of the oriented image
+        # cropped in the laser images and the texture, None if full
+        self.window = None
+        self.texture_window = None
+        # Points of the previous laser images to track the lines
+        self.bands = [None, None]
+        # Texture of the second rotation, without laser images
+        self.second_pass = False
+
+
+class ScanResult(object):
+
+    def __init__(self):
+        self.theta = 0
+        self.images = [None, None]
+        self.points_2d = [None, None]
+        # Points of the laser images, before the window offset
+        # and the undistortion, to track the lines
+        self.bands = [None, None]
+        self.point_clouds = [None, None]
+        self.textures = [None, None]
+        # Camera orientation of the segmented images, None if oriented
+        self.orientation = None
+        # Window of the oriented image cropped in the segmented images
+        self.window = None
+        # Duration of each processing stage
+        self.timings = {'segmentation': 0.0, 'point_cloud': 0.0, 'point_texture': 0.0}
@@ -0,0 +1,119 @@
+# -*- coding: utf-8 -*-
+# This file is part of the Horus Project
+
+__author__ = 'Jesús Arroyo Torrens <jesus.arroyo@bq.com>'
+__copyright__ = 'Copyright (C) 2014-2016 Mundo Reader S.L.'
+__license__ = 'GNU General Public License v2 http://www.gnu.org/licenses/gpl2.html'
+
+import time
+import multiprocessing
+from multiprocessing.pool import ThreadPool
+
+import logging
+logger = logging.getLogger(__name__)
+
+
+def _timed_call(func, args):
+    begin = time.time()
+    result = func(*args)
+    return result, begin, time.time()
+
+
+class ScanTask(object):
+
+    """Handle of a job submitted to the scan pool"""
+
+    def __init__(self, pool, async_result=None, value=None):
+        self._pool = pool
+        self._async_result = async_result
+        self._value = value
+        self._done = async_result is None
+
+    def ready(self):
+        return self._done or self._async_result.ready()
+
+    def get(self):
+        if not self._done:
+            result, begin, end = self._async_result.get()
+            self._pool._account(end - begin)
+            self._value = result
+            self._done = True
+        return self._value
+
+
+class ScanPool(object):
+
+    """Pool of workers for processing scan captures concurrently:
+
+        - Thread backend: OpenCV releases the GIL, so threads share the engine
+        - Process backend: workers run in separate processes with a copy
+          of the engine state, given by the initializer
+        - No workers: jobs run inline in the caller thread
+    """
+
+    def __init__(self, workers=0, backend='Thread', initializer=None, initargs=()):
+        self.workers = max(0, int(workers))
+        self.backend = backend
+        self._initializer = initializer
+        self._initargs = initargs
+        self._pool = None
+        self._begin = 0
+        self._end = None
+        self._tasks = 0
+        self._busy = 0.0
+
+    def start(self):
+        if self.workers > 0:
+            if self.backend == 'Process':
+                self._pool = multiprocessing.Pool(
+                    self.workers, self._initializer, self._initargs)
+            else:
+                self._pool = ThreadPool(self.workers)
+        self._begin = time.time()
+        self._end = None
+        self._tasks = 0
+        self._busy = 0.0
+
+    def submit(self, func, *args):
+        if self._pool is None:
+            result, begin, end = _timed_call(func, args)
+            self._account(end - begin)
+            return ScanTask(self, value=result)
+        else:
+            return ScanTask(self, async_result=self._pool.apply_async(_timed_call, (func, args)))
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.close()
+            self._pool.join()
+            self._pool = None
+        self._end = time.time()
+
+    def terminate(self):
+        if self._pool is not None:
+            self._pool.terminate()
+            self._pool.join()
+            self._pool = None
+        self._end = time.time()
+
+    def _account(self, duration):
+        self._tasks += 1
+        self._busy += duration
+
+    def utilization(self):
+        """Fraction of the available worker time spent processing jobs"""
+        end = self._end if self._end is not None else time.time()
+        elapsed = (end - self._begin) * max(1, self.workers)
+        if elapsed > 0:
+            return min(1.0, self._busy / elapsed)
+        return 0.0
+
+    def statistics(self):
+        return {
+            'workers': self.workers,
+            'backend': self.backend if self.workers > 0 else 'Inline',
+            'tasks': self._tasks,
+            'busy_time': self._busy,
+            'task_time': self._busy / self._tasks if self._tasks > 0 else 0.0,
+            'utilization': self.utilization()
+        }
@@ -0,0 +1,238 @@
+# -*- coding: utf-8 -*-
+# This file is part of the Horus Project
+
+__author__ = 'Jesús Arroyo Torrens <jesus.arroyo@bq.com>'
+__copyright__ = 'Copyright (C) 2014-2016 Mundo Reader S.L.'
+__license__ = 'GNU General Public License v2 http://www.gnu.org/licenses/gpl2.html'
+
+import os
+import glob
+import json
+import numpy as np
+
+from horus.engine.scan.scan_capture import ScanCapture
+from horus.engine.calibration.calibration_data import CalibrationData
+from horus.engine.algorithms.laser_segmentation import LaserSegmentation
+
+import logging
+logger = logging.getLogger(__name__)
+
+
+SESSION_VERSION = 1
+SESSION_FILE = 'session.json'
+CHUNK_FILE = 'chunk_{0:05d}.npz'
+
+
+class ScanSessionError(Exception):
+
+    def __init__(self, path):
+        Exception.__init__(self, "Scan Session Error: {0}".format(path))
+
+
+def _to_list(value):
+    if value is None:
+        return None
+    return np.asarray(value).tolist()
+
+
+def _to_array(value):
+    if value is None:
+        return None
+    return np.array(value)
+
+
+def save_calibration():
+    """Serializable snapshot of the calibration data"""
+    calibration_data = CalibrationData()
+    return {
+        'width': calibration_data.width,
+        'height': calibration_data.height,
+        'camera_matrix': _to_list(calibration_data.camera_matrix),
+        'distortion_vector': _to_list(calibration_data.distortion_vector),
+        'laser_planes': [{'distance': plane.distance,
+                          'normal': _to_list(plane.normal)}
+                         for plane in calibration_data.laser_planes],
+        'platform_rotation': _to_list(calibration_data.platform_rotation),
+        'platform_translation': _to_list(calibration_data.platform_translation)
+    }
+
+
+def load_calibration(calibration):
+    calibration_data = CalibrationData()
+    calibration_data.set_resolution(calibration['width'], calibration['height'])
+    calibration_data.camera_matrix = _to_array(calibration['camera_matrix'])
+    calibration_data.distortion_vector = _to_array(calibration['distortion_vector'])
+    for plane, value in zip(calibration_data.laser_planes, calibration['laser_planes']):
+        plane.distance = value['distance']
+        plane.normal = _to_array(value['normal'])
+    calibration_data.platform_rotation = _to_array(calibration['platform_rotation'])
+    calibration_data.platform_translation = _to_array(calibration['platform_translation'])
+
+
+def save_segmentation():
+    """Serializable snapshot of the laser segmentation settings"""
+    laser_segmentation = LaserSegmentation()
+    return dict(
+        (key, value) for key, value in laser_segmentation.__dict__.iteritems()
+        if isinstance(value, (bool, int, long, float, basestring)))
+
+
+def load_segmentation(segmentation):
+    laser_segmentation = LaserSegmentation()
+    for key, value in segmentation.iteritems():
+        setattr(laser_segmentation, key, value)
+
+
+class ScanSessionWriter(object):
+
+    """Record the raw scan captures in a session directory:
+
+        - session.json: calibration data, segmentation and scan settings
+        - chunk_NNNNN.npz: thetas, texture and laser images of up to
+          chunk_size captures
+    """
+
+    def __init__(self, path, chunk_size=10):
+        self.path = path
+        self.chunk_size = max(1, int(chunk_size))
+        self._metadata = None
+        self._buffer = []
+        self._chunks = 0
+        self._captures = 0
+
+    def open(self, settings=None):
+        if not os.path.isdir(self.path):
+            os.makedirs(self.path)
+        self._metadata = {
+            'version': SESSION_VERSION,
+            'calibration_data': save_calibration(),
+            'laser_segmentation': save_segmentation(),
+            'settings': settings or {},
+            'chunk_size': self.chunk_size,
+            'captures': 0,
+            'completed': False
+        }
+        self._buffer = []
+        self._chunks = 0
+        self._captures = 0
+        self._save_metadata()
+        logger.info("Record scan session: {0}".format(self.path))
+
+    def write(self, capture):
+        self._buffer.append(capture)
+        if len(self._buffer) >= self.chunk_size:
+            self._save_chunk()
+
+    def close(self, completed=True):
+        if self._metadata is not None:
+            if len(self._buffer) > 0:
+                self._save_chunk()
+            self._metadata['completed'] = completed
+            self._save_metadata()
+            self._metadata = None
+
+    def _save_chunk(self):
+        arrays = {'theta': np.array([capture.theta for capture in self._buffer]),
+                  'laser_thetas': np.array([[np.nan if theta is None else theta
+                                             for theta in capture.laser_thetas]
+                                            for capture in self._buffer]),
+                  'windows': np.array([[(-1,) * 4 if window is None else window
+                                        for window in (capture.window, capture.texture_window)]
+                                       for capture in self._buffer])}
+        for k, capture in enumerate(self._buffer):
+            if capture.texture is not None:
+                arrays['texture_{0}'.format(k)] = capture.texture
+            for i in xrange(2):
+                if capture.lasers[i] is not None:
+                    arrays['laser_{0}_{1}'.format(i, k)] = capture.lasers[i]
+        np.savez(os.path.join(self.path, CHUNK_FILE.format(self._chunks)), **arrays)
+        self._chunks += 1
+        self._captures += len(self._buffer)
+        self._metadata['captures'] = self._captures
+        self._buffer = []
+
+    def _save_metadata(self):
+        with open(os.path.join(self.path, SESSION_FILE), 'w') as f:
+            json.dump(self._metadata, f, indent=2)
+
+
+class ScanSessionReader(object):
+
+    """Read back the captures of a recorded scan session.
+       The chunks are loaded lazily, one at a time"""
+
+    def __init__(self, path):
+        self.path = path
+        self.metadata = None
+        self._chunks = []
+        self._length = 0
+        self._saved = None
+
+    def open(self):
+        try:
+            with open(os.path.join(self.path, SESSION_FILE), 'r') as f:
+                self.metadata = json.load(f)
+        except (IOError, ValueError):
+            raise ScanSessionError(self.path)
+        # Chunks are listed from disk to read also interrupted sessions
+        self._chunks = sorted(glob.glob(os.path.join(self.path, 'chunk_*.npz')))
+        self._length = 0
+        for chunk in self._chunks:
+            with np.load(chunk) as data:
+                self._length += len(data['theta'])
+
+    def __len__(self):
+        return self._length
+
+    @property
+    def settings(self):
+        return self.metadata['settings']
+
+    def apply_settings(self):
+        """Replace the calibration and segmentation with the recorded ones,
+           until restore_settings"""
+        if self._saved is None:
+            self._saved = (save_calibration(), save_segmentation())
+        load_calibration(self.metadata['calibration_data'])
+        load_segmentation(self.metadata['laser_segmentation'])
+
+    def restore_settings(self):
+        if self._saved is not None:
+            calibration, segmentation = self._saved
+            load_calibration(calibration)
+            load_segmentation(segmentation)
+            self._saved = None
+
+    def captures(self):
+        raw_lasers = self.settings.get('raw_lasers', False)
+        orientation = self.settings.get('orientation')
+        second_pass = self.settings.get('second_pass', False)
+        if orientation is not None:
+            orientation = tuple(orientation)
+        for chunk in self._chunks:
+            with np.load(chunk) as data:
+                laser_thetas = data['laser_thetas']
+                windows = None
+                if 'windows' in data.files:
+                    windows = data['windows']
+                for k, theta in enumerate(data['theta']):
+                    capture = ScanCapture()
+                    capture.theta = float(theta)
+                    capture.raw_lasers = raw_lasers
+                    capture.orientation = orientation
+                    capture.texture = self._get(data, 'texture_{0}'.format(k))
+                    if windows is not None:
+                        capture.window, capture.texture_window = [
+                            None if window[0] < 0 else tuple(int(x) for x in window)
+                            for window in windows[k]]
+                    for i in xrange(2):
+                        capture.lasers[i] = self._get(data, 'laser_{0}_{1}'.format(i, k))
+                        if not np.isnan(laser_thetas[k, i]):
+                            capture.laser_thetas[i] = float(laser_thetas[k, i])
+                    capture.second_pass = second_pass and \
+                        capture.lasers[0] is None and capture.lasers[1] is None
+                    yield capture
+
+    def _get(self, data, key):
+        if key in data.files:
+            return data[key]
@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+# This file is part of the Horus Project
+
+__author__ = 'Jesús Arroyo Torrens <jesus.arroyo@bq.com>'
+__copyright__ = 'Copyright (C) 2014-2016 Mundo Reader S.L.'
+__license__ = 'GNU General Public License v2 http://www.gnu.org/licenses/gpl2.html'
+
+import os
+import json
+import threading
+import collections
+import numpy as np
+
+from horus import Singleton
+
+import logging
+logger = logging.getLogger(__name__)
+
+
+@Singleton
+class ScanTelemetry(object):
+
+    """Per-stage measurements of the scan, one sample per angle:
+
+        - Durations in seconds: capture_texture, capture_laser_N,
+          capture_background, flush, laser_switch, subtract_background,
+          motion, capture, segmentation, point_cloud, point_texture, callback
+        - Counts: queue_depth, points
+
+       Histograms are computed over the last window samples of each stage
+    """
+
+    def __init__(self, window=200):
+        self.window = window
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self._samples = collections.defaultdict(list)
+
+    def record(self, stage, value):
+        with self._lock:
+            self._samples[stage].append(value)
+
+    def record_all(self, values):
+        with self._lock:
+            for stage, value in values.iteritems():
+                self._samples[stage].append(value)
+
+    def stages(self):
+        with self._lock:
+            return sorted(self._samples.keys())
+
+    def samples(self, stage, rolling=True):
+        with self._lock:
+            samples = self._samples.get(stage, [])
+            if rolling:
+                samples = samples[-self.window:]
+            return np.array(samples, dtype=np.float64)
+
+    def histogram(self, stage, bins=10):
+        """Histogram of the last samples: (counts, bin edges)"""
+        samples = self.samples(stage)
+        if len(samples) == 0:
+            return np.zeros(bins, np.int), np.zeros(bins + 1)
+        return np.histogram(samples, bins=bins)
+
+    def summary(self):
+        summary = {}
+        for stage in self.stages():
+            samples = self.samples(stage, rolling=False)
+            summary[stage] = {
+                'count': len(samples),
+                'total': float(samples.sum()),
+                'mean': float(samples.mean()),
+                'min': float(samples.min()),
+                'max': float(samples.max()),
+                'p50': float(np.percentile(samples, 50)),
+                'p90': float(np.percentile(samples, 90)),
+                'p99': float(np.percentile(samples, 99))
+            }
+        return summary
+
+    def dump(self, filename, extra=None):
+        """Save the summary, and optional extra values, as JSON"""
+        directory = os.path.dirname(filename)
+        if directory and not os.path.isdir(directory):
+            os.makedirs(directory)
+        data = {'stages': self.summary()}
+        if extra is not None:
+            data.update(extra)
+        with open(filename, 'w') as f:
+            json.dump(data, f, indent=2, sort_keys=True)
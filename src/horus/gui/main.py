@@ -14,7 +14,7 @@ import webbrowser
 from collections import OrderedDict
 
 from horus import __version__, __datetime__, __commit__
-from horus.gui.engine import driver, image_capture, ciclop_scan, scanner_autocheck, \
+from horus.gui.engine import driver, ciclop_scan, scanner_autocheck, \
     laser_triangulation, platform_extrinsics
 from horus.gui.workbench.convert.main import ConvertWorkbench
 from horus.util.model import ModelType
@@ -33,7 +33,7 @@ from horus.gui.workbench.convert.main import ConvertWorkbench
 from horus.gui.wizard.main import Wizard
 from horus.gui.util.version_window import VersionWindow
 
-from horus.util import profile, resources, mesh_loader, version, system as sys
+from horus.util import profile, resources, mesh_loader, version, scan_setup, system as sys
 from horus.gui.colored.colored_elements import ColouredFrame, ColoredMenuBar, ColoredFileDialog, ColoredMessageDialog
 
 import logging
@@ -625,31 +625,9 @@ class MainWindow(ColouredFrame):
             if current_video_id not in video_list:
                 profile.settings['camera_id'] = unicode(video_list[0])
 
-        if len(profile.settings['camera_id']):
-            driver.camera.camera_id = int(profile.settings['camera_id'][-1:])
-
-        driver.board.serial_name = profile.settings['serial_name']
-        driver.board.baud_rate = profile.settings['baud_rate']
-        driver.board.motor_invert(profile.settings['invert_motor'])
+        scan_setup.setup_driver()
         platform_extrinsics.set_estimated_size(profile.settings['estimated_size'])
 
-        flush_setting = 'flush_'
-        flush_stream_setting = 'flush_stream_'
-        if sys.is_linux():
-            flush_setting += 'linux'
-            flush_stream_setting += 'linux'
-        elif sys.is_darwin():
-            flush_setting += 'darwin'
-            flush_stream_setting += 'darwin'
-        elif sys.is_windows():
-            flush_setting += 'windows'
-            flush_stream_setting += 'windows'
-
-        texture, laser, pattern = profile.settings[flush_setting]
-        image_capture.set_flush_values(texture, laser, pattern)
-        texture, laser, pattern = profile.settings[flush_stream_setting]
-        image_capture.set_flush_stream_values(texture, laser, pattern)
-
     def enable_convert_buttons(self, model_type):
         if model_type == ModelType.PointCloud:
             self.toolbar.toolbar_convert.EnableTool(1, True)
@@ -168,7 +168,22 @@ class ScanSegmentationPanel(ExpandablePanel):
         self.add_control(
             'window_enable_scanning', CheckBox,
             _("Filter pixels out of 2 * window value around the intensity peak"))
+        self.add_control(
+            'tracking_value_scanning', Slider,
+            _("Search the line in 2 * tracking value pixels around "
+              "the line of the previous angle"))
+        self.add_control(
+            'tracking_enable_scanning', CheckBox,
+            _("Search the line in 2 * tracking value pixels around "
+              "the line of the previous angle"))
+        self.add_control(
+            'peak_scanning', ComboBox,
+            _("Sub-pixel estimator of the line in each row"))
         self.add_control('refinement_scanning', ComboBox)
+        self.add_control(
+            'fused_enable_scanning', CheckBox,
+            _("Segment the line in one pass per row. Requires Numba, "
+              "with red channel and center of mass"))
 
     def update_callbacks(self):
         # self.update_callback('red_channel_scanning', laser_segmentation.set_red_channel)
@@ -178,7 +193,11 @@ class ScanSegmentationPanel(ExpandablePanel):
         self.update_callback('blur_enable_scanning', laser_segmentation.set_blur_enable)
         self.update_callback('window_value_scanning', laser_segmentation.set_window_value)
         self.update_callback('window_enable_scanning', laser_segmentation.set_window_enable)
+        self.update_callback('tracking_value_scanning', laser_segmentation.set_tracking_value)
+        self.update_callback('tracking_enable_scanning', laser_segmentation.set_tracking_enable)
+        self.update_callback('peak_scanning', laser_segmentation.set_peak_method)
         self.update_callback('refinement_scanning', laser_segmentation.set_refinement_method)
+        self.update_callback('fused_enable_scanning', laser_segmentation.set_fused_enable)
 
     def on_selected(self):
         current_video.updating = True
@@ -198,7 +217,11 @@ class ScanSegmentationPanel(ExpandablePanel):
         laser_segmentation.set_blur_enable(profile.settings['blur_enable_scanning'])
         laser_segmentation.set_window_value(profile.settings['window_value_scanning'])
         laser_segmentation.set_window_enable(profile.settings['window_enable_scanning'])
+        laser_segmentation.set_tracking_value(profile.settings['tracking_value_scanning'])
+        laser_segmentation.set_tracking_enable(profile.settings['tracking_enable_scanning'])
+        laser_segmentation.set_peak_method(profile.settings['peak_scanning'])
         laser_segmentation.set_refinement_method(profile.settings['refinement_scanning'])
+        laser_segmentation.set_fused_enable(profile.settings['fused_enable_scanning'])
         profile.settings['current_video_mode_adjustment'] = current_video.mode
         profile.settings['current_panel_adjustment'] = 'scan_segmentation'
         current_video.flush()
@@ -358,6 +381,9 @@ class CalibrationSegmentationPanel(ExpandablePanel):
         self.add_control(
             'window_enable_calibration', CheckBox,
             _("Filter pixels out of 2 * window value around the intensity peak"))
+        self.add_control(
+            'peak_calibration', ComboBox,
+            _("Sub-pixel estimator of the line in each row"))
         self.add_control('refinement_calibration', ComboBox)
 
     def update_callbacks(self):
@@ -369,6 +395,7 @@ class CalibrationSegmentationPanel(ExpandablePanel):
         self.update_callback('blur_enable_calibration', laser_segmentation.set_blur_enable)
         self.update_callback('window_value_calibration', laser_segmentation.set_window_value)
         self.update_callback('window_enable_calibration', laser_segmentation.set_window_enable)
+        self.update_callback('peak_calibration', laser_segmentation.set_peak_method)
         self.update_callback('refinement_calibration', laser_segmentation.set_refinement_method)
 
     def on_selected(self):
@@ -391,6 +418,7 @@ class CalibrationSegmentationPanel(ExpandablePanel):
         laser_segmentation.set_blur_enable(profile.settings['blur_enable_calibration'])
         laser_segmentation.set_window_value(profile.settings['window_value_calibration'])
         laser_segmentation.set_window_enable(profile.settings['window_enable_calibration'])
+        laser_segmentation.set_peak_method(profile.settings['peak_calibration'])
         laser_segmentation.set_refinement_method(profile.settings['refinement_calibration'])
         current_video.flush()
         current_video.updating = False
@@ -130,6 +130,7 @@ class CalibrationWorkbench(Workbench):
         laser_segmentation.set_blur_value(profile.settings['blur_value_calibration'])
         laser_segmentation.window_enable = profile.settings['window_enable_calibration']
         laser_segmentation.window_value = profile.settings['window_value_calibration']
+        laser_segmentation.peak_method = profile.settings['peak_calibration']
         laser_segmentation.refinement_method = profile.settings['refinement_calibration']
         pattern.rows = profile.settings['pattern_rows']
         pattern.columns = profile.settings['pattern_columns']
@@ -25,10 +25,25 @@ class ScanParameters(ExpandablePanel):
     def add_controls(self):
         self.add_control('capture_texture', CheckBox)
         self.add_control('use_laser', ComboBox)
+        self.add_control(
+            'dual_laser', CheckBox,
+            _("Captures both lasers in the same image when their lines "
+              "are on opposite sides of the platform center"))
+        self.add_control(
+            'texture_pass', ComboBox,
+            _("Second pass captures the textures in another rotation, "
+              "without camera mode changes between the laser captures"))
+        self.add_control(
+            'texture_step', Slider,
+            _("Number of steps between the textures of the second pass. "
+              "The colors of the steps in between are interpolated"))
 
     def update_callbacks(self):
         self.update_callback('capture_texture', ciclop_scan.set_capture_texture)
         self.update_callback('use_laser', self.set_use_laser)
+        self.update_callback('dual_laser', ciclop_scan.set_dual_laser)
+        self.update_callback('texture_pass', ciclop_scan.set_texture_pass)
+        self.update_callback('texture_step', ciclop_scan.set_texture_step)
 
     def set_use_laser(self, value):
         ciclop_scan.set_use_left_laser(value == 'Left' or value == 'Both')
@@ -55,12 +70,17 @@ class RotatingPlatform(ExpandablePanel):
         self.add_control('motor_step_scanning', FloatTextBox)
         self.add_control('motor_speed_scanning', FloatTextBox)
         self.add_control('motor_acceleration_scanning', FloatTextBox)
+        self.add_control(
+            'motion_mode_scanning', ComboBox,
+            _("Pipelined mode moves the platform while the next capture is prepared. "
+              "Continuous mode rotates the platform at the motor speed while capturing"))
 
     def update_callbacks(self):
         self.update_callback('show_center', point_cloud_roi.set_show_center)
         self.update_callback('motor_step_scanning', ciclop_scan.set_motor_step)
         self.update_callback('motor_speed_scanning', ciclop_scan.set_motor_speed)
         self.update_callback('motor_acceleration_scanning', ciclop_scan.set_motor_acceleration)
+        self.update_callback('motion_mode_scanning', ciclop_scan.set_motion_mode)
 
     def on_selected(self):
         self.main.scene_view._view_roi = False
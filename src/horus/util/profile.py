@@ -268,10 +268,30 @@ class Settings(collections.MutableMapping):
         self._add_setting(
             Setting('window_value_scanning', _('Window'), 'profile_settings',
                     int, 8, min_value=0, max_value=30))
+        self._add_setting(
+            Setting('tracking_enable_scanning', _('Enable tracking'),
+                    'profile_settings', bool, False))
+        self._add_setting(
+            Setting('tracking_value_scanning', _('Tracking'), 'profile_settings',
+                    int, 12, min_value=1, max_value=50))
+        # Hack to translate combo boxes:
+        _('Center of mass')
+        _('Windowed center of mass')
+        _('Parabolic')
+        _('Gaussian')
+        _('Blais-Rioux')
+        self._add_setting(
+            Setting('peak_scanning', _('Peak detection'), 'profile_settings',
+                    unicode, u'Center of mass',
+                    possible_values=(u'Center of mass', u'Windowed center of mass',
+                                     u'Parabolic', u'Gaussian', u'Blais-Rioux')))
         self._add_setting(
             Setting('refinement_scanning', _('Refinement'), 'profile_settings',
                     unicode, u'SGF',
                     possible_values=(u'None', u'SGF')))
+        self._add_setting(
+            Setting('fused_enable_scanning', _('Fused kernel'),
+                    'profile_settings', bool, False))
         _('Open')
         _('Enable open')
 
@@ -333,6 +353,11 @@ class Settings(collections.MutableMapping):
         self._add_setting(
             Setting('window_value_calibration', _('Window'), 'profile_settings',
                     int, 5, min_value=0, max_value=30))
+        self._add_setting(
+            Setting('peak_calibration', _('Peak detection'), 'profile_settings',
+                    unicode, u'Center of mass',
+                    possible_values=(u'Center of mass', u'Windowed center of mass',
+                                     u'Parabolic', u'Gaussian', u'Blais-Rioux')))
         self._add_setting(
             Setting('refinement_calibration', _('Refinement'), 'profile_settings',
                     unicode, u'RANSAC',
@@ -358,6 +383,17 @@ class Settings(collections.MutableMapping):
         self._add_setting(
             Setting('use_laser', _('Use laser'), 'profile_settings',
                     unicode, u'Both', possible_values=(u'Left', u'Right', u'Both')))
+        self._add_setting(
+            Setting('dual_laser', _('Dual laser capture'), 'profile_settings', bool, False))
+        # Hack to translate combo boxes:
+        _('Every angle')
+        _('Second pass')
+        self._add_setting(
+            Setting('texture_pass', _('Texture capture'), 'profile_settings',
+                    unicode, u'Every angle', possible_values=(u'Every angle', u'Second pass')))
+        self._add_setting(
+            Setting('texture_step', _('Texture step'), 'profile_settings',
+                    int, 1, min_value=1, max_value=10))
 
         self._add_setting(
             Setting('motor_step_scanning', _(u'Step (º)'), 'profile_settings',
@@ -368,6 +404,14 @@ class Settings(collections.MutableMapping):
         self._add_setting(
             Setting('motor_acceleration_scanning', _(u'Acceleration (º/s²)'), 'profile_settings',
                     float, 200.0, min_value=1.0, max_value=1000.0))
+        # Hack to translate combo boxes:
+        _('Stop and go')
+        _('Pipelined')
+        _('Continuous')
+        self._add_setting(
+            Setting('motion_mode_scanning', _('Motion mode'), 'profile_settings',
+                    unicode, u'Stop and go',
+                    possible_values=(u'Stop and go', u'Pipelined', u'Continuous')))
 
         self._add_setting(
             Setting('show_center', _('Show center'), 'profile_settings', bool, True))
@@ -385,7 +429,32 @@ class Settings(collections.MutableMapping):
 
         self._add_setting(
             Setting('scan_sleep', _(u'Wait time in each scan interval'), 'profile_settings',
-                    float, 50.0, min_value=0.0, max_value=1000.0))
+                    float, 0.0, min_value=0.0, max_value=1000.0))
+        self._add_setting(
+            Setting('scan_workers', _('Scan workers'), 'profile_settings',
+                    int, 2, min_value=0, max_value=16))
+        # Hack to translate combo boxes:
+        _('Thread')
+        _('Process')
+        self._add_setting(
+            Setting('scan_workers_backend', _('Scan workers backend'), 'profile_settings',
+                    unicode, u'Thread', possible_values=(u'Thread', u'Process')))
+        self._add_setting(
+            Setting('scan_queue_size', _('Capture queue size (MB)'), 'profile_settings',
+                    int, 128, min_value=16, max_value=4096))
+        # Hack to translate combo boxes:
+        _('Block')
+        _('Drop oldest')
+        _('Adaptive step')
+        self._add_setting(
+            Setting('scan_queue_policy', _('Capture queue policy'), 'profile_settings',
+                    unicode, u'Block', possible_values=(u'Block', u'Drop oldest', u'Adaptive step')))
+        self._add_setting(
+            Setting('scan_record_session', _('Record scan session'), 'profile_settings',
+                    bool, False))
+        self._add_setting(
+            Setting('scan_autosave', _('Save point cloud while scanning'), 'profile_settings',
+                    bool, True))
 
         # Hack to translate combo boxes:
         _('Texture')
@@ -460,6 +529,9 @@ class Settings(collections.MutableMapping):
                                            buffer=np.array([0.0, 0.0, 0.0, 0.0, 0.0]))))
         self._add_setting(
             Setting('use_distortion', _('Use distortion'), 'calibration_settings', bool, False))
+        self._add_setting(
+            Setting('undistort_points', _('Undistort laser points'),
+                    'calibration_settings', bool, False))
 
         self._add_setting(
             Setting('distance_left', _('Distance left (mm)'), 'calibration_settings', float, 0.0))
@@ -583,6 +655,11 @@ class Settings(collections.MutableMapping):
             Setting('flush_stream_windows', 'Flush stream Windows', 'preferences',
                     np.ndarray, np.ndarray(shape=(3,), dtype=int, buffer=np.array([0, 2, 0]))))
 
+        self._add_setting(
+            Setting('camera_grabber', 'Camera grabber', 'preferences', bool, True))
+        self._add_setting(
+            Setting('adaptive_flush', 'Adaptive flush', 'preferences', bool, False))
+
         self._add_setting(
             Setting('point_size', 'Point size', 'preferences', int, 2, min_value=1, max_value=4))
 
@@ -0,0 +1,142 @@
+# -*- coding: utf-8 -*-
+# This file is part of the Horus Project
+
+__author__ = 'Jesús Arroyo Torrens <jesus.arroyo@bq.com>'
+__copyright__ = 'Copyright (C) 2014-2016 Mundo Reader S.L.'
+__license__ = 'GNU General Public License v2 http://www.gnu.org/licenses/gpl2.html'
+
+"""
+Configuration of the engine modules from the profile settings.
+
+Shared by the scanning workbench and the command line scanner,
+so it does not depend on wx.
+"""
+
+import os
+import struct
+
+from horus.util import profile, system
+from horus.engine.driver.driver import Driver
+from horus.engine.scan.ciclop_scan import CiclopScan
+from horus.engine.calibration.calibration_data import CalibrationData
+from horus.engine.algorithms.image_capture import ImageCapture
+from horus.engine.algorithms.laser_segmentation import LaserSegmentation
+from horus.engine.algorithms.point_cloud_roi import PointCloudROI
+
+
+def setup_driver():
+    """Board, camera and flush settings. Must be called before connecting"""
+    driver = Driver()
+    image_capture = ImageCapture()
+
+    if len(profile.settings['camera_id']):
+        driver.camera.camera_id = int(profile.settings['camera_id'][-1:])
+    driver.camera.set_use_grabber(profile.settings['camera_grabber'])
+
+    driver.board.serial_name = profile.settings['serial_name']
+    driver.board.baud_rate = profile.settings['baud_rate']
+    driver.board.motor_invert(profile.settings['invert_motor'])
+
+    flush_setting = 'flush_'
+    flush_stream_setting = 'flush_stream_'
+    if system.is_linux():
+        flush_setting += 'linux'
+        flush_stream_setting += 'linux'
+    elif system.is_darwin():
+        flush_setting += 'darwin'
+        flush_stream_setting += 'darwin'
+    elif system.is_windows():
+        flush_setting += 'windows'
+        flush_stream_setting += 'windows'
+
+    texture, laser, pattern = profile.settings[flush_setting]
+    image_capture.set_flush_values(texture, laser, pattern)
+    texture, laser, pattern = profile.settings[flush_stream_setting]
+    image_capture.set_flush_stream_values(texture, laser, pattern)
+    image_capture.set_adaptive_flush(profile.settings['adaptive_flush'])
+
+
+def setup_scan():
+    """Camera, segmentation, calibration and scan settings"""
+    driver = Driver()
+    ciclop_scan = CiclopScan()
+    image_capture = ImageCapture()
+    laser_segmentation = LaserSegmentation()
+    calibration_data = CalibrationData()
+    point_cloud_roi = PointCloudROI()
+
+    driver.camera.set_frame_rate(int(profile.settings['frame_rate']))
+    driver.camera.set_resolution(
+        profile.settings['camera_width'], profile.settings['camera_height'])
+    driver.camera.set_rotate(profile.settings['camera_rotate'])
+    driver.camera.set_hflip(profile.settings['camera_hflip'])
+    driver.camera.set_vflip(profile.settings['camera_vflip'])
+    driver.camera.set_luminosity(profile.settings['luminosity'])
+    image_capture.set_mode_texture()
+    texture_mode = image_capture.texture_mode
+    texture_mode.set_brightness(profile.settings['brightness_texture_scanning'])
+    texture_mode.set_contrast(profile.settings['contrast_texture_scanning'])
+    texture_mode.set_saturation(profile.settings['saturation_texture_scanning'])
+    texture_mode.set_exposure(profile.settings['exposure_texture_scanning'])
+    laser_mode = image_capture.laser_mode
+    laser_mode.brightness = profile.settings['brightness_laser_scanning']
+    laser_mode.contrast = profile.settings['contrast_laser_scanning']
+    laser_mode.saturation = profile.settings['saturation_laser_scanning']
+    laser_mode.exposure = profile.settings['exposure_laser_scanning']
+    image_capture.set_use_distortion(profile.settings['use_distortion'])
+    image_capture.set_remove_background(profile.settings['remove_background_scanning'])
+    laser_segmentation.red_channel = profile.settings['red_channel_scanning']
+    laser_segmentation.threshold_enable = profile.settings['threshold_enable_scanning']
+    laser_segmentation.threshold_value = profile.settings['threshold_value_scanning']
+    laser_segmentation.blur_enable = profile.settings['blur_enable_scanning']
+    laser_segmentation.set_blur_value(profile.settings['blur_value_scanning'])
+    laser_segmentation.window_enable = profile.settings['window_enable_scanning']
+    laser_segmentation.window_value = profile.settings['window_value_scanning']
+    laser_segmentation.tracking_enable = profile.settings['tracking_enable_scanning']
+    laser_segmentation.tracking_value = profile.settings['tracking_value_scanning']
+    laser_segmentation.peak_method = profile.settings['peak_scanning']
+    laser_segmentation.refinement_method = profile.settings['refinement_scanning']
+    laser_segmentation.fused_enable = profile.settings['fused_enable_scanning']
+    width, height = driver.camera.get_resolution()
+    calibration_data.set_resolution(width, height)
+    calibration_data.camera_matrix = profile.settings['camera_matrix']
+    calibration_data.distortion_vector = profile.settings['distortion_vector']
+    calibration_data.set_maps_path(os.path.join(profile.get_base_path(), 'maps'))
+    calibration_data.laser_planes[0].distance = profile.settings['distance_left']
+    calibration_data.laser_planes[0].normal = profile.settings['normal_left']
+    calibration_data.laser_planes[1].distance = profile.settings['distance_right']
+    calibration_data.laser_planes[1].normal = profile.settings['normal_right']
+    calibration_data.platform_rotation = profile.settings['rotation_matrix']
+    calibration_data.platform_translation = profile.settings['translation_vector']
+    ciclop_scan.capture_texture = profile.settings['capture_texture']
+    use_laser = profile.settings['use_laser']
+    ciclop_scan.set_use_left_laser(use_laser == 'Left' or use_laser == 'Both')
+    ciclop_scan.set_use_right_laser(use_laser == 'Right' or use_laser == 'Both')
+    ciclop_scan.set_dual_laser(profile.settings['dual_laser'])
+    ciclop_scan.set_texture_pass(profile.settings['texture_pass'])
+    ciclop_scan.set_texture_step(profile.settings['texture_step'])
+    ciclop_scan.motor_step = profile.settings['motor_step_scanning']
+    ciclop_scan.motor_speed = profile.settings['motor_speed_scanning']
+    ciclop_scan.motor_acceleration = profile.settings['motor_acceleration_scanning']
+    ciclop_scan.motion_mode = profile.settings['motion_mode_scanning']
+    ciclop_scan.set_undistort_points(profile.settings['undistort_points'])
+    ciclop_scan.color = struct.unpack(
+        'BBB', profile.settings['point_cloud_color'].decode('hex'))
+    ciclop_scan.set_scan_sleep(profile.settings['scan_sleep'])
+    ciclop_scan.set_workers(profile.settings['scan_workers'])
+    ciclop_scan.set_workers_backend(profile.settings['scan_workers_backend'])
+    ciclop_scan.set_queue_size(profile.settings['scan_queue_size'])
+    ciclop_scan.set_queue_policy(profile.settings['scan_queue_policy'])
+    if profile.settings['scan_record_session']:
+        ciclop_scan.set_record_path(os.path.join(profile.get_base_path(), 'sessions'))
+    else:
+        ciclop_scan.set_record_path(None)
+    if profile.settings['scan_autosave']:
+        ciclop_scan.set_autosave_path(os.path.join(profile.get_base_path(), 'scans'))
+    else:
+        ciclop_scan.set_autosave_path(None)
+    ciclop_scan.set_telemetry_path(os.path.join(profile.get_base_path(), 'telemetry'))
+    point_cloud_roi.set_show_center(profile.settings['show_center'])
+    point_cloud_roi.set_use_roi(profile.settings['use_roi'])
+    point_cloud_roi.set_diameter(profile.settings['roi_diameter'])
+    point_cloud_roi.set_height(profile.settings['roi_height'])
@@ -5,7 +5,6 @@ __author__ = 'Jesús Arroyo Torrens <jesus.arroyo@bq.com>'
 __copyright__ = 'Copyright (C) 2014-2016 Mundo Reader S.L.'
 __license__ = 'GNU General Public License v2 http://www.gnu.org/licenses/gpl2.html'
 
-import wx._core
 import platform
 s = platform.system()
 del platform
@@ -23,9 +22,12 @@ def is_windows():
     return s == 'Windows'
 
 
+# wx is imported on demand, so this module can be used without GUI
 def is_wx28():
+    import wx
     return wx.__version__.startswith('2.8')
 
 
 def is_wx30():
+    import wx
     return wx.__version__.startswith('3.0')
@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+# This file is part of the Horus Project
+
+__author__ = 'Jesús Arroyo Torrens <jesus.arroyo@bq.com>'
+__copyright__ = 'Copyright (C) 2014-2016 Mundo Reader S.L.'
+__license__ = 'GNU General Public License v2 http://www.gnu.org/licenses/gpl2.html'
+
+"""Laser segmentation benchmark: OpenCV path against the fused kernel,
+which requires Numba. The first call compiles the kernel.
+
+    PYTHONPATH=src python test/benchmark/fused_segmentation.py [--repeat N]
+"""
+
+import timeit
+import argparse
+import numpy as np
+
+from horus.engine.algorithms import segmentation_kernel
+from horus.engine.algorithms.laser_segmentation import LaserSegmentation
+
+
+def laser_image(height, width):
+    # Native BGR frame with a laser line and background noise
+    rng = np.random.RandomState(0)
+    image = rng.randint(0, 40, (height, width, 3)).astype(np.uint8)
+    columns = np.arange(width)
+    center = width / 2 + width / 8 * np.sin(np.arange(height) / 100.)
+    image[:, :, 2] = np.maximum(
+        image[:, :, 2], 220 * np.exp(-0.5 * ((columns - center[:, np.newaxis]) / 2.) ** 2))
+    return image
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Laser segmentation benchmark')
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    if segmentation_kernel.numba is None:
+        print "Numba is not installed: the fused kernel is not available"
+        return
+
+    laser_segmentation = LaserSegmentation()
+    laser_segmentation.threshold_enable = True
+    laser_segmentation.threshold_value = 50
+    laser_segmentation.blur_enable = True
+    laser_segmentation.set_blur_value(2)
+    laser_segmentation.window_enable = True
+    laser_segmentation.window_value = 8
+    laser_segmentation.peak_method = 'Center of mass'
+    laser_segmentation.refinement_method = 'None'
+    for orientation in ((False, False, False), (True, False, False)):
+        for height, width in ((480, 640), (960, 1280)):
+            if orientation[0]:
+                height, width = width, height
+            image = laser_image(height, width)
+            times = []
+            points = []
+            for fused in (False, True):
+                laser_segmentation.fused_enable = fused
+                function = lambda: laser_segmentation.compute_2d_points(image, orientation)
+                points.append(function()[0])
+                times.append(1000 * min(timeit.repeat(function, number=1, repeat=args.repeat)))
+            assert np.array_equal(points[0][1], points[1][1])
+            assert np.allclose(points[0][0], points[1][0])
+            print "{0}x{1}{2}  opencv {3:.2f} ms  fused {4:.2f} ms  x{5:.1f}".format(
+                width, height, ' rotated' if orientation[0] else '',
+                times[0], times[1], times[0] / times[1])
+
+
+if __name__ == '__main__':
+    main()
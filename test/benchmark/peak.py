@@ -0,0 +1,60 @@
+# -*- coding: utf-8 -*-
+# This file is part of the Horus Project
+
+__author__ = 'Jesús Arroyo Torrens <jesus.arroyo@bq.com>'
+__copyright__ = 'Copyright (C) 2014-2016 Mundo Reader S.L.'
+__license__ = 'GNU General Public License v2 http://www.gnu.org/licenses/gpl2.html'
+
+"""Peak detection benchmark: accuracy and time of the sub-pixel
+estimators on synthetic laser images with a known line.
+
+    PYTHONPATH=src python test/benchmark/peak.py [--repeat N]
+"""
+
+import timeit
+import argparse
+import numpy as np
+
+from horus.engine.algorithms.laser_segmentation import LaserSegmentation
+
+METHODS = ('Center of mass', 'Windowed center of mass', 'Parabolic', 'Gaussian', 'Blais-Rioux')
+
+
+def laser_image(height, width, sigma, noise):
+    # Gaussian line profile at sub-pixel columns, with sensor noise
+    rng = np.random.RandomState(0)
+    center = width / 2 + width / 8 * np.sin(np.arange(height) / 100.) + rng.uniform(-.5, .5, height)
+    columns = np.arange(width)
+    image = 230 * np.exp(-0.5 * ((columns - center[:, np.newaxis]) / sigma) ** 2)
+    image += rng.normal(0, noise, image.shape)
+    return np.clip(image, 0, 255).astype(np.uint8), center
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Peak detection benchmark')
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    height, width = 960, 1280
+    laser_segmentation = LaserSegmentation()
+    laser_segmentation.threshold_enable = True
+    laser_segmentation.threshold_value = 30
+    laser_segmentation.window_enable = True
+    laser_segmentation.window_value = 5
+    for sigma, noise in ((1.0, 2), (2.0, 2), (2.0, 8), (4.0, 8)):
+        image, center = laser_image(height, width, sigma, noise)
+        image = laser_segmentation._window_mask(
+            laser_segmentation._threshold_image(image), laser_segmentation._last_threshold())
+        print "sigma {0} px  noise {1}".format(sigma, noise)
+        for method in METHODS:
+            laser_segmentation.peak_method = method
+            s, peak = laser_segmentation._peak(image)
+            error = (peak - center)[s > 0]
+            time = 1000 * min(timeit.repeat(
+                lambda: laser_segmentation._peak(image), number=1, repeat=args.repeat))
+            print "  {0:24} rms {1:.3f} px  max {2:.3f} px  {3:.2f} ms".format(
+                method, np.sqrt(np.mean(error ** 2)), np.abs(error).max(), time)
+
+
+if __name__ == '__main__':
+    main()
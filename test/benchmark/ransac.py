@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+# This file is part of the Horus Project
+
+__author__ = 'Jesús Arroyo Torrens <jesus.arroyo@bq.com>'
+__copyright__ = 'Copyright (C) 2014-2016 Mundo Reader S.L.'
+__license__ = 'GNU General Public License v2 http://www.gnu.org/licenses/gpl2.html'
+
+"""RANSAC benchmark: one hypothesis per iteration without early stop
+against the batched search, for the laser line and the laser plane.
+
+    PYTHONPATH=src python test/benchmark/ransac.py [--repeat N]
+"""
+
+import timeit
+import argparse
+import numpy as np
+
+from horus.engine.algorithms.ransac import ransac, LineModel, PlaneModel
+
+
+def line(rows, outliers):
+    # Laser line of a capture, with spurious peaks
+    rng = np.random.RandomState(0)
+    v = np.arange(rows, dtype=float)
+    u = 0.3 * v + 600 + rng.normal(0, 0.5, rows)
+    u[rng.rand(rows) < outliers] += rng.uniform(20, 200)
+    return np.vstack((v, u)).T, LineModel(), 2, 2, 100
+
+
+def plane(points, outliers):
+    # Laser points of the calibration pattern, with points off the plane
+    rng = np.random.RandomState(0)
+    X = rng.uniform(-100, 100, (points, 3))
+    X[:, 2] = 0.1 * X[:, 0] - 0.2 * X[:, 1] + 300 + rng.normal(0, 0.03, points)
+    X[rng.rand(points) < outliers, 2] += rng.uniform(1, 20)
+    return X, PlaneModel(), 3, 0.1, 500
+
+
+def main():
+    parser = argparse.ArgumentParser(description='RANSAC benchmark')
+    parser.add_argument('--repeat', type=int, default=10)
+    args = parser.parse_args()
+
+    for name, make, size in (('line', line, 960), ('line', line, 1280),
+                             ('plane', plane, 5000), ('plane', plane, 20000)):
+        for outliers in (0.1, 0.4):
+            data, model, min_samples, threshold, max_trials = make(size, outliers)
+            times = []
+            for kwargs in (dict(batch_size=1, probability=1), dict()):
+                function = lambda: ransac(data, model, min_samples, threshold,
+                                          max_trials=max_trials, random_state=0, **kwargs)
+                times.append(1000 * min(timeit.repeat(function, number=1, repeat=args.repeat)))
+            print "{0:5} {1:5} points  {2:2.0f} % outliers  loop {3:.2f} ms  " \
+                "batched {4:.2f} ms  x{5:.1f}".format(
+                    name, size, 100 * outliers, times[0], times[1], times[0] / times[1])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,125 @@
+# -*- coding: utf-8 -*-
+# This file is part of the Horus Project
+
+__author__ = 'Jesús Arroyo Torrens <jesus.arroyo@bq.com>'
+__copyright__ = 'Copyright (C) 2014-2016 Mundo Reader S.L.'
+__license__ = 'GNU General Public License v2 http://www.gnu.org/licenses/gpl2.html'
+
+"""End-to-end scan throughput benchmark, without camera or board.
+
+A recorded scan session is replayed through the CiclopScan processing
+path. If no session is given, a synthetic one is generated.
+
+    PYTHONPATH=src python test/benchmark/scan_replay.py [session] [--workers N]
+"""
+
+import time
+import shutil
+import argparse
+import tempfile
+import threading
+import numpy as np
+
+from horus.engine.scan.ciclop_scan import CiclopScan
+from horus.engine.scan.scan_capture import ScanCapture
+from horus.engine.scan.scan_session import ScanSessionWriter
+from horus.engine.calibration.calibration_data import CalibrationData
+from horus.engine.algorithms.laser_segmentation import LaserSegmentation
+
+
+def synthetic_session(path, width=1280, height=960, captures=100):
+    calibration_data = CalibrationData()
+    calibration_data.set_resolution(width, height)
+    calibration_data.camera_matrix = np.array(
+        [[1430., 0., width / 2.], [0., 1430., height / 2.], [0., 0., 1.]])
+    calibration_data.distortion_vector = np.zeros(5)
+    calibration_data.laser_planes[0].distance = 150.
+    calibration_data.laser_planes[0].normal = np.array([0.87, 0., 0.5])
+    calibration_data.laser_planes[1].distance = 150.
+    calibration_data.laser_planes[1].normal = np.array([-0.87, 0., 0.5])
+    calibration_data.platform_rotation = np.eye(3)
+    calibration_data.platform_translation = np.array([5., 80., 320.])
+
+    laser_segmentation = LaserSegmentation()
+    laser_segmentation.threshold_enable = True
+    laser_segmentation.threshold_value = 50
+    laser_segmentation.blur_enable = True
+    laser_segmentation.set_blur_value(2)
+    laser_segmentation.window_enable = True
+    laser_segmentation.window_value = 8
+
+    # Gaussian laser profile with a smooth deformation per row
+    rng = np.random.RandomState(0)
+    rows = np.arange(height)
+    columns = np.arange(width)
+    writer = ScanSessionWriter(path)
+    writer.open({'synthetic': True})
+    for k in xrange(captures):
+        capture = ScanCapture()
+        capture.theta = 2 * np.pi * k / captures
+        capture.texture = rng.randint(0, 60, (height, width, 3)).astype(np.uint8)
+        for i in xrange(2):
+            center = width * (0.35 + 0.3 * i) + 40 * np.sin(rows / 80. + capture.theta)
+            profile = 220 * np.exp(-(columns - center[:, np.newaxis]) ** 2 / 8.)
+            laser = rng.randint(0, 30, (height, width, 3)).astype(np.uint8)
+            laser[:, :, 0] = np.maximum(laser[:, :, 0], profile.astype(np.uint8))
+            capture.lasers[i] = laser
+        writer.write(capture)
+    writer.close()
+
+
+def replay(path, workers, backend):
+    ciclop_scan = CiclopScan()
+    ciclop_scan.set_replay_path(path)
+    ciclop_scan.set_workers(workers)
+    ciclop_scan.set_workers_backend(backend)
+    points = [0]
+
+    def point_cloud_callback(range, progress, point_cloud):
+        points[0] += point_cloud[0].shape[1]
+
+    done = threading.Event()
+    response = []
+
+    def after_callback(ret):
+        response.append(ret)
+        done.set()
+
+    ciclop_scan.point_cloud_callback = point_cloud_callback
+    ciclop_scan.set_callbacks(None, None, after_callback)
+    begin = time.time()
+    ciclop_scan.start()
+    while not done.wait(1):
+        pass
+    elapsed = time.time() - begin
+    return response[0], ciclop_scan._range, points[0], elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Scan replay benchmark')
+    parser.add_argument('session', nargs='?', help='Recorded scan session directory')
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--backend', default='Thread', choices=('Thread', 'Process'))
+    parser.add_argument('--captures', type=int, default=100,
+                        help='Captures of the synthetic session')
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    path = args.session
+    if path is None:
+        path = tempfile.mkdtemp()
+        synthetic_session(path, captures=args.captures)
+    try:
+        for _ in xrange(args.repeat):
+            (ret, error), captures, points, elapsed = replay(path, args.workers, args.backend)
+            if not ret:
+                raise error
+            print "{0} captures  {1} points  {2:.2f} s  {3:.1f} captures/s  {4:.0f} points/s".format(
+                captures, points, elapsed, captures / elapsed, points / elapsed)
+    finally:
+        if args.session is None:
+            shutil.rmtree(path)
+
+
+if __name__ == '__main__':
+    main()
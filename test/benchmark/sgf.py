@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+# This file is part of the Horus Project
+
+__author__ = 'Jesús Arroyo Torrens <jesus.arroyo@bq.com>'
+__copyright__ = 'Copyright (C) 2014-2016 Mundo Reader S.L.'
+__license__ = 'GNU General Public License v2 http://www.gnu.org/licenses/gpl2.html'
+
+"""Segmented gaussian filter benchmark: filter per segment against
+the vectorized filter, on smooth and fragmented laser profiles.
+
+    PYTHONPATH=src python test/benchmark/sgf.py [--repeat N]
+"""
+
+import timeit
+import argparse
+import numpy as np
+import scipy.ndimage
+
+from horus.engine.algorithms.laser_segmentation import LaserSegmentation
+
+
+def loop_sgf(u, v, s):
+    # Previous implementation: one gaussian filter per segment
+    i = 0
+    f = np.array([])
+    segments = [s[_r] for _r in np.ma.clump_unmasked(np.ma.masked_equal(s, 0))]
+    for segment in segments:
+        j = len(segment)
+        fseg = scipy.ndimage.gaussian_filter(u[i:i + j], sigma=2.0)
+        f = np.concatenate((f, fseg))
+        i += j
+    return f, v
+
+
+def profile(height, drop):
+    # Rows of the line, with a fraction of rows without laser
+    rng = np.random.RandomState(0)
+    s = np.ones(height)
+    s[rng.rand(height) < drop] = 0
+    v = np.where(s > 0)[0]
+    u = 640 + 100 * np.sin(v / 80.) + rng.randn(len(v))
+    return u, v, s
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Segmented gaussian filter benchmark')
+    parser.add_argument('--repeat', type=int, default=100)
+    args = parser.parse_args()
+
+    laser_segmentation = LaserSegmentation()
+    for name, drop in (('smooth', 0.0), ('fragmented 10 %', 0.1), ('fragmented 40 %', 0.4)):
+        for height in (960, 1280):
+            u, v, s = profile(height, drop)
+            segments = len(np.ma.clump_unmasked(np.ma.masked_equal(s, 0)))
+            assert np.allclose(loop_sgf(u, v, s)[0], laser_segmentation._sgf(u, v)[0])
+            times = []
+            for function in (lambda: loop_sgf(u, v, s),
+                             lambda: laser_segmentation._sgf(u, v)):
+                times.append(1000 * min(timeit.repeat(function, number=1, repeat=args.repeat)))
+            print "{0:16} {1} rows  {2:3} segments  loop {3:.2f} ms  " \
+                "vectorized {4:.2f} ms  x{5:.1f}".format(
+                    name, height, segments, times[0], times[1], times[0] / times[1])
+
+
+if __name__ == '__main__':
+    main()
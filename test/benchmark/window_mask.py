@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+# This file is part of the Horus Project
+
+__author__ = 'Jesús Arroyo Torrens <jesus.arroyo@bq.com>'
+__copyright__ = 'Copyright (C) 2014-2016 Mundo Reader S.L.'
+__license__ = 'GNU General Public License v2 http://www.gnu.org/licenses/gpl2.html'
+
+"""Window mask benchmark: row loop against the vectorized mask.
+
+    PYTHONPATH=src python test/benchmark/window_mask.py [--repeat N]
+"""
+
+import cv2
+import timeit
+import argparse
+import numpy as np
+
+from horus.engine.algorithms.laser_segmentation import LaserSegmentation
+
+
+def loop_window_mask(image, window_value, threshold):
+    # Previous implementation: mask built row by row
+    image = cv2.threshold(image, threshold, 255, cv2.THRESH_TOZERO)[1]
+    peak = image.argmax(axis=1)
+    _min = peak - window_value
+    _max = peak + window_value + 1
+    mask = np.zeros_like(image)
+    for i in xrange(image.shape[0]):
+        mask[i, _min[i]:_max[i]] = 255
+    return cv2.bitwise_and(image, mask)
+
+
+def laser_image(height, width):
+    rng = np.random.RandomState(0)
+    center = width / 2. + width / 8. * np.sin(np.arange(height) / 80.)
+    profile = 220 * np.exp(-(np.arange(width) - center[:, np.newaxis]) ** 2 / 8.)
+    image = rng.randint(0, 30, (height, width)).astype(np.uint8)
+    return np.maximum(image, profile.astype(np.uint8))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Window mask benchmark')
+    parser.add_argument('--repeat', type=int, default=100)
+    args = parser.parse_args()
+
+    laser_segmentation = LaserSegmentation()
+    laser_segmentation.window_enable = True
+    laser_segmentation.window_value = 8
+    threshold = 50
+    for width, height in ((1280, 960), (1920, 1080)):
+        image = cv2.blur(laser_image(height, width), (5, 5))
+        vectorized = laser_segmentation._window_mask(image, threshold)
+        assert (vectorized == loop_window_mask(image, 8, threshold)).all()
+        times = []
+        for function in (lambda: image.argmax(axis=1),
+                         lambda: loop_window_mask(image, 8, threshold),
+                         lambda: laser_segmentation._window_mask(image, threshold)):
+            times.append(1000 * min(timeit.repeat(function, number=1, repeat=args.repeat)))
+        # Both search the peaks with argmax
+        peak, loop, vectorized = times
+        print "{0}x{1}  loop {2:.2f} ms  vectorized {3:.2f} ms  x{4:.1f}  " \
+            "(argmax {5:.2f} ms, mask x{6:.1f})".format(
+                width, height, loop, vectorized, loop / vectorized, peak,
+                (loop - peak) / (vectorized - peak))
+
+
+if __name__ == '__main__':
+    main()
@@ -1,7 +1,64 @@
+import time
+import threading
 import unittest
 from horus.engine.driver.board import Board
 
 
+class FakeSerial(object):
+
+    """Serial port of a board that answers each command with its name
+       when it is parsed. The movements are queued and take duration
+       seconds: G4 P0 is answered when they are completed"""
+
+    def __init__(self, duration=0):
+        self.duration = duration
+        self.writes = []
+        self._lines = []
+        self._motion_end = 0
+        self._condition = threading.Condition()
+
+    def isOpen(self):
+        return True
+
+    def flushInput(self):
+        with self._condition:
+            self._lines = []
+
+    def flushOutput(self):
+        pass
+
+    def write(self, data):
+        command = data.strip()
+        self.writes.append(command)
+        now = time.time()
+        delay = 0
+        if command in ('!', '~'):
+            return
+        elif command == '\x18':
+            self._motion_end = now
+        elif command.startswith('G1X'):
+            self._motion_end = max(now, self._motion_end) + self.duration
+        elif command.startswith('G4'):
+            delay = max(0, self._motion_end - now)
+        threading.Timer(delay, self._respond, (command,)).start()
+
+    def readline(self):
+        with self._condition:
+            if not self._lines:
+                self._condition.wait(0.05)
+            if self._lines:
+                return self._lines.pop(0)
+            return ''
+
+    def _respond(self, command):
+        with self._condition:
+            if command == '\x18':
+                self._lines += ['\r\n', "Horus 0.2 ['$' for help]\r\n"]
+            else:
+                self._lines.append('ok ' + command + '\r\n')
+            self._condition.notify()
+
+
 class BoardTest(unittest.TestCase):
 
     def setUp(self):
@@ -12,3 +69,55 @@ class BoardTest(unittest.TestCase):
 
     def test_baud_rate(self):
         self.assertEqual(self.board.baud_rate, 115200)
+
+    def connect(self, duration):
+        self.board._serial_port = FakeSerial(duration)
+        self.board._is_connected = True
+
+    def test_concurrent_commands(self):
+        # Each command waits for its own response
+        self.connect(0.2)
+        self.board.motor_start(90)
+        responses = {}
+        thread = threading.Thread(
+            target=lambda: responses.update(wait=self.board._send_command('G4P0')))
+        thread.start()
+        time.sleep(0.05)
+        responses['laser'] = self.board._send_command('M71T1')
+        thread.join()
+        self.assertEqual(responses['wait'], 'ok G4P0\r\n')
+        self.assertEqual(responses['laser'], 'ok M71T1\r\n')
+
+    def test_motor_move(self):
+        # The movement is completed when it returns
+        self.connect(0.3)
+        begin = time.time()
+        self.board.motor_move(90)
+        self.assertGreaterEqual(time.time() - begin, 0.3)
+        self.assertEqual(self.board._serial_port.writes, ['G1X90', 'G4P0'])
+
+    def test_motor_start(self):
+        # The movement does not block the laser commands
+        self.connect(0.5)
+        begin = time.time()
+        self.board.motor_start(90)
+        self.assertEqual(self.board._send_command('M71T1'), 'ok M71T1\r\n')
+        self.assertLess(time.time() - begin, 0.4)
+        self.assertEqual(self.board._serial_port.writes, ['G1X90', 'M71T1'])
+        self.board.motor_wait()
+        self.assertGreaterEqual(time.time() - begin, 0.5)
+        self.assertEqual(self.board._serial_port.writes[-1], 'G4P0')
+
+    def test_motor_flush(self):
+        # The queued movement is discarded
+        self.connect(5)
+        self.board._motor_speed = 200
+        self.board.motor_start(90)
+        self.board.motor_hold()
+        begin = time.time()
+        self.board.motor_flush()
+        self.board.motor_wait()
+        self.assertLess(time.time() - begin, 0.5)
+        self.assertEqual(self.board._serial_port.writes,
+                         ['G1X90', '!', '\x18', 'G1F200', 'G50', 'G4P0'])
+        self.assertEqual(self.board._motor_position, 0)
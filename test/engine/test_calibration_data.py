@@ -0,0 +1,71 @@
+import os
+import shutil
+import tempfile
+import unittest
+import cv2
+import numpy as np
+
+from horus.engine.calibration.calibration_data import CalibrationData
+
+
+class CalibrationDataTest(unittest.TestCase):
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.calibration_data = CalibrationData()
+        self.saved = dict(self.calibration_data.__dict__)
+        self.calibration_data.set_resolution(160, 120)
+        self.calibration_data.camera_matrix = np.array(
+            [[150., 0., 80.], [0., 150., 60.], [0., 0., 1.]])
+        self.calibration_data.distortion_vector = np.array([0.1, -0.2, 0., 0., 0.05])
+        self.calibration_data.set_maps_path(self.path)
+        self.calibration_data._maps = None
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+        self.calibration_data.__dict__.update(self.saved)
+
+    def test_undistort_image(self):
+        image = np.random.RandomState(0).randint(0, 256, (120, 160, 3)).astype(np.uint8)
+        expected = cv2.undistort(image,
+                                 self.calibration_data.camera_matrix,
+                                 self.calibration_data.distortion_vector,
+                                 None,
+                                 self.calibration_data.dist_camera_matrix)
+        result = self.calibration_data.undistort_image(image)
+        # Fixed point maps: up to one level of difference
+        self.assertTrue(np.abs(result.astype(int) - expected).max() <= 1)
+
+    def test_undistort_window(self):
+        image = np.random.RandomState(0).randint(0, 256, (120, 160, 3)).astype(np.uint8)
+        result = self.calibration_data.undistort_image(image, (30, 20, 90, 70))
+        np.testing.assert_array_equal(
+            result, self.calibration_data.undistort_image(image)[20:70, 30:90])
+
+    def test_distort_window(self):
+        image = np.random.RandomState(0).randint(0, 256, (120, 160, 3)).astype(np.uint8)
+        window = (30, 20, 90, 70)
+        umin, vmin, umax, vmax = self.calibration_data.distort_window(window)
+        # The raw window has all the pixels to undistort the window
+        raw = np.zeros_like(image)
+        raw[vmin:vmax, umin:umax] = image[vmin:vmax, umin:umax]
+        np.testing.assert_array_equal(
+            self.calibration_data.undistort_image(raw, window),
+            self.calibration_data.undistort_image(image, window))
+
+    def test_persist_maps(self):
+        image = np.zeros((120, 160), np.uint8)
+        self.calibration_data.undistort_image(image)
+        self.assertEqual(len(os.listdir(self.path)), 1)
+
+    def test_undistort_points(self):
+        u = np.array([20., 80.5, 140.])
+        v = np.array([15, 60, 100])
+        ud, vd = self.calibration_data.undistort_points((u, v))
+        # The undistortion map goes back to the raw points
+        mapx, mapy = cv2.initUndistortRectifyMap(
+            self.calibration_data.camera_matrix, self.calibration_data.distortion_vector, None,
+            self.calibration_data.dist_camera_matrix, (160, 120), cv2.CV_32FC1)
+        index = np.around(vd).astype(int), np.around(ud).astype(int)
+        self.assertTrue(np.abs(mapx[index] - u).max() < 1.5)
+        self.assertTrue(np.abs(mapy[index] - v).max() < 1.5)
@@ -0,0 +1,75 @@
+import time
+import unittest
+import numpy as np
+
+from horus.engine.driver.camera import Camera, native_window, orient_image
+
+
+class FakeCapture(object):
+
+    def __init__(self, period=0.01):
+        self.period = period
+        self.count = 0
+
+    def read(self):
+        time.sleep(self.period)
+        self.count += 1
+        image = np.zeros((4, 6, 3), np.uint8)
+        image[0, 0, 0] = self.count % 256
+        return True, image
+
+    def release(self):
+        pass
+
+
+class CameraGrabberTest(unittest.TestCase):
+
+    def setUp(self):
+        self.camera = Camera()
+        self.camera._capture = FakeCapture()
+        self.camera._is_connected = True
+        self.camera.set_use_grabber(True)
+
+    def tearDown(self):
+        self.camera.set_use_grabber(False)
+
+    def test_capture_since(self):
+        self.camera.capture_image()
+        since = time.time()
+        image = self.camera.capture_image(since=since)
+        self.assertIsNotNone(image)
+        self.assertTrue(self.camera.timestamp - self.camera._frame_period >= since)
+        # Rotated and flipped by default
+        self.assertEqual(image.shape, (6, 4, 3))
+
+    def test_capture_flush(self):
+        self.camera.capture_image()
+        sequence = self.camera._sequence
+        self.camera.capture_image(flush=3)
+        self.assertTrue(self.camera._sequence >= sequence + 4)
+
+    def test_capture_flush_since(self):
+        self.camera.capture_image()
+        since = time.time()
+        self.camera.capture_image(flush=3, since=since)
+        # The first fresh frame, without waiting for the flush
+        self.assertTrue(self.camera.timestamp - since < self.camera._frame_period + 0.02)
+
+    def test_stop_grabber(self):
+        self.camera.set_use_grabber(False)
+        self.assertFalse(self.camera.use_grabber)
+        image = self.camera.capture_image()
+        self.assertIsNotNone(image)
+
+
+class NativeWindowTest(unittest.TestCase):
+
+    def test_orientations(self):
+        native = np.arange(6 * 8, dtype=np.uint8).reshape(6, 8)
+        window = (1, 2, 3, 5)
+        for orientation in [(r, h, v) for r in (False, True)
+                            for h in (False, True) for v in (False, True)]:
+            umin, vmin, umax, vmax = native_window(window, native.shape, orientation)
+            np.testing.assert_array_equal(
+                orient_image(native[vmin:vmax, umin:umax], orientation),
+                orient_image(native, orientation)[2:5, 1:3])
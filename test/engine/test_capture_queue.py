@@ -0,0 +1,34 @@
+import unittest
+import numpy as np
+
+from horus.engine.scan.capture_queue import CaptureQueue
+from horus.engine.scan.scan_capture import ScanCapture
+
+
+def make_capture(theta, size=1000):
+    capture = ScanCapture()
+    capture.theta = theta
+    capture.texture = np.zeros(size, dtype=np.uint8)
+    return capture
+
+
+class CaptureQueueTest(unittest.TestCase):
+
+    def test_drop_oldest(self):
+        queue = CaptureQueue(capacity=2500, policy='Drop oldest')
+        for theta in xrange(5):
+            queue.put(make_capture(theta))
+        statistics = queue.statistics()
+        self.assertEqual(statistics['puts'], 5)
+        self.assertEqual(statistics['drops'], 3)
+        self.assertTrue(statistics['peak_bytes'] <= 2500)
+        self.assertEqual(queue.get().theta, 3)
+        self.assertEqual(queue.get().theta, 4)
+
+    def test_oversized_capture(self):
+        queue = CaptureQueue(capacity=100)
+        queue.put(make_capture(0))
+        queue.put(None)
+        self.assertEqual(queue.qsize(), 2)
+        self.assertEqual(queue.get().theta, 0)
+        self.assertIsNone(queue.get())
@@ -0,0 +1,301 @@
+import time
+import threading
+import unittest
+import numpy as np
+
+from horus.engine.driver.camera import orient_image
+from horus.engine.scan import ciclop_scan
+from horus.engine.scan.ciclop_scan import CiclopScan, column_index, interpolate_texture, \
+    sample_texture, process_capture
+from horus.engine.algorithms.laser_segmentation import LaserSegmentation
+from horus.engine.algorithms.point_cloud_generation import PointCloudGeneration
+from horus.engine.calibration.calibration_data import CalibrationData
+from horus.engine.scan.scan_capture import ScanCapture, ScanResult
+from horus.engine.scan.scan_pool import ScanPool
+
+
+def fake_process_capture(capture, bicolor=False, color=(0, 0, 0)):
+    # The captures complete out of order
+    time.sleep(0.01 * (3 - int(capture.theta) % 4))
+    result = ScanResult()
+    result.theta = capture.theta
+    result.point_clouds[0] = np.full((3, 1), capture.theta, float)
+    return result
+
+
+class FailingWriter(object):
+
+    def __init__(self):
+        self.closed = False
+
+    def write(self, *point_cloud):
+        raise IOError("No space left on device")
+
+    def close(self):
+        self.closed = True
+
+
+class FakeSerial(object):
+
+    """Board that answers each command when it is parsed"""
+
+    def __init__(self):
+        self.writes = []
+        self._lines = []
+
+    def isOpen(self):
+        return True
+
+    def flushInput(self):
+        self._lines = []
+
+    def flushOutput(self):
+        pass
+
+    def write(self, data):
+        command = data.strip()
+        self.writes.append(command)
+        if command == '\x18':
+            self._lines += ['\r\n', "Horus 0.2 ['$' for help]\r\n"]
+        elif command not in ('!', '~'):
+            self._lines.append('ok\r\n')
+
+    def readline(self):
+        if self._lines:
+            return self._lines.pop(0)
+        return ''
+
+
+class ColumnIndexTest(unittest.TestCase):
+
+    def test_native_columns(self):
+        native = np.arange(6 * 8, dtype=np.uint8).reshape(6, 8)
+        for orientation in [(r, h, v) for r in (False, True)
+                            for h in (False, True) for v in (False, True)]:
+            oriented = orient_image(native, orientation)
+            image = np.zeros_like(native)
+            index = column_index(native, 2, 5, orientation)
+            image[index] = native[index]
+            expected = np.zeros_like(oriented)
+            expected[:, 2:5] = oriented[:, 2:5]
+            np.testing.assert_array_equal(orient_image(image, orientation), expected)
+
+    def test_open_range(self):
+        image = np.ones((4, 6), np.uint8)
+        self.assertEqual(image[column_index(image, 4)].shape, (4, 2))
+        self.assertEqual(image[column_index(image, -3, 2)].shape, (4, 2))
+
+
+class InterpolateTextureTest(unittest.TestCase):
+
+    def setUp(self):
+        self.points_2d = (np.array([1., 2.6]), np.array([0, 3]))
+        self.previous = (0.1, np.full((4, 4, 3), 100, np.uint8), None)
+        self.following = (0.3, np.full((4, 4, 3), 200, np.uint8), None)
+
+    def test_weights(self):
+        texture = interpolate_texture(0.15, self.points_2d, self.previous, self.following)
+        self.assertEqual(texture.shape, (3, 2))
+        np.testing.assert_array_equal(texture, 125)
+        texture = interpolate_texture(0.3, self.points_2d, self.previous, self.following)
+        np.testing.assert_array_equal(texture, 200)
+
+    def test_window(self):
+        image = np.random.RandomState(0).randint(0, 256, (6, 8, 3)).astype(np.uint8)
+        points_2d = (np.array([2.2, 5.]), np.array([3, 4]))
+        np.testing.assert_array_equal(sample_texture(image[2:6, 1:7], points_2d, (1, 2, 7, 6)),
+                                      sample_texture(image, points_2d))
+
+    def test_first_texture(self):
+        texture = interpolate_texture(0.05, self.points_2d, None, self.following)
+        np.testing.assert_array_equal(texture, 200)
+
+
+class ProcessCaptureTest(unittest.TestCase):
+
+    def setUp(self):
+        self.calibration_data = CalibrationData()
+        self.saved = dict(self.calibration_data.__dict__)
+        self.saved_planes = [(plane.distance, plane.normal)
+                             for plane in self.calibration_data.laser_planes]
+        self.calibration_data._camera_matrix = np.array(
+            [[100., 0, 40], [0, 100., 30], [0, 0, 1]])
+        self.calibration_data.laser_planes[0].distance = 150.
+        self.calibration_data.laser_planes[0].normal = np.array([0.87, 0, 0.5])
+        self.calibration_data.laser_planes[1].distance = 150.
+        self.calibration_data.laser_planes[1].normal = np.array([-0.87, 0, 0.5])
+        self.calibration_data.platform_rotation = np.eye(3)
+        self.calibration_data.platform_translation = np.array([5., 80., 320.])
+        laser_segmentation = LaserSegmentation()
+        laser_segmentation.threshold_enable = False
+        laser_segmentation.window_enable = False
+        laser_segmentation.tracking_enable = False
+        laser_segmentation.peak_method = 'Center of mass'
+        laser_segmentation.refinement_method = 'None'
+        self.capture = ScanCapture()
+        self.capture.theta = 0.3
+        self.capture.lasers[0] = np.zeros((60, 80, 3), np.uint8)
+        self.capture.lasers[0][:, 30, 0] = 200
+
+    def tearDown(self):
+        self.calibration_data.__dict__.update(self.saved)
+        for plane, (distance, normal) in zip(self.calibration_data.laser_planes,
+                                             self.saved_planes):
+            plane.distance, plane.normal = distance, normal
+
+    def test_point_cloud(self):
+        self.capture.window = (5, 7, 85, 67)
+        result = process_capture(self.capture, color=(1, 2, 3))
+        self.assertIsNone(result.point_clouds[1])
+        u, v = result.points_2d[0]
+        np.testing.assert_array_equal(v, np.arange(60) + 7)
+        np.testing.assert_array_equal(u, 35)
+        # The bands are in the cropped image
+        np.testing.assert_array_equal(result.bands[0][0], 30)
+        np.testing.assert_allclose(
+            result.point_clouds[0],
+            PointCloudGeneration().compute_point_cloud(0.3, (u, v), 0))
+        np.testing.assert_array_equal(result.textures[0], [[1], [2], [3]] * np.ones(60))
+        self.assertGreater(result.timings['segmentation'], 0)
+
+    def test_texture(self):
+        self.capture.texture = np.zeros((60, 80, 3), np.uint8)
+        self.capture.texture[:, 30] = (10, 20, 30)
+        result = process_capture(self.capture)
+        np.testing.assert_array_equal(result.textures[0], [[10], [20], [30]] * np.ones(60))
+        result = process_capture(self.capture, bicolor=True)
+        np.testing.assert_array_equal(result.textures[0], [[255], [0], [0]] * np.ones(60))
+
+
+class ProcessTest(unittest.TestCase):
+
+    def setUp(self):
+        self.process_capture = ciclop_scan.process_capture
+        ciclop_scan.process_capture = fake_process_capture
+        self.scan = CiclopScan()
+        self.scan.laser_segmentation.tracking_enable = False
+        self.scan.telemetry.reset()
+        self.scan._captures_queue.clear()
+        self.scan._session_writer = None
+        self.scan._ply_writer = None
+        self.scan._second_pass = False
+        self.scan._held.clear()
+        self.scan._bands = [None, None]
+        self.scan._begin = self.scan._end = time.time()
+        self.scan._range = self.scan._progress = 0
+        self.emitted = []
+        self.responses = []
+        self.scan.point_cloud_callback = lambda r, p, point_cloud: self.emitted.append(
+            point_cloud[0][0, 0])
+        self.scan._after_callback = self.responses.append
+        self.scan.point_cloud_roi.mask_point_cloud = lambda point_cloud, texture: (
+            point_cloud, texture)
+
+    def tearDown(self):
+        ciclop_scan.process_capture = self.process_capture
+        del self.scan.point_cloud_roi.mask_point_cloud
+        self.scan.point_cloud_callback = None
+        self.scan._after_callback = None
+        self.scan._ply_writer = None
+
+    def run_process(self, count, workers=2):
+        self.scan._pool = ScanPool(workers, 'Thread')
+        self.scan._pool.start()
+        self.scan.is_scanning = True
+        self.scan._completed = True
+        for i in xrange(count):
+            capture = ScanCapture()
+            capture.theta = i
+            self.scan._captures_queue.put(capture)
+        self.scan._captures_queue.put(None)
+        self.scan._process()
+
+    def test_write_error(self):
+        # The scan ends with the error instead of hanging
+        self.scan._ply_writer = FailingWriter()
+        self.run_process(8)
+        self.assertFalse(self.scan.is_scanning)
+        self.assertIsNone(self.scan._pool._pool)
+        self.assertTrue(self.scan._ply_writer.closed)
+        self.assertEqual(len(self.responses), 1)
+        self.assertFalse(self.responses[0][0])
+        self.assertIsInstance(self.responses[0][1], IOError)
+
+    def test_emission_order(self):
+        for workers in [0, 1, 3]:
+            del self.emitted[:]
+            del self.responses[:]
+            self.run_process(12, workers)
+            self.assertEqual(self.emitted, range(12))
+            self.assertTrue(self.responses[0][0])
+            self.assertEqual(self.responses[0][1]['workers']['tasks'], 12)
+            self.assertIsNone(self.scan._pool._pool)
+
+    def test_stopped(self):
+        # The pending captures are discarded
+        self.scan._completed = False
+        self.scan.is_scanning = False
+        self.scan._pool = ScanPool(2, 'Thread')
+        self.scan._pool.start()
+        self.scan._captures_queue.put(ScanCapture())
+        self.scan._captures_queue.put(None)
+        self.scan._process()
+        self.assertEqual(self.emitted, [])
+        self.assertFalse(self.responses[0][0])
+        self.assertIsNone(self.scan._pool._pool)
+
+
+class ContinuousTest(unittest.TestCase):
+
+    def setUp(self):
+        self.scan = CiclopScan()
+        self.driver = self.scan.driver
+        self.board = self.driver.board
+        self.saved = (self.driver.is_connected, self.board._is_connected,
+                      self.board._serial_port, self.board._motor_position,
+                      self.board._motor_speed)
+        self.board._serial_port = FakeSerial()
+        self.board._motor_speed = 10
+        self.board._is_connected = self.driver.is_connected = True
+        self.scan.image_capture.flush_laser = lambda: None
+        self.scan._capture_images = self.capture_images
+        self.scan._captures_queue.clear()
+        self.scan.set_motor_step(0.45)
+        self.scan.set_motor_speed(10)
+        self.scan.set_motor_acceleration(100)
+        self.scan._theta = 0
+        self.scan._completed = False
+        self.scan.is_scanning = True
+        self.scan._resume_event.set()
+
+    def tearDown(self):
+        self.scan.is_scanning = False
+        del self.scan.image_capture.flush_laser
+        del self.scan._capture_images
+        self.scan._captures_queue.clear()
+        (self.driver.is_connected, self.board._is_connected,
+         self.board._serial_port, self.board._motor_position,
+         self.board._motor_speed) = self.saved
+
+    def capture_images(self, kinematics, direction):
+        time.sleep(0.02)
+        capture = ScanCapture()
+        capture.theta = np.deg2rad(direction * kinematics.angle(time.time()))
+        return capture
+
+    def test_stop(self):
+        # The rest of the turn is discarded instead of waited for
+        thread = threading.Thread(target=self.scan._capture_continuous)
+        thread.start()
+        time.sleep(0.2)
+        self.scan.stop()
+        begin = time.time()
+        thread.join(1.0)
+        self.assertFalse(thread.is_alive())
+        self.assertLess(time.time() - begin, 0.5)
+        writes = self.board._serial_port.writes
+        self.assertEqual(writes[0], 'G1X{0}'.format(360.45 + 0.5))
+        self.assertEqual(writes[1:4], ['!', '\x18', 'G1F10'])
+        self.assertNotIn('~', writes)
+        self.assertNotIn('G4P0', writes)
+        self.assertFalse(self.scan._completed)
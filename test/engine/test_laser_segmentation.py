@@ -0,0 +1,174 @@
+import unittest
+import cv2
+import numpy as np
+import scipy.ndimage
+
+from horus.engine.driver.camera import orient_image
+from horus.engine.algorithms.laser_segmentation import LaserSegmentation
+from horus.engine.calibration.calibration_data import CalibrationData
+
+
+def make_laser_image(height, width):
+    image = np.random.RandomState(0).randint(0, 30, (height, width, 3)).astype(np.uint8)
+    for v in xrange(10, height - 10):
+        u = int(width / 2 + width / 8 * np.sin(v / 20.))
+        image[v, u - 2:u + 3, 0] = 200
+    return image
+
+
+def native_image(image, orientation):
+    rotate, hflip, vflip = orientation
+    image = cv2.cvtColor(image, cv2.COLOR_RGB2BGR)
+    if vflip:
+        image = cv2.flip(image, 0)
+    if hflip:
+        image = cv2.flip(image, 1)
+    if rotate:
+        image = cv2.transpose(image)
+    return image
+
+
+class LaserSegmentationTest(unittest.TestCase):
+
+    def setUp(self):
+        self.laser_segmentation = LaserSegmentation()
+        self.laser_segmentation.threshold_enable = True
+        self.laser_segmentation.threshold_value = 50
+        self.laser_segmentation.blur_enable = True
+        self.laser_segmentation.set_blur_value(2)
+        self.laser_segmentation.window_enable = True
+        self.laser_segmentation.window_value = 8
+        self.laser_segmentation.tracking_enable = False
+        self.laser_segmentation.peak_method = 'Center of mass'
+        self.laser_segmentation.refinement_method = 'SGF'
+        self.laser_segmentation.fused_enable = False
+        CalibrationData().set_resolution(120, 160)
+
+    def test_native_orientation(self):
+        image = make_laser_image(160, 120)
+        (u, v), segmented = self.laser_segmentation.compute_2d_points(image)
+        for orientation in [(True, True, False), (True, False, True), (False, True, True)]:
+            native = native_image(image, orientation)
+            (nu, nv), nsegmented = self.laser_segmentation.compute_2d_points(
+                native, orientation)
+            np.testing.assert_array_equal(nv, v)
+            np.testing.assert_allclose(nu, u)
+            np.testing.assert_array_equal(orient_image(nsegmented, orientation), segmented)
+
+    def test_tracking(self):
+        image = make_laser_image(160, 120)
+        (u, v), segmented = self.laser_segmentation.compute_2d_points(image)
+        self.laser_segmentation.tracking_enable = True
+        self.laser_segmentation.tracking_value = 12
+        # Previous line shifted and without the lower rows
+        band = u[:100] + 3, v[:100]
+        for orientation in [None, (True, True, False), (False, True, True)]:
+            if orientation is None:
+                frame = image
+            else:
+                frame = native_image(image, orientation)
+            (tu, tv), tsegmented = self.laser_segmentation.compute_2d_points(
+                frame, orientation, band)
+            np.testing.assert_array_equal(tv, v)
+            np.testing.assert_allclose(tu, u, atol=1e-9)
+
+    def test_tracking_slope(self):
+        # The blur of the band reads the neighbor rows at their own columns
+        self.laser_segmentation.refinement_method = 'None'
+        self.laser_segmentation.tracking_value = 12
+        columns = np.arange(400)
+        for slope in [0.3, 1.5, 3.0]:
+            center = 50 + slope * np.arange(100)
+            image = np.zeros((100, 400, 3), np.uint8)
+            image[:, :, 0] = 200 * np.exp(-0.5 * ((columns - center[:, np.newaxis]) / 2.) ** 2)
+            self.laser_segmentation.tracking_enable = False
+            (u, v), segmented = self.laser_segmentation.compute_2d_points(image)
+            self.laser_segmentation.tracking_enable = True
+            (tu, tv), tsegmented = self.laser_segmentation.compute_2d_points(
+                image, band=(u, v))
+            np.testing.assert_array_equal(tv, v)
+            np.testing.assert_allclose(tu, u, atol=1e-9)
+            np.testing.assert_array_equal(tsegmented, segmented)
+
+    def test_peak_methods(self):
+        # Gaussian line at sub-pixel columns, with truncated peaks at the image borders
+        center = 60 + 40 * np.sin(np.arange(160) / 20.)
+        center[:2] = 0.2, 118.8
+        columns = np.arange(120)
+        image = 200 * np.exp(-0.5 * ((columns - center[:, np.newaxis]) / 1.5) ** 2)
+        image = self.laser_segmentation._window_mask(image.astype(np.uint8), 20)
+        for method, atol in [('Center of mass', 0.1), ('Windowed center of mass', 0.1),
+                             ('Parabolic', 0.1), ('Gaussian', 0.05), ('Blais-Rioux', 0.05)]:
+            self.laser_segmentation.peak_method = method
+            s, peak = self.laser_segmentation._peak(image)
+            self.assertTrue((s > 0).all())
+            np.testing.assert_allclose(peak[2:], center[2:], atol=atol, err_msg=method)
+            self.assertTrue(((peak[:2] >= 0) & (peak[:2] <= 119)).all())
+
+    def test_peak_tracking(self):
+        image = make_laser_image(160, 120)
+        # Without blur, the band and the full rows have the same pixels
+        self.laser_segmentation.blur_enable = False
+        self.laser_segmentation.peak_method = 'Parabolic'
+        (u, v), segmented = self.laser_segmentation.compute_2d_points(image)
+        self.laser_segmentation.tracking_enable = True
+        self.laser_segmentation.tracking_value = 12
+        (tu, tv), tsegmented = self.laser_segmentation.compute_2d_points(
+            image, band=(u[:100] + 3, v[:100]))
+        np.testing.assert_array_equal(tv, v)
+        np.testing.assert_allclose(tu, u, atol=1e-9)
+
+    def test_fused_kernel(self):
+        # Without Numba the kernel runs as python: small image
+        image = make_laser_image(40, 30)
+        for enable in [(True, True, True), (True, False, True), (True, True, False),
+                       (False, False, True), (False, False, False)]:
+            self.laser_segmentation.threshold_enable, self.laser_segmentation.blur_enable, \
+                self.laser_segmentation.window_enable = enable
+            for orientation in [None, (True, True, False), (False, True, True)]:
+                if orientation is None:
+                    frame = image
+                else:
+                    frame = native_image(image, orientation)
+                segmented = self.laser_segmentation.compute_line_segmentation(
+                    frame, orientation=orientation)
+                s, center = self.laser_segmentation._peak(segmented)
+                fsegmented, fs, fcenter = self.laser_segmentation._fused_line(frame, orientation)
+                np.testing.assert_array_equal(fsegmented, segmented)
+                np.testing.assert_array_equal(fs, s)
+                np.testing.assert_allclose(fcenter, center)
+
+    def test_window_mask(self):
+        image = np.random.RandomState(0).randint(0, 256, (50, 40)).astype(np.uint8)
+        # Peaks at the image borders
+        image[0, 1] = image[1, 38] = 255
+        peak = image.argmax(axis=1)
+        expected = np.zeros_like(image)
+        for i in xrange(image.shape[0]):
+            _min = max(peak[i] - self.laser_segmentation.window_value, 0)
+            _max = peak[i] + self.laser_segmentation.window_value + 1
+            expected[i, _min:_max] = image[i, _min:_max]
+        np.testing.assert_array_equal(self.laser_segmentation._window_mask(image), expected)
+        expected[expected <= 100] = 0
+        np.testing.assert_array_equal(self.laser_segmentation._window_mask(image, 100), expected)
+
+    def test_sgf(self):
+        rng = np.random.RandomState(0)
+        # Fragmented profile: segments of 1 to 30 rows
+        rows = np.arange(600)
+        v = rows[np.repeat(rng.randint(0, 4, 60) > 0, 10)]
+        v = v[rng.rand(len(v)) > 0.1]
+        u = 300 + 20 * np.sin(v / 30.) + rng.randn(len(v))
+        expected = []
+        for segment in np.split(u, np.where(np.diff(v) > 1)[0] + 1):
+            expected.append(scipy.ndimage.gaussian_filter(segment, sigma=2.0))
+        f, fv = self.laser_segmentation._sgf(u, v)
+        np.testing.assert_array_equal(fv, v)
+        np.testing.assert_allclose(f, np.concatenate(expected), rtol=1e-12)
+
+    def test_sgf_short(self):
+        u, v = np.array([10., 12., 11., 15.]), np.array([3, 4, 6, 7])
+        f, _ = self.laser_segmentation._sgf(u, v)
+        np.testing.assert_allclose(f, np.concatenate((
+            scipy.ndimage.gaussian_filter(u[:2], sigma=2.0),
+            scipy.ndimage.gaussian_filter(u[2:], sigma=2.0))), rtol=1e-12)
@@ -0,0 +1,28 @@
+import unittest
+
+from horus.engine.scan.motor_kinematics import MotorKinematics
+
+
+class MotorKinematicsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.kinematics = MotorKinematics(speed=100.0, acceleration=200.0)
+        self.kinematics.start(10.0)
+
+    def test_acceleration(self):
+        self.assertEqual(self.kinematics.angle(10.0), 0.0)
+        self.assertAlmostEqual(self.kinematics.angle(10.25), 6.25)
+
+    def test_cruise(self):
+        # 25 degrees accelerating during 0.5 s, then 100 degrees/s
+        self.assertAlmostEqual(self.kinematics.angle(11.5), 125.0)
+
+    def test_hold(self):
+        self.kinematics.hold(11.5)
+        self.assertAlmostEqual(self.kinematics.angle(20.0), 150.0)
+        self.kinematics.start(20.0)
+        self.assertAlmostEqual(self.kinematics.angle(21.0), 225.0)
+
+    def test_braking_time(self):
+        self.assertAlmostEqual(self.kinematics.braking_time(), 0.5)
+        self.assertAlmostEqual(self.kinematics.braking_time(10.25), 0.25)
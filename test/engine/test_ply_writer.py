@@ -0,0 +1,81 @@
+import os
+import shutil
+import tempfile
+import unittest
+import numpy as np
+
+from horus.engine.scan.ply_writer import PLYWriter, VERTEX_DTYPE, recover_ply
+
+
+class PLYWriterTest(unittest.TestCase):
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.filename = os.path.join(self.path, 'scan.ply')
+        self.point_cloud = np.arange(12, dtype=np.float64).reshape(3, 4)
+        self.texture = np.arange(12, dtype=np.uint8).reshape(3, 4)
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def _read(self):
+        with open(self.filename, 'rb') as f:
+            line = None
+            count = None
+            while line != 'end_header\n':
+                line = f.readline()
+                if line.startswith('element vertex '):
+                    count = int(line.split(' ')[2])
+            data = np.fromfile(f, dtype=VERTEX_DTYPE)
+        return count, data
+
+    def test_write(self):
+        writer = PLYWriter(self.filename)
+        writer.open()
+        writer.write(self.point_cloud, self.texture)
+        # The file is valid before closing
+        count, data = self._read()
+        self.assertEqual(count, 4)
+        writer.write(self.point_cloud, self.texture)
+        writer.close()
+
+        count, data = self._read()
+        self.assertEqual(count, 8)
+        self.assertEqual(len(data), 8)
+        np.testing.assert_array_equal(data['v'][4:], self.point_cloud.T)
+        np.testing.assert_array_equal(data['c'][4:], self.texture.T)
+
+    def test_recover(self):
+        writer = PLYWriter(self.filename)
+        writer.open()
+        writer.write(self.point_cloud, self.texture)
+        # Interrupted write of the next vertexes
+        writer._file.write('\x00' * (VERTEX_DTYPE.itemsize + 5))
+        writer._file.flush()
+
+        self.assertEqual(recover_ply(self.filename), 5)
+        count, data = self._read()
+        self.assertEqual(count, 5)
+        self.assertEqual(len(data), 5)
+
+    def test_recover_other_version(self):
+        writer = PLYWriter(self.filename)
+        writer.open()
+        writer.write(self.point_cloud, self.texture)
+        writer._file.close()
+        with open(self.filename, 'rb') as f:
+            content = f.read()
+        start = content.index('comment ')
+        end = content.index('\n', start)
+        with open(self.filename, 'wb') as f:
+            f.write(content[:start] + 'comment Generated by Horus 0.1.2.4' + content[end:])
+
+        self.assertEqual(recover_ply(self.filename), 4)
+        count, data = self._read()
+        self.assertEqual(count, 4)
+        np.testing.assert_array_equal(data['v'], self.point_cloud.T)
+
+    def test_recover_wrong_format(self):
+        with open(self.filename, 'wb') as f:
+            f.write('ply\nformat ascii 1.0\nelement vertex 0000000000\nend_header\n')
+        self.assertIsNone(recover_ply(self.filename))
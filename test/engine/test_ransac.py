@@ -0,0 +1,63 @@
+import math
+import unittest
+import numpy as np
+
+from horus.engine.algorithms.ransac import ransac, required_trials, LineModel, PlaneModel
+from horus.engine.calibration.laser_triangulation import compute_plane
+
+
+class RansacTest(unittest.TestCase):
+
+    def setUp(self):
+        self.random = np.random.RandomState(0)
+
+    def test_line(self):
+        v = np.arange(400, dtype=float)
+        u = 0.5 * v + 100 + self.random.normal(0, 0.3, v.size)
+        u[::10] += self.random.uniform(20, 200, u[::10].size)
+        data = np.vstack((v, u)).T
+        (d, theta), inliers = ransac(data, LineModel(), 2, 2, random_state=0)
+        fit = (d - v * math.sin(theta)) / math.cos(theta)
+        self.assertEqual(inliers.size, 360)
+        self.assertTrue(np.allclose(fit, 0.5 * v + 100, atol=0.2))
+
+    def test_plane(self):
+        xy = self.random.uniform(-50, 50, (1000, 2))
+        z = 0.2 * xy[:, 0] - 0.1 * xy[:, 1] + 300 + self.random.normal(0, 0.02, 1000)
+        data = np.column_stack((xy, z))
+        data[:100, 2] += self.random.uniform(5, 50, 100)
+        (dist, normal, M), inliers = ransac(data, PlaneModel(), 3, 0.1,
+                                            max_trials=500, random_state=0)
+        expected = np.array([-0.2, 0.1, 1]) / np.linalg.norm([-0.2, 0.1, 1])
+        self.assertTrue(np.allclose(normal, expected, atol=1e-3))
+        self.assertAlmostEqual(dist, np.dot(expected, [0, 0, 300]), delta=0.05)
+        self.assertEqual(inliers.min(), 100)
+
+    def test_degenerate(self):
+        data = np.zeros((50, 3))
+        data[:, 2] = 1
+        model, inliers = ransac(data, PlaneModel(), 3, 0.1, random_state=0)
+        self.assertIsNone(model)
+        self.assertIsNone(inliers)
+
+    def test_compute_plane_degenerate(self):
+        data = np.zeros((50, 3))
+        data[:, 2] = 1
+        self.assertEqual(compute_plane(0, data), (None, None, None))
+
+    def test_early_stop(self):
+        self.assertEqual(required_trials(1.0, 3, 0.99), 0)
+        self.assertEqual(required_trials(0.0, 3, 0.99), float('inf'))
+        self.assertEqual(int(math.ceil(required_trials(0.5, 2, 0.99))), 17)
+        calls = []
+
+        class CountingModel(LineModel):
+
+            def fit_batch(self, samples):
+                calls.append(len(samples))
+                return LineModel.fit_batch(self, samples)
+
+        v = np.arange(100, dtype=float)
+        data = np.vstack((v, 2 * v)).T
+        ransac(data, CountingModel(), 2, 1, max_trials=1000, batch_size=10, random_state=0)
+        self.assertEqual(calls, [10])
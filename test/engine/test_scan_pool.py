@@ -0,0 +1,64 @@
+import time
+import unittest
+
+from horus.engine.scan.scan_pool import ScanPool
+
+
+def job(index, delay):
+    time.sleep(delay)
+    return index
+
+
+class ScanPoolTest(unittest.TestCase):
+
+    def run_jobs(self, pool, count=8):
+        # The first jobs take longer: they complete out of order
+        pool.start()
+        tasks = [pool.submit(job, i, 0.01 * (count - i)) for i in xrange(count)]
+        results = [task.get() for task in tasks]
+        pool.close()
+        return results
+
+    def test_inline(self):
+        pool = ScanPool(0)
+        self.assertEqual(self.run_jobs(pool), range(8))
+        statistics = pool.statistics()
+        self.assertEqual(statistics['backend'], 'Inline')
+        self.assertEqual(statistics['tasks'], 8)
+        self.assertAlmostEqual(statistics['busy_time'], 0.36, delta=0.05)
+        self.assertGreater(statistics['utilization'], 0.8)
+
+    def test_thread(self):
+        pool = ScanPool(3, 'Thread')
+        self.assertEqual(self.run_jobs(pool), range(8))
+        self.assertIsNone(pool._pool)
+        statistics = pool.statistics()
+        self.assertEqual(statistics['backend'], 'Thread')
+        self.assertEqual(statistics['tasks'], 8)
+        self.assertAlmostEqual(statistics['busy_time'], 0.36, delta=0.05)
+        self.assertLessEqual(statistics['utilization'], 1.0)
+        self.assertGreater(statistics['utilization'], 0.3)
+
+    def test_process(self):
+        pool = ScanPool(2, 'Process')
+        self.assertEqual(self.run_jobs(pool), range(8))
+        self.assertIsNone(pool._pool)
+        self.assertEqual(pool.statistics()['tasks'], 8)
+
+    def test_ready(self):
+        pool = ScanPool(1, 'Thread')
+        pool.start()
+        task = pool.submit(job, 0, 0.1)
+        self.assertFalse(task.ready())
+        self.assertEqual(task.get(), 0)
+        self.assertTrue(task.ready())
+        pool.close()
+
+    def test_terminate(self):
+        pool = ScanPool(2, 'Thread')
+        pool.start()
+        pool.submit(job, 0, 0.05)
+        pool.terminate()
+        self.assertIsNone(pool._pool)
+        # Only the retrieved results are accounted
+        self.assertEqual(pool.statistics()['tasks'], 0)
@@ -0,0 +1,93 @@
+import shutil
+import tempfile
+import unittest
+import numpy as np
+
+from horus.engine.scan.scan_capture import ScanCapture
+from horus.engine.scan.scan_session import ScanSessionWriter, ScanSessionReader
+from horus.engine.calibration.calibration_data import CalibrationData
+from horus.engine.algorithms.laser_segmentation import LaserSegmentation
+
+
+class ScanSessionTest(unittest.TestCase):
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.calibration_data = CalibrationData()
+        self.laser_segmentation = LaserSegmentation()
+        self.saved = (dict(self.calibration_data.__dict__),
+                      [(plane.distance, plane.normal)
+                       for plane in self.calibration_data.laser_planes],
+                      dict(self.laser_segmentation.__dict__))
+        self.calibration_data.set_resolution(4, 3)
+        self.calibration_data.camera_matrix = np.array(
+            [[10., 0., 2.], [0., 10., 1.5], [0., 0., 1.]])
+        self.calibration_data.distortion_vector = np.zeros(5)
+        for i, plane in enumerate(self.calibration_data.laser_planes):
+            plane.distance = 100. + i
+            plane.normal = np.array([0.5, 0., 0.5])
+        self.calibration_data.platform_rotation = np.eye(3)
+        self.calibration_data.platform_translation = np.array([0., 50., 300.])
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+        calibration, planes, segmentation = self.saved
+        self.calibration_data.__dict__.update(calibration)
+        for plane, (distance, normal) in zip(self.calibration_data.laser_planes, planes):
+            plane.distance, plane.normal = distance, normal
+        self.laser_segmentation.__dict__.update(segmentation)
+
+    def _capture(self, k):
+        capture = ScanCapture()
+        capture.theta = 0.1 * k
+        capture.texture = np.full((3, 4, 3), k, np.uint8)
+        capture.lasers[0] = np.full((3, 4, 3), 10 + k, np.uint8)
+        if k % 2 == 0:
+            capture.lasers[1] = np.full((3, 4, 3), 20 + k, np.uint8)
+        return capture
+
+    def test_captures(self):
+        writer = ScanSessionWriter(self.path, chunk_size=2)
+        writer.open()
+        for k in xrange(3):
+            writer.write(self._capture(k))
+        writer.close()
+
+        reader = ScanSessionReader(self.path)
+        reader.open()
+        self.assertEqual(len(reader), 3)
+        self.assertTrue(reader.metadata['completed'])
+        for k, capture in enumerate(reader.captures()):
+            expected = self._capture(k)
+            self.assertAlmostEqual(capture.theta, expected.theta)
+            np.testing.assert_array_equal(capture.texture, expected.texture)
+            for i in xrange(2):
+                if expected.lasers[i] is None:
+                    self.assertIsNone(capture.lasers[i])
+                else:
+                    np.testing.assert_array_equal(capture.lasers[i], expected.lasers[i])
+
+    def test_settings(self):
+        self.laser_segmentation.threshold_value = 20
+        writer = ScanSessionWriter(self.path)
+        writer.open()
+        writer.close()
+
+        self.calibration_data.laser_planes[1].distance = 0.0
+        self.calibration_data.platform_translation = np.zeros(3)
+        self.laser_segmentation.threshold_value = 50
+
+        reader = ScanSessionReader(self.path)
+        reader.open()
+        reader.apply_settings()
+        self.assertEqual(len(reader), 0)
+        self.assertEqual(self.calibration_data.laser_planes[1].distance, 101.)
+        np.testing.assert_array_equal(
+            self.calibration_data.platform_translation, [0., 50., 300.])
+        self.assertEqual(self.laser_segmentation.threshold_value, 20)
+
+        # The live settings are restored
+        reader.restore_settings()
+        self.assertEqual(self.calibration_data.laser_planes[1].distance, 0.0)
+        np.testing.assert_array_equal(self.calibration_data.platform_translation, 0)
+        self.assertEqual(self.laser_segmentation.threshold_value, 50)
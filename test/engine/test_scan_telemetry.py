@@ -0,0 +1,27 @@
+import unittest
+
+from horus.engine.scan.scan_telemetry import ScanTelemetry
+
+
+class ScanTelemetryTest(unittest.TestCase):
+
+    def setUp(self):
+        self.telemetry = ScanTelemetry()
+        self.telemetry.reset()
+
+    def test_summary(self):
+        for value in xrange(1, 11):
+            self.telemetry.record('segmentation', value / 100.)
+        self.telemetry.record_all({'segmentation': 0.11, 'points': 500})
+        summary = self.telemetry.summary()
+        self.assertEqual(self.telemetry.stages(), ['points', 'segmentation'])
+        self.assertEqual(summary['segmentation']['count'], 11)
+        self.assertAlmostEqual(summary['segmentation']['max'], 0.11)
+        self.assertAlmostEqual(summary['points']['mean'], 500)
+
+    def test_histogram(self):
+        for value in xrange(self.telemetry.window + 10):
+            self.telemetry.record('capture', value)
+        counts, edges = self.telemetry.histogram('capture', bins=4)
+        self.assertEqual(counts.sum(), self.telemetry.window)
+        self.assertEqual(edges[0], 10)
@@ -0,0 +1,42 @@
+import unittest
+import numpy as np
+
+from horus.engine.algorithms.settle_detector import SettleDetector
+
+
+def make_frame(intensity=0):
+    image = np.zeros((480, 640, 3), np.uint8)
+    image[:, 300:308, 0] = intensity
+    return image
+
+
+class SettleDetectorTest(unittest.TestCase):
+
+    def setUp(self):
+        self.detector = SettleDetector()
+        self.reference = self.detector.thumbnail(make_frame())
+
+    def test_laser_on(self):
+        frames = iter([make_frame(), make_frame(), make_frame(120),
+                       make_frame(255), make_frame(255), make_frame(255)])
+        image, count = self.detector.wait('laser', self.reference, lambda: next(frames))
+        self.assertEqual(count, 5)
+        self.assertEqual(image[0, 300, 0], 255)
+        self.assertEqual(self.detector.latency['laser'], 5)
+        self.assertEqual(self.detector.limit('laser'), 7)
+
+    def test_no_change(self):
+        image, count = self.detector.wait('laser', self.reference, make_frame, minimum=2)
+        self.assertEqual(count, self.detector.max_frames)
+        # The next wait is bounded by the minimum
+        self.assertEqual(self.detector.latency['laser'], 2)
+        image, count = self.detector.wait('laser', self.reference, make_frame, minimum=2)
+        self.assertEqual(count, 4)
+
+    def test_seeded_reference(self):
+        image, count = self.detector.wait('laser', None, make_frame, minimum=3)
+        self.assertEqual(count, 3)
+        frames = iter([make_frame(), make_frame(120), make_frame(255), make_frame(255)])
+        image, count = self.detector.wait('mode', None, lambda: next(frames), minimum=3)
+        self.assertEqual(count, 4)
+        self.assertEqual(image[0, 300, 0], 255)